@@ -0,0 +1,245 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from logger import app_logger
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalize a question for exact cache lookups.
+
+    Lowercases, collapses whitespace and drops punctuation, so
+    "Visiting hours?" and "visiting   hours" share one cache key.
+    """
+    question = re.sub(r"[^\w\s]", " ", question.lower())
+    return " ".join(question.split())
+
+
+class _CacheEntry:
+    __slots__ = ("answer", "embedding", "created_at")
+
+    def __init__(self, answer: str, embedding: Optional[np.ndarray], created_at: float):
+        self.answer = answer
+        self.embedding = embedding
+        self.created_at = created_at
+
+
+class AnswerCache:
+    """
+    Two-tier answer cache in front of the RAG chain.
+
+    The first tier is an exact lookup on the normalized question. The second
+    tier compares the question embedding with the embeddings of cached
+    questions and returns the answer of the closest one when its cosine
+    similarity reaches ``similarity_threshold``. Entries expire after
+    ``ttl_seconds`` and the least recently used entry is evicted once
+    ``max_size`` is reached. When ``version_func`` is given, the cache is
+    cleared as soon as the value it returns changes (e.g. the Chroma
+    collection was re-indexed).
+
+    Pinned entries (see ``pin``) are looked up like the others but never
+    expire or get evicted; they are only dropped by ``invalidate``.
+    """
+
+    def __init__(
+        self,
+        embeddings=None,
+        max_size: int = 1000,
+        ttl_seconds: float = 3600,
+        similarity_threshold: float = 0.95,
+        version_func: Optional[Callable[[], Hashable]] = None,
+        version_check_interval: float = 5.0,
+        time_func: Callable[[], float] = time.monotonic,
+    ):
+        self.embeddings = embeddings
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.version_func = version_func
+        self.version_check_interval = version_check_interval
+        self._time = time_func
+
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._pinned: Dict[str, _CacheEntry] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+
+        self._version = version_func() if version_func else None
+        self._version_checked_at = self._time()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.pinned_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def alookup(self, question: str, semantic: bool = True) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Look up a cached answer for a question.
+
+        Args:
+            question (str): Sanitized question
+            semantic (bool): Whether to fall back to the embedding similarity tier
+
+        Returns:
+            Tuple[Optional[str], Optional[np.ndarray]]: The cached answer (or None on a
+            miss) and the question embedding computed for the semantic tier, which
+            should be passed back to ``store`` to avoid embedding the question twice.
+        """
+        await self._acheck_version()
+        key = normalize_question(question)
+
+        entry = self._pinned.get(key)
+        if entry is not None:
+            self.exact_hits += 1
+            self.pinned_hits += 1
+            return entry.answer, None
+
+        entry = self._get_live_entry(key)
+        if entry is not None:
+            self.exact_hits += 1
+            self._entries.move_to_end(key)
+            return entry.answer, None
+
+        if self.embeddings is None or not semantic:
+            self.misses += 1
+            return None, None
+
+        embedding = self._normalize_vector(await self.embeddings.aembed_query(question))
+        match_key = self._find_similar(embedding)
+        if match_key is not None:
+            self.semantic_hits += 1
+            app_logger.debug("Semantic cache hit for question: %s", question)
+            entry = self._pinned.get(match_key)
+            if entry is not None:
+                self.pinned_hits += 1
+                return entry.answer, embedding
+            self._entries.move_to_end(match_key)
+            return self._entries[match_key].answer, embedding
+
+        self.misses += 1
+        return None, embedding
+
+    def store(self, question: str, answer: str, embedding: Optional[np.ndarray] = None) -> None:
+        """Cache the answer for a question, evicting the least recently used entry when full."""
+        if self.max_size <= 0:
+            return
+        key = normalize_question(question)
+        self._entries[key] = _CacheEntry(answer, embedding, self._time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        self._matrix = None
+
+    def pin(self, entries: Iterable[Tuple[str, str, Optional[np.ndarray]]]) -> None:
+        """
+        Replace the pinned entries with ``(question, answer, embedding)`` triples,
+        e.g. the precomputed answers to the most frequent questions.
+        """
+        now = self._time()
+        self._pinned = {
+            normalize_question(question): _CacheEntry(
+                answer, None if embedding is None else self._normalize_vector(embedding), now
+            )
+            for question, answer, embedding in entries
+        }
+        self._matrix = None
+
+    def invalidate(self) -> None:
+        """Drop every cached answer, pinned ones included."""
+        self._entries.clear()
+        self._pinned = {}
+        self._matrix = None
+        self.invalidations += 1
+        app_logger.info("Answer cache invalidated")
+
+    def stats(self) -> dict:
+        """Return the cache size and hit/miss counters."""
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "pinned": len(self._pinned),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "pinned_hits": self.pinned_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+        }
+
+    def _get_live_entry(self, key: str) -> Optional[_CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._is_expired(entry):
+            del self._entries[key]
+            self._matrix = None
+            return None
+        return entry
+
+    def _is_expired(self, entry: _CacheEntry) -> bool:
+        return self._time() - entry.created_at > self.ttl_seconds
+
+    def _find_similar(self, embedding: np.ndarray) -> Optional[str]:
+        if self._matrix is None:
+            self._rebuild_matrix()
+        if not self._matrix_keys:
+            return None
+
+        similarities = self._matrix @ embedding
+        for index in np.argsort(similarities)[::-1]:
+            if similarities[index] < self.similarity_threshold:
+                return None
+            key = self._matrix_keys[index]
+            if key in self._pinned or self._get_live_entry(key) is not None:
+                return key
+        return None
+
+    def _rebuild_matrix(self) -> None:
+        entries = [
+            (key, entry)
+            for key, entry in [*self._pinned.items(), *self._entries.items()]
+            if entry.embedding is not None
+        ]
+        keys = [key for key, _ in entries]
+        self._matrix_keys = keys
+        self._matrix = (
+            np.vstack([entry.embedding for _, entry in entries])
+            if keys
+            else np.empty((0, 0), dtype=np.float32)
+        )
+
+    async def _acheck_version(self) -> None:
+        """Clear the cache if the version changed; ``version_func`` may query the database, so it runs in a thread."""
+        if self.version_func is None:
+            return
+        now = self._time()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+        try:
+            version = await asyncio.to_thread(self.version_func)
+        except Exception as e:
+            app_logger.warning(f"Could not read knowledge base version: {str(e)}")
+            return
+        if version != self._version:
+            self._version = version
+            self.invalidate()
+
+    @staticmethod
+    def _normalize_vector(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
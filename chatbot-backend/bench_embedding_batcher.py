@@ -0,0 +1,81 @@
+"""
+Benchmark query-embedding micro-batching against a stub embedder.
+
+The stub models an embedding API with a fixed round-trip latency, a small
+per-text cost and a limited number of concurrent connections, which is what
+makes many tiny calls expensive under load.
+
+Usage:
+    python bench_embedding_batcher.py --queries 500 --concurrency 100
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from embedding_batcher import BatchingEmbeddings
+
+
+class StubEmbeddingAPI:
+    def __init__(self, latency_ms: float, per_text_ms: float, connections: int):
+        self.latency = latency_ms / 1000
+        self.per_text = per_text_ms / 1000
+        self.connections = asyncio.Semaphore(connections)
+        self.calls = 0
+
+    async def aembed_documents(self, texts):
+        async with self.connections:
+            self.calls += 1
+            await asyncio.sleep(self.latency + self.per_text * len(texts))
+            return [[float(len(text))] * 8 for text in texts]
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+
+async def run(embeddings, queries: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await embeddings.aembed_query(f"question {i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(queries)))
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--per-text-ms", type=float, default=0.2)
+    parser.add_argument("--connections", type=int, default=10)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    unbatched_api = StubEmbeddingAPI(args.latency_ms, args.per_text_ms, args.connections)
+    unbatched = await run(unbatched_api, args.queries, args.concurrency)
+
+    batched_api = StubEmbeddingAPI(args.latency_ms, args.per_text_ms, args.connections)
+    batcher = BatchingEmbeddings(batched_api, max_wait_ms=args.max_wait_ms, max_batch_size=args.max_batch_size)
+    batched = await run(batcher, args.queries, args.concurrency)
+
+    stats = batcher.stats()
+    result = {
+        "queries": args.queries,
+        "concurrency": args.concurrency,
+        "unbatched": {"seconds": round(unbatched, 3), "qps": round(args.queries / unbatched, 1), "api_calls": unbatched_api.calls},
+        "batched": {"seconds": round(batched, 3), "qps": round(args.queries / batched, 1), "api_calls": batched_api.calls},
+        "speedup": round(unbatched / batched, 2),
+        "mean_batch_size": round(stats["mean_batch_size"], 1),
+        "mean_queue_wait_ms": round(stats["mean_queue_wait_ms"], 2),
+        "max_queue_wait_ms": round(stats["max_queue_wait_ms"], 2),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
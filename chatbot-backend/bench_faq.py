@@ -0,0 +1,110 @@
+"""
+Benchmark the FAQ matcher over a synthetic FAQ.
+
+Builds an index of --entries generated questions, then times lookups for
+exact, re-cased/re-punctuated, typo and reworded variants of indexed
+questions, plus unrelated questions.
+
+Usage:
+    python bench_faq.py --entries 100000 --queries 2000
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+from faq import FAQIndex
+
+TOPICS = ["visiting", "hours", "cardiology", "specialists", "payment", "insurance", "appointment", "parking",
+          "pharmacy", "emergency", "pediatrics", "radiology", "billing", "surgery", "maternity", "laboratory"]
+TEMPLATES = ["What are the {} {} for {}?", "How do I find {} {} at {}?", "Where is the {} {} in {}?",
+             "Who handles {} {} for {}?", "Can I get {} {} during {}?"]
+
+
+def synthetic_words(rng, count):
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10))))
+    return sorted(words)
+
+
+def build_faq(rng, entries):
+    vocabulary = synthetic_words(rng, 20_000)
+    faq = []
+    for i in range(entries):
+        topic = rng.choice(TOPICS)
+        words = rng.sample(vocabulary, 3)
+        question = rng.choice(TEMPLATES).format(topic, words[0], f"{words[1]} {words[2]}")
+        faq.append((question, f"Answer {i}"))
+    return faq
+
+
+def add_typo(rng, question):
+    words = question.split()
+    candidates = [i for i, word in enumerate(words) if len(word) >= 6]
+    i = rng.choice(candidates)
+    word = words[i]
+    j = rng.randrange(1, len(word) - 1)
+    words[i] = word[:j] + word[j + 1:]
+    return " ".join(words)
+
+
+def reword(rng, question):
+    words = [word for word in question.rstrip("?").split() if word.lower() not in {"what", "how", "where", "who", "can"}]
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    faq = build_faq(rng, args.entries)
+
+    start = time.perf_counter()
+    index = FAQIndex(faq)
+    build_seconds = time.perf_counter() - start
+
+    samples = rng.sample(faq, args.queries)
+    variants = {
+        "exact": lambda q: q,
+        "recased": lambda q: "  " + q.upper().replace("?", "!!"),
+        "typo": lambda q: add_typo(rng, q),
+        "reworded": lambda q: reword(rng, q),
+        "unrelated": lambda q: " ".join(synthetic_words(rng, 4)),
+    }
+
+    results = {"entries": args.entries, "build_seconds": round(build_seconds, 2), "lookups": {}}
+    for name, make_query in variants.items():
+        queries = [(make_query(question), answer) for question, answer in samples]
+        timings, correct = [], 0
+        for query, answer in queries:
+            start = time.perf_counter()
+            match = index.match(query, min_confidence=0.6)
+            timings.append((time.perf_counter() - start) * 1000)
+            if name == "unrelated":
+                correct += match is None
+            else:
+                correct += match is not None and match.answer == answer
+        results["lookups"][name] = {
+            "p50_ms": round(percentile(timings, 0.50), 4),
+            "p99_ms": round(percentile(timings, 0.99), 4),
+            # For unrelated questions, "correct" means no match was returned
+            "correct": round(correct / len(queries), 3),
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
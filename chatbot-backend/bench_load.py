@@ -0,0 +1,250 @@
+"""
+Load-test the API against local OpenAI stand-ins.
+
+Starts fake_openai.FakeOpenAIServer with the given chat and embedding
+latency and jitter, points the backend's OpenAI clients at it, builds and
+warms up the pipeline, and then drives main.app in-process (httpx
+ASGITransport) with --concurrency clients. For each endpoint, it sends
+--requests requests and reports p50/p95/p99 latency, throughput, error
+rate and status codes, plus the upstream calls the stand-in served.
+Questions are numbered so that every request runs the pipeline;
+--repeat-questions cycles through a fixed set instead.
+
+With --url, requests go to a running server instead. Start it and the
+stand-in yourself (see fake_openai.py).
+
+--output saves the results as JSON. --baseline compares them to an earlier
+run and exits with status 1 when, for some endpoint:
+- p95 latency grew by more than --max-regression,
+- throughput fell by more than --max-regression, or
+- the error rate rose by more than 1%.
+That makes the harness usable as a CI gate.
+
+Unless they are already set in the environment, the run disables the
+answer and embedding caches (every /generate/ runs the full pipeline),
+raises the rate limits out of the way, and keeps the limiter in memory.
+Without network access, set EMBEDDING_CHECK_CTX_LENGTH=false: the
+embedding client otherwise downloads a tiktoken encoding.
+
+Usage:
+    python bench_load.py --concurrency 16 --requests 200 --output load.json
+    python bench_load.py --baseline load.json --max-regression 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+from fake_openai import FakeOpenAIServer
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ENDPOINTS = {
+    "generate": ("POST", "/generate/"),
+    "chat": ("POST", "/chat/"),
+    "health": ("GET", "/"),
+}
+QUESTIONS = [
+    "What are the visiting hours at the hospital?",
+    "Who are the cardiology specialists?",
+    "How do I book an appointment?",
+    "Does the hospital accept my insurance?",
+    "Where can I park when visiting?",
+    "What should I bring to my first appointment?",
+    "Is there an emergency department open at night?",
+    "How can I get a copy of my medical records?",
+]
+BENCH_ENVIRONMENT = {
+    "API_KEY": "bench-api-key",
+    "OPENAI_API_KEY": "sk-bench",
+    "ANSWER_CACHE_ENABLED": "false",
+    "EMBEDDING_CACHE_ENABLED": "false",
+    "RATE_LIMIT_GENERATE": "1000000/minute",
+    "RATE_LIMIT_CHAT": "1000000/minute",
+    "RATE_LIMIT_HEALTH": "1000000/minute",
+    "RATE_LIMIT_STORAGE_URI": "memory://",
+}
+
+
+def summarize(latencies, statuses, errors, elapsed):
+    """Latency percentiles in milliseconds, throughput and error rate of one endpoint run."""
+    latencies_ms = np.asarray(latencies) * 1000
+    counts = {}
+    for status in statuses:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    return {
+        "requests": len(statuses),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 2),
+        "max_ms": round(float(latencies_ms.max()), 2),
+        "throughput_rps": round(len(statuses) / elapsed, 2),
+        "error_rate": round(errors / len(statuses), 4),
+        "status_codes": counts,
+    }
+
+
+def compare(results, baseline, max_regression):
+    """List the endpoints whose p95 latency, throughput or error rate regressed against a baseline."""
+    regressions = []
+    for name, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - max_regression):
+            regressions.append(f"{name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} req/s")
+        if current["error_rate"] > previous["error_rate"] + 0.01:
+            regressions.append(f"{name}: error rate {previous['error_rate']} -> {current['error_rate']}")
+    return regressions
+
+
+def question(index, repeat):
+    """The question of a request; numbered unless repeating, so neither caches nor coalescing can serve it."""
+    text = QUESTIONS[index % len(QUESTIONS)]
+    return text if repeat else f"{text} Request {index}"
+
+
+async def run_endpoint(client, method, path, requests, concurrency, headers, repeat_questions):
+    latencies, statuses = [], []
+    errors = 0
+    next_request = 0
+
+    async def worker():
+        nonlocal next_request, errors
+        while next_request < requests:
+            index = next_request
+            next_request += 1
+            body = {"question": question(index, repeat_questions)} if method == "POST" else None
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body, headers=headers)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = "exception"
+            latencies.append(time.perf_counter() - start)
+            statuses.append(status)
+            if status == "exception" or status >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, errors, time.perf_counter() - start)
+
+
+async def run_load(args, endpoints):
+    if args.url:
+        transport, base_url, headers = None, args.url, {"X-API-Key": os.environ.get("API_KEY", "")}
+        startup = None
+    else:
+        import generator
+        import main
+        from config import settings
+
+        await generator.astartup()
+        startup = {"status": generator.startup.status, "error": generator.startup.error, **generator.startup.timings_ms}
+        transport = httpx.ASGITransport(app=main.app)
+        base_url, headers = "http://testserver", {settings.API_KEY_HEADER: settings.API_KEY}
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60.0, limits=limits) as client:
+        results = {}
+        for name in endpoints:
+            method, path = ENDPOINTS[name]
+            results[name] = await run_endpoint(
+                client, method, path, args.requests, args.concurrency, headers, args.repeat_questions
+            )
+    return startup, results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--endpoints", default="generate,chat,health", help=f"Comma-separated subset of {','.join(ENDPOINTS)}")
+    parser.add_argument("--chat-latency-ms", type=float, default=300.0)
+    parser.add_argument("--chat-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0)
+    parser.add_argument("--embedding-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--repeat-questions", action="store_true",
+        help=f"Cycle through {len(QUESTIONS)} fixed questions, so concurrent duplicates are coalesced",
+    )
+    parser.add_argument("--url", help="Load-test a running server instead of main.app in-process")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Tolerated relative p95/throughput regression")
+    args = parser.parse_args()
+
+    endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+    server = FakeOpenAIServer(
+        chat_latency_ms=args.chat_latency_ms,
+        chat_jitter_ms=args.chat_jitter_ms,
+        embedding_latency_ms=args.embedding_latency_ms,
+        embedding_jitter_ms=args.embedding_jitter_ms,
+        seed=args.seed,
+    )
+    with server:
+        if not args.url:
+            for name, value in BENCH_ENVIRONMENT.items():
+                os.environ.setdefault(name, value)
+            os.environ["OPENAI_BASE_URL"] = os.environ["OPENAI_API_BASE"] = server.base_url
+        startup, endpoint_results = asyncio.run(run_load(args, endpoints))
+        upstream = server.stats()
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "target": args.url or "in-process",
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "chat_latency_ms": args.chat_latency_ms,
+            "chat_jitter_ms": args.chat_jitter_ms,
+            "embedding_latency_ms": args.embedding_latency_ms,
+            "embedding_jitter_ms": args.embedding_jitter_ms,
+            "seed": args.seed,
+            "repeat_questions": args.repeat_questions,
+        },
+        "startup": startup,
+        "endpoints": endpoint_results,
+        "upstream": upstream if not args.url else None,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        results["regressions"] = regressions
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
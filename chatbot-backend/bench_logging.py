@@ -0,0 +1,140 @@
+"""
+Microbenchmark of the logging overhead a request pays on its own thread.
+
+Replays the log calls of one /generate/ request (SecurityMiddleware's debug
+lines, the endpoint's debug line and one info line) against two pipelines
+writing to temporary files:
+
+- legacy: the previous setup, six re.sub calls per record, synchronous
+  console and rotating-file handlers, eagerly built f-string messages
+- queued: logger.py's pipeline, records handed unformatted to a
+  QueueListener thread that masks with one precompiled pattern
+
+Reports the per-request time spent on the calling thread and the total
+time until every record has been written.
+
+Usage:
+    python bench_logging.py --requests 20000 --file-level DEBUG
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import re
+import tempfile
+import time
+from logging.handlers import QueueListener, RotatingFileHandler
+
+from starlette.datastructures import Headers
+
+from logger import DeferredQueueHandler, SensitiveDataFormatter
+
+HEADERS = Headers({
+    "host": "localhost:8000",
+    "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36",
+    "accept": "application/json",
+    "content-type": "application/json",
+    "content-length": "48",
+    "x-api-key": "sk-" + "a" * 40,
+    "origin": "http://localhost:5173",
+})
+FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class LegacySensitiveDataFormatter(logging.Formatter):
+    def format(self, record):
+        message = super().format(record)
+        sensitive_patterns = [
+            r'api[-_]?key["\']?\s*[:=]\s*["\']?([^"\'\s]+)["\']?',
+            r'openai[-_]?key["\']?\s*[:=]\s*["\']?([^"\'\s]+)["\']?',
+            r'secret["\']?\s*[:=]\s*["\']?([^"\'\s]+)["\']?',
+            r'token["\']?\s*[:=]\s*["\']?([^"\'\s]+)["\']?',
+            r'sk-[a-zA-Z0-9]{32,}',
+            r'eyJ[a-zA-Z0-9_-]*\.[a-zA-Z0-9_-]*\.[a-zA-Z0-9_-]*',
+        ]
+        for pattern in sensitive_patterns:
+            message = re.sub(pattern, '***MASKED***', message, flags=re.IGNORECASE)
+        return message
+
+
+def legacy_request(logger):
+    logger.debug(f"Processing request from IP: {'127.0.0.1'}")
+    logger.debug(f"Request path: {'/generate/'}")
+    logger.debug(f"Request headers: {dict(HEADERS)}")
+    logger.debug(f"Expected API key header: {'X-API-Key'}")
+    logger.debug(f"API key present: {True}")
+    logger.debug(f"Request from: {'127.0.0.1'} - {'/generate/'}")
+    logger.info(f"Prompt tokens: {812}")
+    logger.debug(f"Request completed in {1.234:.2f} seconds")
+
+
+def queued_request(logger):
+    logger.debug("Processing request from IP: %s", "127.0.0.1")
+    logger.debug("Request path: %s", "/generate/")
+    logger.debug("Request headers: %s", HEADERS)
+    logger.debug("Expected API key header: %s", "X-API-Key")
+    logger.debug("API key present: %s", True)
+    logger.debug("Request from: %s - %s", "127.0.0.1", "/generate/")
+    logger.info("Prompt tokens: %s", 812)
+    logger.debug("Request completed in %.2f seconds", 1.234)
+
+
+def make_handlers(directory, name, formatter, file_level):
+    console = logging.StreamHandler(open(os.path.join(directory, f"{name}-console.log"), "w"))
+    console.setLevel(logging.INFO)
+    file = RotatingFileHandler(os.path.join(directory, f"{name}-app.log"), maxBytes=10 * 1024 * 1024, backupCount=2)
+    file.setLevel(file_level)
+    for handler in (console, file):
+        handler.setFormatter(formatter)
+    return console, file
+
+
+def run(name, requests, file_level, directory):
+    logger = logging.getLogger(f"bench.{name}")
+    logger.propagate = False
+    console, file = make_handlers(
+        directory, name, (LegacySensitiveDataFormatter if name == "legacy" else SensitiveDataFormatter)(FORMAT), file_level
+    )
+    listener = None
+    if name == "legacy":
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(console)
+        logger.addHandler(file)
+        request = legacy_request
+    else:
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, console, file, respect_handler_level=True)
+        listener.start()
+        logger.setLevel(min(console.level, file.level))
+        logger.addHandler(DeferredQueueHandler(log_queue))
+        request = queued_request
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        request(logger)
+    caller = time.perf_counter() - start
+    if listener is not None:
+        listener.stop()
+    total = time.perf_counter() - start
+    for handler in (console, file):
+        handler.close()
+    return {"caller_us_per_request": round(caller / requests * 1e6, 2), "total_us_per_request": round(total / requests * 1e6, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--file-level", default="DEBUG", help="Level of the file handler (DEBUG or INFO)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = {name: run(name, args.requests, args.file_level.upper(), directory) for name in ("legacy", "queued")}
+    results["caller_speedup"] = round(
+        results["legacy"]["caller_us_per_request"] / results["queued"]["caller_us_per_request"], 2
+    )
+    print(json.dumps({"requests": args.requests, "file_level": args.file_level.upper(), **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
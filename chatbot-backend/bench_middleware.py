@@ -0,0 +1,129 @@
+"""
+Benchmark per-request overhead of the security middleware stack and the sanitizer.
+
+Sends requests in-process (httpx ASGITransport) to a trivial FastAPI endpoint
+behind three stacks:
+
+- none: no middleware
+- legacy: the previous BaseHTTPMiddleware-based SecurityMiddleware and
+  SlowAPIMiddleware
+- asgi: security.SecurityMiddleware and SlowAPIASGIMiddleware
+
+and times sanitize_input against the previous three-regex implementation
+on a typical question and on adversarial inputs of MAX_QUESTION_LENGTH.
+
+Usage:
+    python bench_middleware.py --requests 3000
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import re
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from slowapi import Limiter
+from slowapi.middleware import SlowAPIASGIMiddleware, SlowAPIMiddleware
+from slowapi.util import get_remote_address
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from config import settings
+from logger import app_logger
+from security import SecurityMiddleware, sanitize_input
+
+
+class LegacySecurityMiddleware(BaseHTTPMiddleware):
+    """The checks and log calls of the previous BaseHTTPMiddleware implementation."""
+
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        app_logger.debug(f"Processing request from IP: {request.client.host}")
+        app_logger.debug(f"Request path: {request.url.path}")
+        app_logger.debug(f"Request headers: {dict(request.headers)}")
+        app_logger.debug(f"Expected API key header: {settings.API_KEY_HEADER}")
+        app_logger.debug(f"API key present: {settings.API_KEY is not None and len(settings.API_KEY) > 0}")
+        content_length = request.headers.get('content-length')
+        if content_length and int(content_length) > settings.MAX_REQUEST_SIZE:
+            raise RuntimeError("Request too large")
+        api_key = request.headers.get(settings.API_KEY_HEADER)
+        if not api_key or not hmac.compare_digest(api_key, settings.API_KEY):
+            raise RuntimeError("Invalid API key")
+        app_logger.debug("API key validation successful")
+        response = await call_next(request)
+        app_logger.debug(f"Request completed in {time.time() - start_time:.2f} seconds")
+        return response
+
+
+def legacy_sanitize(text):
+    text = re.sub(r'<[^>]+>', '', text)
+    text = re.sub(r'<script\b[^<]*(?:(?!<\/script>)<[^<]*)*<\/script>', '', text)
+    text = re.sub(r'[<>{}()\[\]\\/]', '', text)
+    return text.strip()[:settings.MAX_QUESTION_LENGTH]
+
+
+def build_app(stack):
+    app = FastAPI()
+    app.state.limiter = Limiter(key_func=get_remote_address)
+
+    @app.post("/echo/")
+    async def echo(request: Request):
+        return {"response": (await request.json())["question"]}
+
+    if stack == "legacy":
+        app.add_middleware(SlowAPIMiddleware)
+        app.add_middleware(LegacySecurityMiddleware)
+    elif stack == "asgi":
+        app.add_middleware(SlowAPIASGIMiddleware)
+        app.add_middleware(SecurityMiddleware)
+    return app
+
+
+async def time_requests(app, requests):
+    timings = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        headers = {settings.API_KEY_HEADER: settings.API_KEY}
+        for i in range(requests + 100):
+            start = time.perf_counter()
+            response = await client.post("/echo/", json={"question": "What are the visiting hours?"}, headers=headers)
+            if i >= 100:
+                timings.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.text
+    timings.sort()
+    return {"p50_us": round(timings[len(timings) // 2] * 1e6, 1), "mean_us": round(sum(timings) / len(timings) * 1e6, 1)}
+
+
+def time_sanitizer(func, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(text)
+    return round((time.perf_counter() - start) / repeat * 1e6, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    args = parser.parse_args()
+    settings.DEVELOPMENT_MODE = False
+
+    stacks = {stack: asyncio.run(time_requests(build_app(stack), args.requests)) for stack in ("none", "legacy", "asgi")}
+    for stack in ("legacy", "asgi"):
+        stacks[stack]["overhead_us"] = round(stacks[stack]["p50_us"] - stacks["none"]["p50_us"], 1)
+
+    length = settings.MAX_QUESTION_LENGTH
+    inputs = {
+        "typical": "<b>What</b> are the visiting hours (weekends)?",
+        "open_brackets": "<" * length,
+        "unclosed_tags": "<a" * (length // 2),
+    }
+    sanitizer = {
+        name: {"legacy_us": time_sanitizer(legacy_sanitize, text, 200), "single_pass_us": time_sanitizer(sanitize_input, text, 200)}
+        for name, text in inputs.items()
+    }
+    print(json.dumps({"requests": args.requests, "middleware": stacks, "sanitizer": sanitizer}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Measure per-check overhead and cross-worker accuracy of the limiter storages.
+
+For each storage, times single SlidingWindowCounterRateLimiter.hit calls
+(the work slowapi does per rate-limited request) on one process. It then
+has N worker processes hammer one client key and reports how many hits were
+admitted against the limit: per-worker memory:// admits N times the limit,
+shared storages admit it once.
+
+With --redis-uri (and the redis package), limits' redis:// storage is
+measured too.
+
+Usage:
+    python bench_rate_limit_storage.py --checks 5000 --workers 4
+    python bench_rate_limit_storage.py --redis-uri redis://localhost:6379/0
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+
+import rate_limit_storage  # noqa: F401  registers the sqlite:// scheme
+
+
+def time_checks(uri, checks):
+    limiter = SlidingWindowCounterRateLimiter(storage_from_string(uri))
+    limit = parse("1000000/minute")
+    timings = []
+    for i in range(checks):
+        start = time.perf_counter()
+        limiter.hit(limit, f"client-{i % 100}")
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "p50_us": round(timings[len(timings) // 2] * 1e6, 1),
+        "p99_us": round(timings[int(len(timings) * 0.99)] * 1e6, 1),
+        "max_us": round(timings[-1] * 1e6, 1),
+    }
+
+
+def hammer(uri, hits, limit, results):
+    limiter = SlidingWindowCounterRateLimiter(storage_from_string(uri))
+    item = parse(f"{limit}/day")
+    results.put(sum(limiter.hit(item, "127.0.0.1") for _ in range(hits)))
+
+
+def admitted_across_workers(uri, workers, hits, limit):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=hammer, args=(uri, hits, limit, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    admitted = sum(results.get(timeout=120) for _ in processes)
+    for process in processes:
+        process.join()
+    return admitted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checks", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=100, help="Per-client limit for the cross-worker run")
+    parser.add_argument("--redis-uri", help="Redis server to measure as well")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        uris = {
+            "memory": "memory://",
+            "sqlite": f"sqlite:///{os.path.join(directory, 'checks.sqlite3')}",
+        }
+        if args.redis_uri:
+            uris["redis"] = args.redis_uri
+        for name, uri in uris.items():
+            results[name] = time_checks(uri, args.checks)
+            if name == "redis":
+                storage_from_string(uri).reset()
+
+        uris["sqlite"] = f"sqlite:///{os.path.join(directory, 'workers.sqlite3')}"
+        for name, uri in uris.items():
+            results[name]["admitted"] = admitted_across_workers(uri, args.workers, args.limit * 2, args.limit)
+
+    print(json.dumps({"workers": args.workers, "limit": args.limit, "storages": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Measure the chat model calls and latency the relevance gate saves.
+
+Runs --questions questions through the RAG chain over an in-memory Chroma
+collection (cosine space, fake embeddings), with a fake chat model taking
+--llm-ms per answer. A --off-topic fraction of the questions is unrelated to
+the collection; the others repeat a chunk, so their best hit is relevant:
+- ungated: every question reaches the chat model,
+- gated:   the relevance gate answers the off-topic ones without it.
+Reports the chat model calls and the mean latency of each kind of question.
+
+Usage:
+    python bench_relevance.py --questions 200 --off-topic 0.3
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import uuid
+
+os.environ.setdefault("API_KEY", "bench")
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import generator
+from relevance import RelevanceGate
+from retrievers import AsyncVectorStoreRetriever
+
+CHUNKS = [f"Chunk {i} about visiting hours, parking and the specialists of ward {i}." for i in range(50)]
+
+
+class SlowFakeChatModel(BaseChatModel):
+    """Chat model stand-in that takes ``delay`` seconds per answer and counts its calls."""
+
+    delay: float = 0.8
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake-chat"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="stub answer"))])
+
+
+def build_chain(model):
+    vector_db = Chroma(
+        collection_name=f"bench-relevance-{uuid.uuid4().hex}",
+        embedding_function=DeterministicFakeEmbedding(size=64),
+        collection_metadata={"hnsw:space": "cosine"},
+    )
+    vector_db.add_texts(CHUNKS)
+    retriever = AsyncVectorStoreRetriever(vectorstore=vector_db, search_type="similarity", search_kwargs={"k": 4})
+    return generator.build_review_chain(retriever, model)
+
+
+async def run(chain, questions):
+    latencies = {"relevant": [], "off_topic": []}
+    for kind, question in questions:
+        start = time.perf_counter()
+        await chain.ainvoke(question)
+        latencies[kind].append(time.perf_counter() - start)
+    return {kind: round(statistics.fmean(values) * 1000, 2) for kind, values in latencies.items() if values}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--off-topic", type=float, default=0.3)
+    parser.add_argument("--llm-ms", type=float, default=800.0)
+    parser.add_argument("--min-score", type=float, default=0.75)
+    args = parser.parse_args()
+
+    off_topic_every = round(1 / args.off_topic) if args.off_topic else 0
+    questions = [
+        ("off_topic", f"Unrelated question number {i}?")
+        if off_topic_every and i % off_topic_every == 0
+        else ("relevant", CHUNKS[i % len(CHUNKS)])
+        for i in range(args.questions)
+    ]
+
+    results = {}
+    for name, min_score in (("ungated", 0.0), ("gated", args.min_score)):
+        model = SlowFakeChatModel(delay=args.llm_ms / 1000)
+        generator.relevance_gate = RelevanceGate(min_score=min_score)
+        mean_ms = asyncio.run(run(build_chain(model), questions))
+        results[name] = {
+            "llm_calls": model.calls,
+            "mean_ms": mean_ms,
+            "llm_calls_avoided": generator.relevance_gate.stats()["llm_calls_avoided"],
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Compare prompt size and latency over a long conversation, with the history
+pasted into the question versus a session with a summarized history.
+
+Runs --turns questions through the RAG chain over an in-memory Chroma
+collection with fake embeddings. The fake chat model answers with
+--answer-words words and takes --ms-per-prompt-token per prompt token
+(a stand-in for prefill cost), so latency follows prompt size:
+- pasted:  every question carries the whole transcript so far, the
+           frontend's workaround,
+- session: the question goes with the session history (recent turns plus
+           a rolling summary written by the same fake model, in the
+           background).
+Reports the prompt tokens and latency at a few turns, and the number of
+summarization calls.
+
+Usage:
+    python bench_sessions.py --turns 40
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("API_KEY", "bench")
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import generator
+from config import settings
+from retrievers import AsyncVectorStoreRetriever
+from sessions import SessionStore
+
+
+class PrefillChatModel(BaseChatModel):
+    """Chat model stand-in whose latency grows with the prompt."""
+
+    answer_words: int = 60
+    seconds_per_token: float = 0.0002
+    prompt_tokens: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "prefill-fake-chat"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = sum(generator.context_builder.token_counter.count(message.content) for message in messages)
+        self.prompt_tokens.append(tokens)
+        await asyncio.sleep(tokens * self.seconds_per_token)
+        answer = " ".join(f"word{i}" for i in range(self.answer_words))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=answer))])
+
+
+def build_chain(model):
+    vector_db = Chroma(collection_name="bench-sessions", embedding_function=DeterministicFakeEmbedding(size=32))
+    if not vector_db._collection.count():
+        vector_db.add_texts([f"Chunk {i} about visiting hours and specialists." for i in range(50)])
+    retriever = AsyncVectorStoreRetriever(vectorstore=vector_db, search_type="similarity", search_kwargs={"k": 3})
+    return generator.build_review_chain(retriever, model)
+
+
+async def run_pasted(chain, model, turns: int):
+    transcript = []
+    latencies = []
+    for i in range(turns):
+        question = f"And what about the cardiology ward on floor {i}?"
+        start = time.perf_counter()
+        answer = await chain.ainvoke("\n".join([*transcript, question]))
+        latencies.append(time.perf_counter() - start)
+        transcript += [f"User: {question}", f"Assistant: {answer}"]
+    return latencies, list(model.prompt_tokens)
+
+
+async def run_session(chain, model, turns: int):
+    async def summarize(summary, folded):
+        message = await model.ainvoke(generator.summary_prompt_template.format_prompt(
+            summary=summary, turns=generator.format_turns(folded)
+        ))
+        return message.content
+
+    store = SessionStore(
+        summarize,
+        token_counter=generator.context_builder.token_counter,
+        recent_turns=settings.SESSION_RECENT_TURNS,
+        history_tokens=settings.SESSION_HISTORY_MAX_TOKENS,
+        summary_tokens=settings.SESSION_SUMMARY_MAX_TOKENS,
+    )
+    session = store.create()
+    latencies = []
+    prompt_tokens = []
+    for i in range(turns):
+        question = f"And what about the cardiology ward on floor {i}?"
+        start = time.perf_counter()
+        answer = await chain.ainvoke(generator.chain_input(question, session))
+        latencies.append(time.perf_counter() - start)
+        prompt_tokens.append(model.prompt_tokens[-1])
+        store.record(session, question, answer)
+        # Users take longer than a summary to type the next question
+        await store.asettle(session)
+    return latencies, prompt_tokens, store.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--answer-words", type=int, default=60)
+    parser.add_argument("--ms-per-prompt-token", type=float, default=0.2)
+    args = parser.parse_args()
+
+    def new_model():
+        return PrefillChatModel(
+            answer_words=args.answer_words, seconds_per_token=args.ms_per_prompt_token / 1000, prompt_tokens=[]
+        )
+
+    model = new_model()
+    pasted_latencies, pasted_tokens = asyncio.run(run_pasted(build_chain(model), model, args.turns))
+    model = new_model()
+    session_latencies, session_tokens, session_stats = asyncio.run(run_session(build_chain(model), model, args.turns))
+
+    checkpoints = sorted({1, 5, 10, 20, args.turns} & set(range(1, args.turns + 1)))
+    print(json.dumps({
+        "turns": {
+            str(turn): {
+                "pasted_prompt_tokens": pasted_tokens[turn - 1],
+                "session_prompt_tokens": session_tokens[turn - 1],
+                "pasted_ms": round(pasted_latencies[turn - 1] * 1000, 1),
+                "session_ms": round(session_latencies[turn - 1] * 1000, 1),
+            }
+            for turn in checkpoints
+        },
+        "pasted_total_prompt_tokens": sum(pasted_tokens),
+        "session_total_prompt_tokens": sum(model.prompt_tokens),
+        "summarization_calls": session_stats["summaries"],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
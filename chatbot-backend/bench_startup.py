@@ -0,0 +1,119 @@
+"""
+Benchmark worker startup: import time and time-to-ready.
+
+For each run, in a fresh interpreter:
+
+- import: wall time of ``import main`` (and, separately, ``import config``
+  and ``import generator``)
+- serve: a uvicorn process is started and polled; reports the time from
+  spawning it until ``/`` answers (the server accepts connections) and until
+  the readiness probe answers 200 (the pipeline can serve traffic)
+
+``--backend-dir`` points the benchmark at another checkout of the backend,
+e.g. a ``git worktree`` of an older commit; pass ``--probe /`` for trees
+without ``/ready``. The child processes inherit the environment, so
+``API_KEY`` and ``OPENAI_API_KEY`` must be set.
+
+Usage:
+    API_KEY=bench OPENAI_API_KEY=sk-bench python bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_SNIPPET = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print("import_seconds", time.perf_counter() - start, file=sys.stderr)
+"""
+
+
+def time_import(backend_dir, module):
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.format(module=module)],
+        cwd=backend_dir, capture_output=True, text=True, check=True,
+    )
+    # The timing goes to stderr, away from the log lines the backend writes to stdout
+    line = next(line for line in result.stderr.splitlines() if line.startswith("import_seconds "))
+    return float(line.split()[1]) * 1000
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_serve(backend_dir, probe, timeout, poll_interval):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=backend_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    listening_ms = ready_ms = None
+    try:
+        with httpx.Client(base_url=base_url, timeout=1.0) as client:
+            while time.perf_counter() - start < timeout:
+                try:
+                    if listening_ms is None and client.get("/").status_code == 200:
+                        listening_ms = (time.perf_counter() - start) * 1000
+                    if client.get(probe).status_code == 200:
+                        ready_ms = (time.perf_counter() - start) * 1000
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(poll_interval)
+    finally:
+        server.terminate()
+        server.wait()
+    return listening_ms, ready_ms
+
+
+def summarize(values):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {"median_ms": round(statistics.median(values), 1), "min_ms": round(min(values), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--backend-dir", default=BACKEND_DIR)
+    parser.add_argument("--probe", default="/ready", help="Path polled until it answers 200")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--poll-interval", type=float, default=0.02, help="Seconds between probes")
+    args = parser.parse_args()
+
+    imports = {module: [] for module in ("config", "generator", "main")}
+    listening, ready = [], []
+    for _ in range(args.runs):
+        for module, timings in imports.items():
+            timings.append(time_import(args.backend_dir, module))
+        listening_ms, ready_ms = time_serve(args.backend_dir, args.probe, args.timeout, args.poll_interval)
+        listening.append(listening_ms)
+        ready.append(ready_ms)
+
+    print(json.dumps({
+        "backend_dir": args.backend_dir,
+        "runs": args.runs,
+        "import": {module: summarize(timings) for module, timings in imports.items()},
+        "listening": summarize(listening),
+        "ready": summarize(ready),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
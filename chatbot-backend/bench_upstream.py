@@ -0,0 +1,142 @@
+"""
+Measure query-embedding tail latency through the upstream client layer.
+
+Runs --calls aembed_query calls, --concurrency at a time, against
+fake_openai.FakeOpenAIServer with a slow tail (--slow-rate of the requests
+take --slow-latency-ms) and injected 500s (--error-rate), for:
+- default: OpenAIEmbeddings with the SDK's own client and retries,
+- pooled:  the shared tuned clients with jittered retries (upstream.py),
+- hedged:  the same, with HedgedEmbeddings on top.
+Every variant gets a fresh stand-in with the same seed. Reports p50, p95,
+p99 and max latency, failed calls and the upstream requests made, and the
+p99 improvement of each variant over the default.
+
+Usage:
+    python bench_upstream.py --calls 1000 --slow-rate 0.03 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("API_KEY", "bench")
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+import httpx
+import numpy as np
+from langchain_openai import OpenAIEmbeddings
+
+from config import settings
+from fake_openai import FakeOpenAIServer
+from upstream import AsyncRetryingTransport, HedgedEmbeddings, RetryPolicy
+
+
+def build_embeddings(variant: str, base_url: str):
+    if variant == "default":
+        return OpenAIEmbeddings(base_url=base_url, api_key="sk-bench", check_embedding_ctx_length=False), None
+    policy = RetryPolicy(
+        max_retries=settings.UPSTREAM_MAX_RETRIES,
+        base_backoff_ms=settings.UPSTREAM_RETRY_BASE_MS,
+        max_backoff_ms=settings.UPSTREAM_RETRY_MAX_MS,
+        deadline_seconds=settings.UPSTREAM_DEADLINE_SECONDS or None,
+    )
+    limits = httpx.Limits(
+        max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE,
+        keepalive_expiry=settings.UPSTREAM_KEEPALIVE_SECONDS,
+    )
+    client = httpx.AsyncClient(
+        transport=AsyncRetryingTransport(httpx.AsyncHTTPTransport(limits=limits), policy),
+        timeout=settings.UPSTREAM_TIMEOUT_SECONDS,
+    )
+    embeddings = OpenAIEmbeddings(
+        base_url=base_url,
+        api_key="sk-bench",
+        check_embedding_ctx_length=False,
+        http_async_client=client,
+        max_retries=0,
+        request_timeout=settings.UPSTREAM_TIMEOUT_SECONDS,
+    )
+    if variant == "hedged":
+        embeddings = HedgedEmbeddings(
+            embeddings,
+            percentile=settings.EMBEDDING_HEDGE_PERCENTILE,
+            min_delay_ms=settings.EMBEDDING_HEDGE_MIN_DELAY_MS,
+        )
+    return embeddings, policy
+
+
+async def run_calls(embeddings, calls: int, concurrency: int):
+    latencies = []
+    failures = 0
+    next_call = 0
+
+    async def worker():
+        nonlocal next_call, failures
+        while next_call < calls:
+            index = next_call
+            next_call += 1
+            start = time.perf_counter()
+            try:
+                await embeddings.aembed_query(f"question {index}")
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--slow-latency-ms", type=float, default=1000.0)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--variants", default="default,pooled,hedged")
+    args = parser.parse_args()
+
+    results = {}
+    for variant in args.variants.split(","):
+        server = FakeOpenAIServer(
+            embedding_latency_ms=args.latency_ms,
+            embedding_jitter_ms=args.jitter_ms,
+            slow_rate=args.slow_rate,
+            slow_latency_ms=args.slow_latency_ms,
+            error_rate=args.error_rate,
+            seed=args.seed,
+        )
+        with server:
+            embeddings, policy = build_embeddings(variant, server.base_url)
+            latencies, failures = asyncio.run(run_calls(embeddings, args.calls, args.concurrency))
+            upstream = server.stats()
+        latencies_ms = np.asarray(latencies) * 1000
+        results[variant] = {
+            "p50_ms": round(float(np.percentile(latencies_ms, 50)), 1),
+            "p95_ms": round(float(np.percentile(latencies_ms, 95)), 1),
+            "p99_ms": round(float(np.percentile(latencies_ms, 99)), 1),
+            "max_ms": round(float(latencies_ms.max()), 1),
+            "failed_calls": failures,
+            "upstream_requests": upstream["embedding_requests"],
+            "slow_responses": upstream["slow_responses"],
+            "injected_errors": upstream["injected_errors"],
+        }
+        if isinstance(embeddings, HedgedEmbeddings):
+            results[variant]["hedging"] = embeddings.stats()
+        if policy is not None:
+            results[variant]["retries"] = policy.stats()
+
+    if "default" in results:
+        baseline = results["default"]["p99_ms"]
+        for variant, result in results.items():
+            result["p99_vs_default"] = round(result["p99_ms"] / baseline, 3)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
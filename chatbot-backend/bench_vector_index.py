@@ -0,0 +1,95 @@
+"""
+Benchmark the memory-mapped vector index against Chroma.
+
+Fills an in-memory Chroma collection with random unit vectors (OpenAI
+embeddings are unit length), exports it with export_vector_index and runs
+the same noisy queries through both. Recall@k is measured against exact
+brute-force search, which is what the memory-mapped index computes.
+
+Usage:
+    python bench_vector_index.py --chunks 10000 --dim 1536 --queries 200
+"""
+import argparse
+import json
+import tempfile
+import time
+import uuid
+
+import numpy as np
+from langchain_chroma import Chroma
+
+from vector_index import MmapVectorIndex, export_vector_index
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def timed(func, queries):
+    timings, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(func(query))
+        timings.append((time.perf_counter() - start) * 1000)
+    return results, {"p50_ms": round(percentile(timings, 0.5), 3), "p99_ms": round(percentile(timings, 0.99), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=10_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = rng.standard_normal((args.chunks, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"chunk-{i}" for i in range(args.chunks)]
+
+    vector_db = Chroma(collection_name=f"bench-{uuid.uuid4().hex}")
+    for start in range(0, args.chunks, 5000):
+        end = min(start + 5000, args.chunks)
+        vector_db._collection.upsert(
+            ids=ids[start:end],
+            embeddings=vectors[start:end],
+            documents=[f"Chunk {i} text" for i in range(start, end)],
+            metadatas=[{"page": i % 100} for i in range(start, end)],
+        )
+
+    queries = vectors[rng.integers(0, args.chunks, args.queries)] + 0.05 * rng.standard_normal(
+        (args.queries, args.dim)
+    ).astype(np.float32)
+    exact = [set(np.argsort(-(vectors @ query))[:args.k]) for query in queries]
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        export_vector_index(vector_db, directory)
+        export_seconds = time.perf_counter() - start
+        index = MmapVectorIndex.load(directory)
+
+        chroma_docs, chroma_timing = timed(lambda q: vector_db.similarity_search_by_vector(q.tolist(), k=args.k), queries)
+        mmap_docs, mmap_timing = timed(lambda q: index.similarity_search_by_vector(q, k=args.k), queries)
+        _, filtered_timing = timed(
+            lambda q: index.similarity_search_by_vector(q, k=args.k, filter={"page": {"$in": [1, 2, 3]}}), queries
+        )
+
+    def recall(results):
+        hits = [len({int(doc.id.split("-")[1]) for doc in docs} & truth) for docs, truth in zip(results, exact)]
+        return round(sum(hits) / (args.k * len(exact)), 4)
+
+    print(json.dumps({
+        "chunks": args.chunks,
+        "dim": args.dim,
+        "export_seconds": round(export_seconds, 2),
+        "chroma": {**chroma_timing, f"recall@{args.k}": recall(chroma_docs)},
+        "mmap": {**mmap_timing, f"recall@{args.k}": recall(mmap_docs)},
+        "mmap_page_filtered": filtered_timing,
+        "speedup_p50": round(chroma_timing["p50_ms"] / mmap_timing["p50_ms"], 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Measure memory and recall@k of quantized vector index settings.
+
+Runs against an exported index (``retriever.py --export-vector-index``) so
+a setting can be chosen per corpus, or against random unit vectors when
+no index is given. Queries are stored vectors plus noise, so no embedding
+API calls are made. Recall is measured against the uncompressed float32
+index.
+
+Memory and disk are compared with the Chroma data the export sits next
+to: the persist directory of ``--index-dir``, or a Chroma collection
+built from the synthetic vectors. Chroma loads its HNSW segments into
+memory to serve queries; the exported index keeps only the scanned
+arrays in memory, but adds its files to the persist directory.
+
+Usage:
+    python bench_vector_quantization.py --index-dir chroma_data/vector_index
+    python bench_vector_quantization.py --chunks 20000 --dim 1536
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+from vector_index import MmapVectorIndex, chroma_footprint, quantize_vector_index
+
+RESCORE_FACTORS = (1, 2, 4, 8)
+CHROMA_BATCH_SIZE = 5000
+
+
+def write_synthetic_index(directory, chunks, dim, rng):
+    vectors = rng.standard_normal((chunks, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.save(os.path.join(directory, "vectors.npy"), vectors)
+    np.save(os.path.join(directory, "norms.npy"), np.linalg.norm(vectors, axis=1))
+    np.save(os.path.join(directory, "pages.npy"), np.zeros(chunks, dtype=np.int32))
+    np.save(os.path.join(directory, "offsets.npy"), np.zeros(chunks + 1, dtype=np.int64))
+    open(os.path.join(directory, "texts.bin"), "wb").close()
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"count": chunks, "ids": [str(i) for i in range(chunks)], "sources": [None] * chunks}, f)
+
+
+def write_synthetic_chroma(directory, vectors):
+    collection = chromadb.PersistentClient(path=directory).create_collection("bench")
+    for start in range(0, len(vectors), CHROMA_BATCH_SIZE):
+        batch = np.asarray(vectors[start:start + CHROMA_BATCH_SIZE])
+        collection.add(
+            ids=[str(i) for i in range(start, start + len(batch))],
+            embeddings=batch,
+            documents=[""] * len(batch),
+        )
+
+
+def evaluate(index, queries, truth, k, chroma):
+
+    hits, timings = 0, []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = index.search(query, k)
+        timings.append((time.perf_counter() - start) * 1000)
+        hits += len({row for row, _ in found} & expected)
+    footprint = index.memory_footprint()
+    return {
+        f"recall@{k}": round(hits / (k * len(truth)), 4),
+        "p50_ms": round(float(np.percentile(timings, 50)), 3),
+        "scan_mb": round(footprint["scan_bytes"] / 2**20, 2),
+        "disk_mb": round(footprint["disk_bytes"] / 2**20, 2),
+        # Memory kept to serve queries, relative to Chroma's HNSW segments
+        "memory_vs_chroma": round(footprint["scan_bytes"] / chroma["chroma_segment_bytes"], 3),
+        # Persist directory size with the export, relative to the Chroma data alone
+        "disk_vs_chroma": round(1 + footprint["disk_bytes"] / chroma["chroma_disk_bytes"], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-dir", help="Exported float32 index to evaluate (default: synthetic vectors)")
+    parser.add_argument("--chunks", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.05, help="Gaussian noise added to the sampled query vectors")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        base = os.path.join(workdir, "float32")
+        if args.index_dir:
+            shutil.copytree(args.index_dir, base)
+            for name in ("codes.npy", "scales.npy"):
+                if os.path.exists(os.path.join(base, name)):
+                    raise SystemExit(f"{args.index_dir} is already quantized, export it again without --quantize")
+        else:
+            os.makedirs(base)
+            write_synthetic_index(base, args.chunks, args.dim, rng)
+
+        exact = MmapVectorIndex.load(base)
+        if args.index_dir:
+            chroma = chroma_footprint(os.path.dirname(os.path.abspath(args.index_dir)))
+        else:
+            write_synthetic_chroma(os.path.join(workdir, "chroma"), exact.vectors)
+            chroma = chroma_footprint(os.path.join(workdir, "chroma"))
+        sampled = np.asarray(exact.vectors[np.sort(rng.integers(0, len(exact), args.queries))])
+        queries = sampled + args.noise * rng.standard_normal(sampled.shape).astype(np.float32)
+        truth = [{row for row, _ in exact.search(query, args.k)} for query in queries]
+
+        results = {"float32": evaluate(exact, queries, truth, args.k, chroma)}
+        for quantization in ("float16", "int8"):
+            for keep_exact in (True, False):
+                directory = os.path.join(workdir, f"{quantization}-{keep_exact}")
+                shutil.copytree(base, directory)
+                quantize_vector_index(directory, quantization, keep_exact=keep_exact)
+                if keep_exact:
+                    for factor in RESCORE_FACTORS:
+                        index = MmapVectorIndex.load(directory, rescore_factor=factor)
+                        results[f"{quantization}+rescore x{factor}"] = evaluate(
+                            index, queries, truth, args.k, chroma
+                        )
+                else:
+                    index = MmapVectorIndex.load(directory)
+                    results[f"{quantization} (no exact vectors)"] = evaluate(
+                        index, queries, truth, args.k, chroma
+                    )
+
+    print(json.dumps({
+        "chunks": len(exact),
+        "dim": exact.vectors.shape[1],
+        "chroma_disk_mb": round(chroma["chroma_disk_bytes"] / 2**20, 2),
+        "chroma_segment_mb": round(chroma["chroma_segment_bytes"] / 2**20, 2),
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
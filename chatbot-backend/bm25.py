@@ -0,0 +1,138 @@
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.documents import Document
+
+from faq import STOPWORDS
+
+BM25_INDEX_FILENAME = "bm25_index.json"
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in re.findall(r"\w+", text.lower()) if token not in STOPWORDS]
+
+
+@dataclass
+class LexicalResult:
+    """BM25 hits for a query and how confidently the top hit answers it."""
+    documents: List[Document]
+    scores: List[float]
+    coverage: float
+    margin: float
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over the ingested chunks.
+
+    Stores the chunk texts and metadata alongside the postings, so hits can
+    be returned as Documents without touching the vector store.
+    """
+
+    def __init__(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[dict], k1: float = 1.5, b: float = 0.75):
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.metadatas = list(metadatas)
+        self.k1 = k1
+        self.b = b
+
+        self.postings: Dict[str, List[tuple]] = defaultdict(list)
+        self.doc_lengths = []
+        for doc_index, text in enumerate(self.texts):
+            counts = Counter(tokenize(text))
+            self.doc_lengths.append(sum(counts.values()))
+            for token, tf in counts.items():
+                self.postings[token].append((doc_index, tf))
+        self.postings = dict(self.postings)
+
+        total = len(self.texts)
+        self.avg_doc_length = sum(self.doc_lengths) / total if total else 0.0
+        self.idf = {
+            token: math.log(1 + (total - len(hits) + 0.5) / (len(hits) + 0.5))
+            for token, hits in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, k: int = 5) -> LexicalResult:
+        """
+        Score the chunks for a query with BM25.
+
+        Args:
+            query (str): Question text
+            k (int): Number of hits to return
+
+        Returns:
+            LexicalResult: Top-k hits, the share of the query's IDF weight found
+            in the top hit (coverage) and the ratio of the first to the second
+            score (margin)
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        scores: Dict[int, float] = defaultdict(float)
+        for term in terms:
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_index, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_index] / self.avg_doc_length)
+                scores[doc_index] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        if not ranked:
+            return LexicalResult([], [], 0.0, 0.0)
+
+        # Unknown terms get the IDF of a term seen in a single chunk
+        unknown_idf = math.log(1 + (len(self.texts) - 0.5) / 1.5)
+        query_weight = sum(self.idf.get(term, unknown_idf) for term in terms)
+        top_terms = set(tokenize(self.texts[ranked[0][0]]))
+        coverage = sum(self.idf[term] for term in terms if term in top_terms) / query_weight
+        margin = ranked[0][1] / ranked[1][1] if len(ranked) > 1 and ranked[1][1] > 0 else math.inf
+
+        return LexicalResult(
+            documents=[self._document(doc_index) for doc_index, _ in ranked],
+            scores=[score for _, score in ranked],
+            coverage=coverage,
+            margin=margin,
+        )
+
+    def save(self, path: str) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "texts": self.texts, "metadatas": self.metadatas}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """Load a saved index, or return None if there is none."""
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["ids"], data["texts"], data["metadatas"])
+
+    def _document(self, doc_index: int) -> Document:
+        return Document(id=self.ids[doc_index], page_content=self.texts[doc_index], metadata=self.metadatas[doc_index])
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Document]], k: int, rank_constant: int = 60) -> List[Document]:
+    """
+    Fuse ranked document lists with reciprocal rank fusion.
+
+    Each document scores ``sum(1 / (rank_constant + rank))`` over the lists it
+    appears in; documents are identified by ID, or by content if they have none.
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.id or doc.page_content
+            scores[key] += 1 / (rank_constant + rank)
+            documents.setdefault(key, doc)
+    fused = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in fused]
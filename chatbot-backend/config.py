@@ -21,9 +21,116 @@ class Settings(BaseSettings):
     RATE_LIMIT_GENERATE: str = "10/minute"
     RATE_LIMIT_CHAT: str = "30/minute"
     RATE_LIMIT_HEALTH: str = "60/minute"
+    RATE_LIMIT_SESSIONS: str = "30/minute"
+    # "sqlite:///path" (relative to the backend directory) is shared by the workers on a host,
+    # "redis://host:port/db" by every host using that server;
+    # "memory://" keeps separate counters per worker
+    RATE_LIMIT_STORAGE_URI: str = "sqlite:///cache/rate_limits.sqlite3"
+    RATE_LIMIT_STRATEGY: str = "sliding-window-counter"
+
+    # Request header carrying the trace ID echoed in every response; empty disables tracing
+    TRACE_ID_HEADER: str = "X-Request-ID"
 
     DEVELOPMENT_MODE: bool = True
 
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MAX_SIZE: int = 1000
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    # Pin the precomputed answers of warm_cache.json (see warm_cache.py) in the answer cache,
+    # checking for a rebuilt file every WARM_CACHE_RELOAD_SECONDS
+    WARM_CACHE_ENABLED: bool = True
+    WARM_CACHE_RELOAD_SECONDS: float = 60.0
+
+    EMBEDDING_MODEL: str = "text-embedding-ada-002"
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "cache/embeddings.sqlite3"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200000
+    # Split over-long inputs by tiktoken token count before embedding them. Questions are
+    # bounded by MAX_QUESTION_LENGTH, so query-time embedding does not need it
+    EMBEDDING_CHECK_CTX_LENGTH: bool = True
+
+    # Hedge query embedding calls slower than the EMBEDDING_HEDGE_PERCENTILE of recent ones
+    # with a duplicate call; costs about (100 - percentile)% extra embedding requests
+    EMBEDDING_HEDGE_ENABLED: bool = False
+    EMBEDDING_HEDGE_PERCENTILE: float = 95.0
+    EMBEDDING_HEDGE_MIN_DELAY_MS: float = 20.0
+
+    EMBEDDING_BATCH_ENABLED: bool = True
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0
+    EMBEDDING_BATCH_MAX_SIZE: int = 64
+
+    # Shared HTTP clients for the OpenAI APIs. Each attempt times out after
+    # UPSTREAM_TIMEOUT_SECONDS; the whole call, retries included, after UPSTREAM_DEADLINE_SECONDS
+    UPSTREAM_MAX_CONNECTIONS: int = 100
+    UPSTREAM_MAX_KEEPALIVE: int = 20
+    UPSTREAM_KEEPALIVE_SECONDS: float = 30.0
+    UPSTREAM_TIMEOUT_SECONDS: float = 30.0
+    UPSTREAM_DEADLINE_SECONDS: float = 60.0
+    UPSTREAM_MAX_RETRIES: int = 2
+    UPSTREAM_RETRY_BASE_MS: float = 200.0
+    UPSTREAM_RETRY_MAX_MS: float = 2000.0
+
+    VECTOR_BACKEND: str = "chroma"  # "chroma" or "numpy"
+    VECTOR_RESCORE_FACTOR: int = 4  # shortlist size per result when the numpy index is quantized
+
+    CONTEXT_MAX_TOKENS: int = 1500
+    CONTEXT_DEDUPE_THRESHOLD: float = 0.9
+    CONTEXT_MMR_ENABLED: bool = False
+    CONTEXT_MMR_LAMBDA: float = 0.7
+    CONTEXT_TOKENIZER_ENCODING: str = "cl100k_base"
+
+    LEXICAL_INDEX_ENABLED: bool = True
+    LEXICAL_FAST_PATH_MIN_COVERAGE: float = 0.9
+    LEXICAL_FAST_PATH_MIN_MARGIN: float = 1.3
+
+    FAQ_PATH: str = "../data/faq.json"  # relative to the backend directory
+    FAQ_MIN_CONFIDENCE: float = 0.6
+    FAQ_RELOAD_INTERVAL_SECONDS: float = 5.0
+
+    # Load the BM25 and memory-mapped vector indexes when main is imported, so a
+    # preforking server (gunicorn --preload) shares them between its workers
+    PRELOAD_INDEXES: bool = False
+    # One directory per additional knowledge base, laid out like chroma_data/; requests pick
+    # one by name. At most CORPUS_POOL_MAX_OPEN are open at once, and, unless it is 0, their
+    # combined on-disk size stays under CORPUS_POOL_MAX_MB
+    CORPORA_PATH: str = "corpora/"
+    CORPUS_POOL_MAX_OPEN: int = 8
+    CORPUS_POOL_MAX_MB: int = 0
+
+    # /generate/batch: questions per request, and how many of them run through the chain at once.
+    # Each question counts against RATE_LIMIT_GENERATE
+    BATCH_MAX_QUESTIONS: int = 50
+    BATCH_MAX_CONCURRENCY: int = 4
+
+    # Conversation sessions: the last SESSION_RECENT_TURNS turns are sent verbatim while they fit in
+    # SESSION_HISTORY_MAX_TOKENS, older ones are folded into a summary of SESSION_SUMMARY_MAX_TOKENS.
+    # Sessions idle for SESSION_IDLE_SECONDS are dropped, and the least recently used beyond SESSION_MAX_SESSIONS
+    SESSION_MAX_SESSIONS: int = 10000
+    SESSION_IDLE_SECONDS: float = 1800.0
+    SESSION_RECENT_TURNS: int = 4
+    SESSION_HISTORY_MAX_TOKENS: int = 800
+    SESSION_SUMMARY_MAX_TOKENS: int = 250
+    # Retrieve follow-ups as a standalone question the chat model rewrites them into from the session history
+    SESSION_CONDENSE_QUESTIONS: bool = True
+    SESSION_CONDENSE_MAX_TOKENS: int = 100
+
+    # Relevance gate: questions whose best retrieved chunk has a cosine similarity below
+    # RELEVANCE_MIN_SCORE get the FAQ match, or a canned answer, without calling the chat model
+    # (unrelated questions score around 0.7 with text-embedding-ada-002; 0 disables the gate).
+    # When the best chunk beats the next by RELEVANCE_DECISIVE_MARGIN, only the chunks within
+    # that margin of it, and at least RELEVANCE_MIN_CHUNKS, go into the prompt (0 disables)
+    RELEVANCE_MIN_SCORE: float = 0.0
+    RELEVANCE_DECISIVE_MARGIN: float = 0.0
+    RELEVANCE_MIN_CHUNKS: int = 1
+
+    # Question retrieved once at startup to warm the embedding client and the indexes
+    WARMUP_QUERY: str = ""
+    # A failed startup is retried by the first request STARTUP_RETRY_SECONDS after it failed;
+    # the wait doubles with each consecutive failure, up to STARTUP_RETRY_MAX_SECONDS
+    STARTUP_RETRY_SECONDS: float = 5.0
+    STARTUP_RETRY_MAX_SECONDS: float = 300.0
+
     @field_validator("CORS_ORIGINS")
     def parse_cors_origins(cls, v: str) -> List[str]:
         """Parse CORS origins from string."""
@@ -56,7 +163,7 @@ class Settings(BaseSettings):
             app_logger.info("Using default CORS_ORIGINS due to parsing error")
             return ["http://localhost:5173"]
 
-    @field_validator("RATE_LIMIT_GENERATE", "RATE_LIMIT_CHAT", "RATE_LIMIT_HEALTH")
+    @field_validator("RATE_LIMIT_GENERATE", "RATE_LIMIT_CHAT", "RATE_LIMIT_HEALTH", "RATE_LIMIT_SESSIONS")
     def parse_rate_limit(cls, v: str) -> str:
         """Parse rate limit string to ensure it's in the correct format."""
         if not v:
@@ -88,25 +195,82 @@ class Settings(BaseSettings):
         case_sensitive = True
         extra = "ignore"
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
+    def log_settings(self):
+        """Log the effective settings. Called at application startup rather than on import."""
         app_logger.debug(f"CORS_ORIGINS: {self.CORS_ORIGINS}")
         app_logger.debug(f"MAX_REQUEST_SIZE: {self.MAX_REQUEST_SIZE}")
         app_logger.debug(f"MAX_QUESTION_LENGTH: {self.MAX_QUESTION_LENGTH}")
         app_logger.debug(f"RATE_LIMIT_GENERATE: {self.RATE_LIMIT_GENERATE}")
         app_logger.debug(f"RATE_LIMIT_CHAT: {self.RATE_LIMIT_CHAT}")
         app_logger.debug(f"RATE_LIMIT_HEALTH: {self.RATE_LIMIT_HEALTH}")
+        app_logger.debug(f"RATE_LIMIT_SESSIONS: {self.RATE_LIMIT_SESSIONS}")
+        app_logger.debug(f"RATE_LIMIT_STORAGE_URI: {self.RATE_LIMIT_STORAGE_URI.rsplit('@', 1)[-1]}")
+        app_logger.debug(f"RATE_LIMIT_STRATEGY: {self.RATE_LIMIT_STRATEGY}")
+        app_logger.debug(f"TRACE_ID_HEADER: {self.TRACE_ID_HEADER}")
         app_logger.debug(f"DEVELOPMENT_MODE: {self.DEVELOPMENT_MODE}")
+        app_logger.debug(f"ANSWER_CACHE_ENABLED: {self.ANSWER_CACHE_ENABLED}")
+        app_logger.debug(f"ANSWER_CACHE_MAX_SIZE: {self.ANSWER_CACHE_MAX_SIZE}")
+        app_logger.debug(f"ANSWER_CACHE_TTL_SECONDS: {self.ANSWER_CACHE_TTL_SECONDS}")
+        app_logger.debug(f"ANSWER_CACHE_SIMILARITY_THRESHOLD: {self.ANSWER_CACHE_SIMILARITY_THRESHOLD}")
+        app_logger.debug(f"WARM_CACHE_ENABLED: {self.WARM_CACHE_ENABLED}")
+        app_logger.debug(f"WARM_CACHE_RELOAD_SECONDS: {self.WARM_CACHE_RELOAD_SECONDS}")
+        app_logger.debug(f"EMBEDDING_MODEL: {self.EMBEDDING_MODEL}")
+        app_logger.debug(f"EMBEDDING_CACHE_ENABLED: {self.EMBEDDING_CACHE_ENABLED}")
+        app_logger.debug(f"EMBEDDING_CACHE_PATH: {self.EMBEDDING_CACHE_PATH}")
+        app_logger.debug(f"EMBEDDING_CACHE_MAX_ENTRIES: {self.EMBEDDING_CACHE_MAX_ENTRIES}")
+        app_logger.debug(f"EMBEDDING_CHECK_CTX_LENGTH: {self.EMBEDDING_CHECK_CTX_LENGTH}")
+        app_logger.debug(f"EMBEDDING_HEDGE_ENABLED: {self.EMBEDDING_HEDGE_ENABLED}")
+        app_logger.debug(f"EMBEDDING_HEDGE_PERCENTILE: {self.EMBEDDING_HEDGE_PERCENTILE}")
+        app_logger.debug(f"EMBEDDING_HEDGE_MIN_DELAY_MS: {self.EMBEDDING_HEDGE_MIN_DELAY_MS}")
+        app_logger.debug(f"EMBEDDING_BATCH_ENABLED: {self.EMBEDDING_BATCH_ENABLED}")
+        app_logger.debug(f"EMBEDDING_BATCH_MAX_WAIT_MS: {self.EMBEDDING_BATCH_MAX_WAIT_MS}")
+        app_logger.debug(f"EMBEDDING_BATCH_MAX_SIZE: {self.EMBEDDING_BATCH_MAX_SIZE}")
+        app_logger.debug(f"UPSTREAM_MAX_CONNECTIONS: {self.UPSTREAM_MAX_CONNECTIONS}")
+        app_logger.debug(f"UPSTREAM_MAX_KEEPALIVE: {self.UPSTREAM_MAX_KEEPALIVE}")
+        app_logger.debug(f"UPSTREAM_KEEPALIVE_SECONDS: {self.UPSTREAM_KEEPALIVE_SECONDS}")
+        app_logger.debug(f"UPSTREAM_TIMEOUT_SECONDS: {self.UPSTREAM_TIMEOUT_SECONDS}")
+        app_logger.debug(f"UPSTREAM_DEADLINE_SECONDS: {self.UPSTREAM_DEADLINE_SECONDS}")
+        app_logger.debug(f"UPSTREAM_MAX_RETRIES: {self.UPSTREAM_MAX_RETRIES}")
+        app_logger.debug(f"UPSTREAM_RETRY_BASE_MS: {self.UPSTREAM_RETRY_BASE_MS}")
+        app_logger.debug(f"UPSTREAM_RETRY_MAX_MS: {self.UPSTREAM_RETRY_MAX_MS}")
+        app_logger.debug(f"VECTOR_BACKEND: {self.VECTOR_BACKEND}")
+        app_logger.debug(f"VECTOR_RESCORE_FACTOR: {self.VECTOR_RESCORE_FACTOR}")
+        app_logger.debug(f"CONTEXT_MAX_TOKENS: {self.CONTEXT_MAX_TOKENS}")
+        app_logger.debug(f"CONTEXT_DEDUPE_THRESHOLD: {self.CONTEXT_DEDUPE_THRESHOLD}")
+        app_logger.debug(f"CONTEXT_MMR_ENABLED: {self.CONTEXT_MMR_ENABLED}")
+        app_logger.debug(f"CONTEXT_MMR_LAMBDA: {self.CONTEXT_MMR_LAMBDA}")
+        app_logger.debug(f"CONTEXT_TOKENIZER_ENCODING: {self.CONTEXT_TOKENIZER_ENCODING}")
+        app_logger.debug(f"LEXICAL_INDEX_ENABLED: {self.LEXICAL_INDEX_ENABLED}")
+        app_logger.debug(f"LEXICAL_FAST_PATH_MIN_COVERAGE: {self.LEXICAL_FAST_PATH_MIN_COVERAGE}")
+        app_logger.debug(f"LEXICAL_FAST_PATH_MIN_MARGIN: {self.LEXICAL_FAST_PATH_MIN_MARGIN}")
+        app_logger.debug(f"FAQ_PATH: {self.FAQ_PATH}")
+        app_logger.debug(f"FAQ_MIN_CONFIDENCE: {self.FAQ_MIN_CONFIDENCE}")
+        app_logger.debug(f"FAQ_RELOAD_INTERVAL_SECONDS: {self.FAQ_RELOAD_INTERVAL_SECONDS}")
+        app_logger.debug(f"PRELOAD_INDEXES: {self.PRELOAD_INDEXES}")
+        app_logger.debug(f"CORPORA_PATH: {self.CORPORA_PATH}")
+        app_logger.debug(f"CORPUS_POOL_MAX_OPEN: {self.CORPUS_POOL_MAX_OPEN}")
+        app_logger.debug(f"CORPUS_POOL_MAX_MB: {self.CORPUS_POOL_MAX_MB}")
+        app_logger.debug(f"BATCH_MAX_QUESTIONS: {self.BATCH_MAX_QUESTIONS}")
+        app_logger.debug(f"BATCH_MAX_CONCURRENCY: {self.BATCH_MAX_CONCURRENCY}")
+        app_logger.debug(f"SESSION_MAX_SESSIONS: {self.SESSION_MAX_SESSIONS}")
+        app_logger.debug(f"SESSION_IDLE_SECONDS: {self.SESSION_IDLE_SECONDS}")
+        app_logger.debug(f"SESSION_RECENT_TURNS: {self.SESSION_RECENT_TURNS}")
+        app_logger.debug(f"SESSION_HISTORY_MAX_TOKENS: {self.SESSION_HISTORY_MAX_TOKENS}")
+        app_logger.debug(f"SESSION_SUMMARY_MAX_TOKENS: {self.SESSION_SUMMARY_MAX_TOKENS}")
+        app_logger.debug(f"SESSION_CONDENSE_QUESTIONS: {self.SESSION_CONDENSE_QUESTIONS}")
+        app_logger.debug(f"SESSION_CONDENSE_MAX_TOKENS: {self.SESSION_CONDENSE_MAX_TOKENS}")
+        app_logger.debug(f"RELEVANCE_MIN_SCORE: {self.RELEVANCE_MIN_SCORE}")
+        app_logger.debug(f"RELEVANCE_DECISIVE_MARGIN: {self.RELEVANCE_DECISIVE_MARGIN}")
+        app_logger.debug(f"RELEVANCE_MIN_CHUNKS: {self.RELEVANCE_MIN_CHUNKS}")
+        app_logger.debug(f"WARMUP_QUERY: {self.WARMUP_QUERY}")
+        app_logger.debug(f"STARTUP_RETRY_SECONDS: {self.STARTUP_RETRY_SECONDS}")
+        app_logger.debug(f"STARTUP_RETRY_MAX_SECONDS: {self.STARTUP_RETRY_MAX_SECONDS}")
         # sensitive information
         app_logger.debug("API_KEY: ***MASKED***")
         app_logger.debug(f"API_KEY_HEADER: {self.API_KEY_HEADER}")
 
 try:
     settings = Settings()
-    app_logger.info("Settings loaded successfully")
-    app_logger.debug(f"Settings API_KEY: {settings.API_KEY}")
-    app_logger.debug(f"Settings API_KEY_HEADER: {settings.API_KEY_HEADER}")
-    app_logger.debug(f"Settings CORS_ORIGINS: {settings.CORS_ORIGINS}")
 except Exception as e:
     app_logger.error(f"Error creating Settings instance: {str(e)}")
     raise 
\ No newline at end of file
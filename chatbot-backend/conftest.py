@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+
+# Settings and the OpenAI clients are created at import time, so the test
+# environment must be in place before any backend module is imported.
+os.environ.setdefault("API_KEY", "test-api-key")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("DEVELOPMENT_MODE", "true")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("RATE_LIMIT_STORAGE_URI", "memory://")
+
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+import generator
+from config import settings
+
+LLM_DELAY = 0.5
+
+# Everything initialize() publishes, restored after each test that builds a pipeline
+PIPELINE_GLOBALS = (
+    "chat_model", "query_embeddings", "reviews_vector_db", "vector_index", "lexical_index",
+    "reviews_retriever", "review_chain", "answer_cache", "warm_cache", "corpus_pool",
+)
+
+
+class SlowFakeChatModel(BaseChatModel):
+    """Chat model stand-in that takes LLM_DELAY seconds per answer."""
+
+    delay: float = LLM_DELAY
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake-chat"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="stub answer"))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="stub answer"))])
+
+
+class StreamingFakeChatModel(SlowFakeChatModel):
+    """Chat model stand-in that streams its answer one token at a time."""
+
+    tokens: list = ["stub ", "streamed ", "answer"]
+    token_delay: float = 0.01
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for token in self.tokens:
+            await asyncio.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+def parse_sse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def build_stub_chain(tmp_path):
+    """
+    Factory for RAG chains over two documents in a Chroma store under tmp_path,
+    answered by ``model`` (a SlowFakeChatModel by default).
+    """
+    stores = []
+
+    def build(model=None):
+        vector_db = Chroma(
+            collection_name=f"test-{uuid.uuid4().hex}",
+            embedding_function=DeterministicFakeEmbedding(size=32),
+            persist_directory=str(tmp_path / "stub_chroma"),
+        )
+        stores.append(vector_db)
+        vector_db.add_texts(
+            ["The hospital is open from 8 AM to 8 PM daily.", "Dr. John Doe is a cardiology specialist."],
+            metadatas=[{"page": 0}, {"page": 1}],
+        )
+        retriever = generator.AsyncVectorStoreRetriever(
+            vectorstore=vector_db, search_type="similarity", search_kwargs={"k": 2}
+        )
+        return generator.build_review_chain(retriever, model or SlowFakeChatModel())
+
+    yield build
+    if stores:
+        generator.close_vector_db(stores[0])
+
+
+@pytest.fixture
+def cold_pipeline(tmp_path, monkeypatch):
+    """
+    A pipeline that has not started, with its data and cache directories under tmp_path.
+
+    The generator globals and the startup state are restored afterwards, and
+    the Chroma store a test initialized is closed.
+    """
+    monkeypatch.setattr(generator, "BOOKS_CHROMA_PATH", str(tmp_path / "chroma_data"))
+    monkeypatch.setattr(settings, "CORPORA_PATH", str(tmp_path / "corpora"))
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_PATH", str(tmp_path / "cache" / "embeddings.sqlite3"))
+    for name in PIPELINE_GLOBALS:
+        monkeypatch.setattr(generator, name, getattr(generator, name))
+    monkeypatch.setattr(generator, "startup", generator.StartupState())
+    original_vector_db = generator.reviews_vector_db
+    yield
+    if generator.reviews_vector_db is not None and generator.reviews_vector_db is not original_vector_db:
+        generator.close_vector_db(generator.reviews_vector_db)
+
+
+@pytest.fixture
+def pipeline(cold_pipeline):
+    """
+    An initialized pipeline over an empty knowledge base under tmp_path.
+
+    The endpoints would otherwise build the real pipeline on their first
+    request and replace the chains the tests patch in.
+    """
+    generator.initialize()
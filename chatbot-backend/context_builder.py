@@ -0,0 +1,250 @@
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from logger import app_logger
+
+EMPTY_CONTEXT = "No relevant information found."
+# Longest chunk overlap looked for when merging neighbouring chunks (retriever.py uses 50 characters)
+MAX_OVERLAP_CHARS = 200
+# Shortest suffix/prefix match treated as an overlap rather than a coincidence
+MIN_OVERLAP_CHARS = 10
+# Characters per token assumed when no tiktoken encoding is available
+APPROX_CHARS_PER_TOKEN = 4
+
+
+class TokenCounter:
+    """
+    Counts and truncates text in model tokens with a local tiktoken encoding.
+
+    The encoding is loaded on first use, or by an explicit ``load()``
+    during startup. tiktoken downloads its BPE files the first time; when
+    the encoding cannot be loaded (e.g. no network access) the counter
+    falls back to an estimate of ``APPROX_CHARS_PER_TOKEN`` characters per
+    token.
+    """
+
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._loaded = False
+
+    def load(self):
+        """Load the encoding now rather than on the first count."""
+        if self._loaded:
+            return
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(self.encoding_name)
+        except Exception as e:
+            app_logger.warning(f"Could not load tiktoken encoding {self.encoding_name}, estimating token counts: {str(e)}")
+        self._loaded = True
+
+    @property
+    def encoding(self):
+        self.load()
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        encoding = self.encoding
+        if encoding is None:
+            return -(-len(text) // APPROX_CHARS_PER_TOKEN)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Return the longest prefix of ``text`` that fits in ``max_tokens``."""
+        if max_tokens <= 0:
+            return ""
+        encoding = self.encoding
+        if encoding is None:
+            return text[:max_tokens * APPROX_CHARS_PER_TOKEN]
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+@dataclass
+class BuiltContext:
+    """Packed context text, the passages it contains and its size before and after packing."""
+    text: str
+    passages: List[Document]
+    tokens: int
+    input_tokens: int
+    input_chunks: int
+    merged: int = 0
+    duplicates: int = 0
+    dropped: int = 0
+    truncated: bool = False
+
+
+def _chunk_position(doc: Document) -> Optional[Tuple[str, int, int]]:
+    """``(source, page, index)`` parsed from a ``source:page:index`` chunk ID, if the document has one."""
+    if not doc.id:
+        return None
+    parts = doc.id.rsplit(":", 2)
+    if len(parts) != 3 or not parts[1].lstrip("-").isdigit() or not parts[2].isdigit():
+        return None
+    return parts[0], int(parts[1]), int(parts[2])
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of ``left`` that is a prefix of ``right``."""
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _shingles(text: str, size: int = 3) -> frozenset:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return frozenset([" ".join(words)]) if words else frozenset()
+    return frozenset(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+def _similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ContextBuilder:
+    """
+    Turns retrieved chunks into a compact prompt context.
+
+    1. Chunks from the same page whose positions are consecutive, or whose
+       texts overlap, are merged into one passage with the overlap removed.
+    2. Passages whose word-shingle Jaccard similarity with a better-ranked
+       passage reaches ``dedupe_threshold`` are dropped.
+    3. With ``mmr_lambda`` set, passages are reordered by maximal marginal
+       relevance: ``lambda * relevance - (1 - lambda) * max similarity``
+       to the passages already chosen, with relevance decaying linearly
+       with the retrieval rank.
+    4. Passages are packed in order until ``max_tokens`` is reached;
+       passages that do not fit are skipped, and a first passage that is
+       too long on its own is truncated.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 1500,
+        dedupe_threshold: float = 0.9,
+        mmr_lambda: Optional[float] = None,
+        token_counter: Optional[TokenCounter] = None,
+        separator: str = "\n\n",
+    ):
+        self.max_tokens = max_tokens
+        self.dedupe_threshold = dedupe_threshold
+        self.mmr_lambda = mmr_lambda
+        self.token_counter = token_counter or TokenCounter()
+        self.separator = separator
+
+    def build(self, docs: Sequence[Document]) -> BuiltContext:
+        """
+        Build the context for a list of retrieved chunks, best first.
+
+        Returns:
+            BuiltContext: The packed text and packing statistics
+        """
+        docs = list(docs)
+        input_tokens = self.token_counter.count(self.separator.join(doc.page_content for doc in docs))
+        if not docs:
+            return BuiltContext(EMPTY_CONTEXT, [], self.token_counter.count(EMPTY_CONTEXT), 0, 0)
+
+        passages = self._merge(docs)
+        merged = len(docs) - len(passages)
+        shingles = [_shingles(doc.page_content) for doc in passages]
+
+        kept, kept_shingles = [], []
+        for doc, doc_shingles in zip(passages, shingles):
+            if any(_similarity(doc_shingles, other) >= self.dedupe_threshold for other in kept_shingles):
+                continue
+            kept.append(doc)
+            kept_shingles.append(doc_shingles)
+        duplicates = len(passages) - len(kept)
+
+        if self.mmr_lambda is not None and len(kept) > 2:
+            kept = self._mmr(kept, kept_shingles)
+
+        packed, used, truncated = [], 0, False
+        separator_tokens = self.token_counter.count(self.separator)
+        for doc in kept:
+            cost = self.token_counter.count(doc.page_content) + (separator_tokens if packed else 0)
+            if used + cost <= self.max_tokens:
+                packed.append(doc)
+                used += cost
+            elif not packed:
+                text = self.token_counter.truncate(doc.page_content, self.max_tokens)
+                packed.append(Document(id=doc.id, page_content=text, metadata=doc.metadata))
+                used, truncated = self.token_counter.count(text), True
+
+        text = self.separator.join(doc.page_content for doc in packed)
+        return BuiltContext(
+            text=text,
+            passages=packed,
+            tokens=self.token_counter.count(text),
+            input_tokens=input_tokens,
+            input_chunks=len(docs),
+            merged=merged,
+            duplicates=duplicates,
+            dropped=len(kept) - len(packed),
+            truncated=truncated,
+        )
+
+    def format(self, docs: Sequence[Document]) -> str:
+        """Build the context and return its text, logging how much it was reduced."""
+        context = self.build(docs)
+        app_logger.info(
+            f"Context: {context.input_chunks} chunks -> {len(context.passages)} passages "
+            f"({context.merged} merged, {context.duplicates} duplicates, {context.dropped} over budget), "
+            f"{context.input_tokens} -> {context.tokens} tokens (budget {self.max_tokens})"
+        )
+        return context.text
+
+    def _merge(self, docs: List[Document]) -> List[Document]:
+        """Merge consecutive or overlapping chunks of the same page, keeping the best rank of each group."""
+        passages: List[Tuple[int, Document]] = []
+        groups = {}
+        for rank, doc in enumerate(docs):
+            position = _chunk_position(doc)
+            key = (position[0], position[1]) if position else (doc.metadata.get("source"), doc.metadata.get("page"))
+            if key[1] is None:
+                passages.append((rank, doc))
+            else:
+                groups.setdefault(key, []).append((rank, position[2] if position else None, doc))
+
+        for members in groups.values():
+            members.sort(key=lambda member: (member[1] is None, member[1] or 0))
+            rank, index, doc = members[0]
+            text, last_index = doc.page_content, index
+            for next_rank, next_index, next_doc in members[1:]:
+                if next_doc.page_content in text:
+                    rank = min(rank, next_rank)
+                    continue
+                overlap = _overlap(text, next_doc.page_content)
+                consecutive = last_index is not None and next_index == last_index + 1
+                if overlap or consecutive:
+                    text += next_doc.page_content[overlap:] if overlap else " " + next_doc.page_content
+                    rank, last_index = min(rank, next_rank), next_index
+                    continue
+                passages.append((rank, Document(id=doc.id, page_content=text, metadata=doc.metadata)))
+                rank, doc, text, last_index = next_rank, next_doc, next_doc.page_content, next_index
+            passages.append((rank, Document(id=doc.id, page_content=text, metadata=doc.metadata)))
+
+        passages.sort(key=lambda item: item[0])
+        return [doc for _, doc in passages]
+
+    def _mmr(self, docs: List[Document], shingles: List[frozenset]) -> List[Document]:
+        relevance = [1 - rank / len(docs) for rank in range(len(docs))]
+        chosen = [0]
+        remaining = list(range(1, len(docs)))
+        while remaining:
+            best = max(
+                remaining,
+                key=lambda i: self.mmr_lambda * relevance[i]
+                - (1 - self.mmr_lambda) * max(_similarity(shingles[i], shingles[j]) for j in chosen),
+            )
+            chosen.append(best)
+            remaining.remove(best)
+        return [docs[i] for i in chosen]
@@ -0,0 +1,184 @@
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from logger import app_logger
+from singleflight import SingleFlight
+
+CORPUS_NAME_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+class UnknownCorpusError(LookupError):
+    """Raised for a corpus name that is malformed or has no directory."""
+
+
+@dataclass(eq=False)
+class Corpus:
+    """
+    The retrieval pipeline of one knowledge base.
+
+    Attributes:
+        name: Corpus identifier, None for the default knowledge base
+        chain: RAG chain answering questions from this corpus
+        retriever: Retriever of the chain
+        answer_cache: Answer cache of this corpus, if enabled
+        warm_cache: Loader pinning the corpus' precomputed answers in its answer cache
+        footprint_bytes: On-disk size of the corpus, used as its memory cost
+        close: Releases the corpus' stores once it is evicted and unused
+    """
+    name: Optional[str]
+    chain: Any
+    retriever: Any
+    answer_cache: Any = None
+    warm_cache: Any = None
+    footprint_bytes: int = 0
+    close: Optional[Callable[[], None]] = None
+    users: int = 0
+    evicted: bool = False
+
+
+def directory_size(path: str) -> int:
+    """Total size in bytes of the files under a directory."""
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+class CorpusPool:
+    """
+    LRU pool of per-corpus pipelines, opened on first use.
+
+    Each corpus is a subdirectory of ``root`` laid out like ``chroma_data/``
+    (a Chroma store plus the optional exported vector and BM25 indexes).
+    ``open_corpus(name, path)`` builds its pipeline; it runs in a worker
+    thread, and concurrent requests for a corpus that is being opened wait
+    for the same open, so requests to corpora already open are never held
+    up. Once more than ``max_open`` corpora are open, or their combined
+    footprint exceeds ``max_bytes`` (0 for no limit), the least recently
+    used ones are evicted. An evicted corpus is closed when the last request
+    using it finishes; requested again before then, it is reinstated.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        open_corpus: Callable[[str, str], Corpus],
+        max_open: int = 8,
+        max_bytes: int = 0,
+    ):
+        self.root = root
+        self.open_corpus = open_corpus
+        self.max_open = max_open
+        self.max_bytes = max_bytes
+        self._open: "OrderedDict[str, Corpus]" = OrderedDict()
+        self._retiring: Dict[str, Corpus] = {}
+        self._opening = SingleFlight()
+
+        self.hits = 0
+        self.opens = 0
+        self.evictions = 0
+        self.total_open_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._open)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._open
+
+    @asynccontextmanager
+    async def acquire(self, name: str):
+        """
+        Use a corpus for the duration of the block, opening it if needed.
+
+        Raises:
+            UnknownCorpusError: If the name is malformed or there is no such corpus
+        """
+        corpus = await self.aget(name)
+        # Evicted and closed while this request waited for the open to finish
+        while corpus.evicted and self._retiring.get(name) is not corpus:
+            corpus = await self.aget(name)
+        corpus.users += 1
+        try:
+            yield corpus
+        finally:
+            corpus.users -= 1
+            if corpus.evicted and not corpus.users and self._retiring.get(name) is corpus:
+                del self._retiring[name]
+                await self._aclose(corpus)
+
+    async def aget(self, name: str) -> Corpus:
+        """Return the open corpus, opening it on first use."""
+        corpus = self._open.get(name)
+        if corpus is not None:
+            self._open.move_to_end(name)
+            self.hits += 1
+            return corpus
+        if not CORPUS_NAME_PATTERN.fullmatch(name):
+            raise UnknownCorpusError(f"Invalid corpus name: {name!r}")
+        return await self._opening.do(name, lambda: self._aopen(name))
+
+    async def _aopen(self, name: str) -> Corpus:
+        corpus = self._retiring.pop(name, None)
+        if corpus is not None:
+            corpus.evicted = False
+            self.hits += 1
+        else:
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path):
+                raise UnknownCorpusError(f"Unknown corpus: {name}")
+            start_time = time.perf_counter()
+            corpus = await asyncio.to_thread(self.open_corpus, name, path)
+            elapsed = time.perf_counter() - start_time
+            self.opens += 1
+            self.total_open_seconds += elapsed
+            app_logger.info(f"Opened corpus {name} ({corpus.footprint_bytes} bytes) in {elapsed * 1000:.0f} ms")
+
+        self._open[name] = corpus
+        for evicted in self._evict():
+            if evicted.users:
+                self._retiring[evicted.name] = evicted
+            else:
+                await self._aclose(evicted)
+        return corpus
+
+    def _evict(self):
+        evicted = []
+        while len(self._open) > 1 and (
+            len(self._open) > self.max_open
+            or (self.max_bytes and self.footprint_bytes() > self.max_bytes)
+        ):
+            _, corpus = self._open.popitem(last=False)
+            corpus.evicted = True
+            self.evictions += 1
+            app_logger.info(f"Evicted corpus {corpus.name}")
+            evicted.append(corpus)
+        return evicted
+
+    async def _aclose(self, corpus: Corpus) -> None:
+        if corpus.close is None:
+            return
+        try:
+            await asyncio.to_thread(corpus.close)
+        except Exception as e:
+            app_logger.warning(f"Error closing corpus {corpus.name}: {str(e)}")
+
+    def footprint_bytes(self) -> int:
+        return sum(corpus.footprint_bytes for corpus in self._open.values())
+
+    def stats(self) -> dict:
+        return {
+            "open": len(self._open),
+            "retiring": len(self._retiring),
+            "footprint_bytes": self.footprint_bytes(),
+            "hits": self.hits,
+            "opens": self.opens,
+            "evictions": self.evictions,
+            "mean_open_ms": self.total_open_seconds / self.opens * 1000 if self.opens else 0.0,
+        }
@@ -0,0 +1,151 @@
+import asyncio
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, List
+
+from langchain_core.embeddings import Embeddings
+
+from logger import app_logger
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that micro-batches concurrent query embeddings.
+
+    ``aembed_query`` calls arriving within ``max_wait_ms`` of the first
+    queued one are sent together in a single ``aembed_documents`` call (at
+    most ``max_batch_size`` texts), and the vectors are fanned back out to
+    the waiting callers. Identical texts in a batch are embedded once. The
+    sync methods and ``aembed_documents`` go straight to the wrapped model.
+
+    When the queries are known in advance, as for a batch of questions,
+    ``prefetched`` embeds them all up front instead.
+    """
+
+    def __init__(self, underlying: Embeddings, max_wait_ms: float = 5.0, max_batch_size: int = 64):
+        self.underlying = underlying
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        self._in_flight = set()
+        self._prefetched: Dict[str, List[float]] = {}
+        self._prefetch_users = Counter()
+
+        self.batches = 0
+        self.queries = 0
+        self.batch_sizes = Counter()
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.prefetch_hits = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.underlying.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = self._prefetched.get(text)
+        if vector is not None:
+            self.prefetch_hits += 1
+            return vector
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        return await future
+
+    @asynccontextmanager
+    async def prefetched(self, texts: Iterable[str]):
+        """
+        Embed ``texts`` in ``max_batch_size`` chunks and serve ``aembed_query``
+        calls for them from the result until the block exits.
+
+        A failed prefetch is logged and the queries are embedded as usual.
+        """
+        texts = list(dict.fromkeys(texts))
+        self._prefetch_users.update(texts)
+        try:
+            missing = [text for text in texts if text not in self._prefetched]
+            for start in range(0, len(missing), self.max_batch_size):
+                batch = missing[start:start + self.max_batch_size]
+                try:
+                    vectors = await self.underlying.aembed_documents(batch)
+                except Exception as e:
+                    app_logger.warning(f"Prefetching query embeddings failed: {str(e)}")
+                    break
+                self._prefetched.update(zip(batch, vectors))
+            yield
+        finally:
+            self._prefetch_users.subtract(texts)
+            for text in texts:
+                if self._prefetch_users[text] <= 0:
+                    del self._prefetch_users[text]
+                    self._prefetched.pop(text, None)
+
+    def stats(self) -> dict:
+        """Return batch-size and queue-wait metrics."""
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "mean_queue_wait_ms": self.total_queue_wait / self.queries * 1000 if self.queries else 0.0,
+            "max_queue_wait_ms": self.max_queue_wait * 1000,
+            "prefetch_hits": self.prefetch_hits,
+        }
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # The embedding call runs as its own task so the next batch can be
+            # collected while this one is in flight.
+            task = asyncio.get_running_loop().create_task(self._embed_batch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _embed_batch(self, batch) -> None:
+        now = time.perf_counter()
+        self.batches += 1
+        self.queries += len(batch)
+        self.batch_sizes[len(batch)] += 1
+        for _, _, queued_at in batch:
+            wait = now - queued_at
+            self.total_queue_wait += wait
+            self.max_queue_wait = max(self.max_queue_wait, wait)
+
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        try:
+            vectors = dict(zip(texts, await self.underlying.aembed_documents(texts)))
+        except Exception as e:
+            app_logger.error(f"Batched query embedding failed: {str(e)}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(vectors[text])
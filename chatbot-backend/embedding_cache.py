@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+from config import settings
+from logger import app_logger
+from upstream import HedgedEmbeddings, client_kwargs
+
+# Stay well below SQLite's bound-parameter limit in IN (...) queries
+SQLITE_BATCH_SIZE = 500
+# Access times of read vectors are buffered and written once this many
+# keys, or this old, unless a put writes them first
+ACCESS_FLUSH_KEYS = 256
+ACCESS_FLUSH_SECONDS = 30.0
+# How long a put waits for another process's write lock, and how long a
+# read, or an access-time write made by one, waits for a lock
+WRITE_TIMEOUT_SECONDS = 30.0
+READ_TIMEOUT_SECONDS = 0.05
+
+
+def embedding_key(model: str, text: str) -> str:
+    """Content address of an embedding: a hash of the model name and the text."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class SQLiteEmbeddingStore:
+    """
+    On-disk embedding store keyed by content hash.
+
+    Vectors are stored as float32 blobs in a SQLite database in WAL mode, so
+    several uvicorn workers and the ingest script can share one file. Once
+    the store holds more than ``max_entries`` vectors, the least recently
+    used ones are deleted.
+
+    Reads go through their own connection, so they never queue behind a
+    put waiting for the write lock. A read only buffers the access times of
+    its hits; they are written in one transaction with the next put, or
+    once ``ACCESS_FLUSH_KEYS`` are buffered or the oldest is
+    ``ACCESS_FLUSH_SECONDS`` old. That write from the read path is skipped
+    when the lock is taken, leaving the times buffered, so recency is
+    approximate between puts but reads wait at most
+    ``READ_TIMEOUT_SECONDS``.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=WRITE_TIMEOUT_SECONDS, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._read_lock = threading.Lock()
+        self._reader = sqlite3.connect(self.path, timeout=READ_TIMEOUT_SECONDS, check_same_thread=False)
+        self._access_lock = threading.Lock()
+        self._accessed: Dict[str, float] = {}
+        self._accessed_since = time.time()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """Return the stored vectors for the given keys, skipping unknown keys and treating a locked store as empty."""
+        keys = list(keys)
+        found = {}
+        try:
+            with self._read_lock:
+                for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+                    batch = keys[start:start + SQLITE_BATCH_SIZE]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._reader.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        except sqlite3.OperationalError as exc:
+            app_logger.warning(f"Embedding cache read failed, treating {len(keys) - len(found)} keys as misses: {exc}")
+        if found:
+            self._record_access(found)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        """Store vectors by key, then evict the least recently used entries beyond the size cap."""
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            self._write_access(self._take_access())
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)", rows
+            )
+            self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self._size -= overflow
+                app_logger.debug("Evicted %d embeddings from cache", overflow)
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._write_access(self._take_access())
+                self._conn.commit()
+            finally:
+                self._conn.close()
+        with self._read_lock:
+            self._reader.close()
+
+    def _record_access(self, keys: Iterable[str]) -> None:
+        """Buffer the access time of read keys, writing the buffer when it is due and the write lock is free."""
+        now = time.time()
+        with self._access_lock:
+            if not self._accessed:
+                self._accessed_since = now
+            self._accessed.update(dict.fromkeys(keys, now))
+            due = len(self._accessed) >= ACCESS_FLUSH_KEYS or now - self._accessed_since >= ACCESS_FLUSH_SECONDS
+        if not due or not self._lock.acquire(blocking=False):
+            return
+        accessed = self._take_access()
+        try:
+            self._conn.execute(f"PRAGMA busy_timeout = {int(READ_TIMEOUT_SECONDS * 1000)}")
+            self._write_access(accessed)
+            self._conn.commit()
+        except sqlite3.OperationalError as exc:
+            self._conn.rollback()
+            with self._access_lock:
+                self._accessed = {**accessed, **self._accessed}
+            app_logger.debug(f"Embedding cache access times left buffered: {exc}")
+        finally:
+            self._conn.execute(f"PRAGMA busy_timeout = {int(WRITE_TIMEOUT_SECONDS * 1000)}")
+            self._lock.release()
+
+    def _take_access(self) -> Dict[str, float]:
+        with self._access_lock:
+            accessed, self._accessed = self._accessed, {}
+        return accessed
+
+    def _write_access(self, accessed: Dict[str, float]) -> None:
+        """Write access times in the current transaction; the caller holds the write lock and commits."""
+        if accessed:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?", [(at, key) for key, at in accessed.items()]
+            )
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves repeated texts from a persistent store.
+
+    Lookups for a call are done in one batch, and all misses are embedded
+    together through the wrapped model in batches of ``batch_size`` texts.
+    """
+
+    def __init__(self, underlying: Embeddings, store: SQLiteEmbeddingStore, model: str, batch_size: int = 512):
+        self.underlying = underlying
+        self.store = store
+        self.model = model
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts)
+        computed = {}
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            computed.update(zip((key for key, _ in batch), self.underlying.embed_documents([t for _, t in batch])))
+        return self._finish(keys, found, computed)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = embedding_key(self.model, text)
+        found = self.store.get_many([key])
+        if key in found:
+            self.hits += 1
+            return found[key]
+        self.misses += 1
+        vector = self.underlying.embed_query(text)
+        self.store.put_many({key: vector})
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = await asyncio.to_thread(self._lookup, texts)
+        computed = {}
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            vectors = await self.underlying.aembed_documents([t for _, t in batch])
+            computed.update(zip((key for key, _ in batch), vectors))
+        return await asyncio.to_thread(self._finish, keys, found, computed)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = embedding_key(self.model, text)
+        found = await asyncio.to_thread(self.store.get_many, [key])
+        if key in found:
+            self.hits += 1
+            return found[key]
+        self.misses += 1
+        vector = await self.underlying.aembed_query(text)
+        await asyncio.to_thread(self.store.put_many, {key: vector})
+        return vector
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.store)}
+
+    def _lookup(self, texts: List[str]):
+        keys = [embedding_key(self.model, text) for text in texts]
+        found = self.store.get_many(set(keys))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return keys, found, list(missing.items())
+
+    def _finish(self, keys, found, computed) -> List[List[float]]:
+        self.store.put_many(computed)
+        found.update(computed)
+        return [found[key] for key in keys]
+
+
+def build_embeddings() -> Embeddings:
+    """
+    Build the embedding function shared by ingestion and query time.
+
+    Returns:
+        Embeddings: OpenAI embeddings on the shared upstream clients, hedged
+        with EMBEDDING_HEDGE_ENABLED, and wrapped in the persistent cache
+        unless EMBEDDING_CACHE_ENABLED is off
+    """
+    embeddings = OpenAIEmbeddings(
+        model=settings.EMBEDDING_MODEL,
+        check_embedding_ctx_length=settings.EMBEDDING_CHECK_CTX_LENGTH,
+        **client_kwargs(),
+    )
+    if settings.EMBEDDING_HEDGE_ENABLED:
+        embeddings = HedgedEmbeddings(
+            embeddings,
+            percentile=settings.EMBEDDING_HEDGE_PERCENTILE,
+            min_delay_ms=settings.EMBEDDING_HEDGE_MIN_DELAY_MS,
+        )
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return embeddings
+    store = SQLiteEmbeddingStore(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_ENTRIES)
+    return CachedEmbeddings(embeddings, store, model=settings.EMBEDDING_MODEL)
@@ -26,4 +26,31 @@ class ModelError(HTTPException):
         super().__init__(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=detail
-        ) 
\ No newline at end of file
+        ) 
+class AuthenticationError(HTTPException):
+    def __init__(self, detail):
+        super().__init__(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=detail
+        )
+
+class RequestTooLargeError(HTTPException):
+    def __init__(self, detail):
+        super().__init__(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=detail
+        )
+
+class ServiceUnavailableError(HTTPException):
+    def __init__(self, detail):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail
+        )
+
+class NotFoundError(HTTPException):
+    def __init__(self, detail: str):
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=detail
+        )
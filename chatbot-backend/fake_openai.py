@@ -0,0 +1,265 @@
+"""
+Local stand-in for the OpenAI chat completions and embeddings API.
+
+Used by bench_load.py and the tests to exercise the real OpenAI clients
+without network access or cost. It can also be run on its own, for load
+testing a separately started server:
+
+    python fake_openai.py --port 8100 --chat-latency-ms 300 --chat-jitter-ms 100
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 uvicorn main:app --workers 4
+"""
+import argparse
+import base64
+import json
+import random
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+DEFAULT_ANSWER = "The hospital is open from 8 AM to 8 PM daily."
+EMBEDDING_DIMENSIONS = 1536
+
+
+class InjectedError(Exception):
+    """A failure the stand-in was asked to inject."""
+
+
+class _ThreadingServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connection attempts under load, which
+    # clients retry after a second
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Clients that give up on a request (cancelled hedges, timeouts) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeOpenAIServer:
+    """
+    Threaded HTTP server answering ``POST /v1/chat/completions`` and ``POST /v1/embeddings``.
+
+    Every response is delayed by ``latency_ms`` plus a uniformly distributed
+    ``±jitter_ms``, drawn from a seeded generator so runs are reproducible.
+    To reproduce a slow upstream tail, a ``slow_rate`` fraction of requests
+    take ``slow_latency_ms`` instead; an ``error_rate`` fraction fail with a
+    500 after their delay.
+    Chat completions always return ``answer``; embeddings are deterministic
+    unit vectors derived from a hash of each input, returned as floats or
+    base64 as requested. Streaming completions are not supported.
+    """
+
+    def __init__(
+        self,
+        chat_latency_ms: float = 300.0,
+        chat_jitter_ms: float = 0.0,
+        embedding_latency_ms: float = 50.0,
+        embedding_jitter_ms: float = 0.0,
+        answer: str = DEFAULT_ANSWER,
+        dimensions: int = EMBEDDING_DIMENSIONS,
+        slow_rate: float = 0.0,
+        slow_latency_ms: float = 1000.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.chat_latency_ms = chat_latency_ms
+        self.chat_jitter_ms = chat_jitter_ms
+        self.embedding_latency_ms = embedding_latency_ms
+        self.embedding_jitter_ms = embedding_jitter_ms
+        self.answer = answer
+        self.dimensions = dimensions
+        self.slow_rate = slow_rate
+        self.slow_latency_ms = slow_latency_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chat_requests = 0
+        self.embedding_requests = 0
+        self.embedded_inputs = 0
+        self.slow_responses = 0
+        self.injected_errors = 0
+        self._server = _ThreadingServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stats(self) -> dict:
+        """Return the number of requests served, texts embedded, and slow and failed responses injected."""
+        with self._lock:
+            return {
+                "chat_requests": self.chat_requests,
+                "embedding_requests": self.embedding_requests,
+                "embedded_inputs": self.embedded_inputs,
+                "slow_responses": self.slow_responses,
+                "injected_errors": self.injected_errors,
+            }
+
+    def _delay(self, latency_ms: float, jitter_ms: float) -> float:
+        with self._lock:
+            if self.slow_rate and self._random.random() < self.slow_rate:
+                self.slow_responses += 1
+                return self.slow_latency_ms / 1000
+            jitter = self._random.uniform(-jitter_ms, jitter_ms) if jitter_ms else 0.0
+        return max(latency_ms + jitter, 0.0) / 1000
+
+    def _fail(self) -> bool:
+        with self._lock:
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.injected_errors += 1
+                return True
+        return False
+
+    def _chat_completion(self, request: dict) -> dict:
+        with self._lock:
+            self.chat_requests += 1
+        time.sleep(self._delay(self.chat_latency_ms, self.chat_jitter_ms))
+        if self._fail():
+            raise InjectedError()
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in request.get("messages", [])) // 4
+        completion_tokens = len(self.answer) // 4
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.answer},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _embeddings(self, request: dict) -> dict:
+        inputs = request["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        with self._lock:
+            self.embedding_requests += 1
+            self.embedded_inputs += len(inputs)
+        time.sleep(self._delay(self.embedding_latency_ms, self.embedding_jitter_ms))
+        if self._fail():
+            raise InjectedError()
+        data = []
+        for index, item in enumerate(inputs):
+            vector = self.embed(item)
+            embedding = (
+                base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+                if request.get("encoding_format") == "base64" else vector.tolist()
+            )
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        return {
+            "object": "list",
+            "data": data,
+            "model": request.get("model", "fake"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    def embed(self, item) -> np.ndarray:
+        """The unit vector returned for an input string or token list."""
+        seed = zlib.crc32(json.dumps(item).encode("utf-8"))
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                try:
+                    request = json.loads(body or b"{}")
+                    if self.path.rstrip("/").endswith("/chat/completions"):
+                        if request.get("stream"):
+                            raise ValueError("Streaming is not supported by the stand-in")
+                        self._send(200, server._chat_completion(request))
+                    elif self.path.rstrip("/").endswith("/embeddings"):
+                        self._send(200, server._embeddings(request))
+                    else:
+                        self._send(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+                except InjectedError:
+                    self._send(500, {"error": {"message": "Injected failure", "type": "server_error"}})
+                except (KeyError, ValueError) as e:
+                    self._send(400, {"error": {"message": str(e), "type": "invalid_request_error"}})
+
+            def _send(self, status: int, payload: dict):
+                encoded = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--chat-latency-ms", type=float, default=300.0)
+    parser.add_argument("--chat-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0)
+    parser.add_argument("--embedding-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of requests taking --slow-latency-ms")
+    parser.add_argument("--slow-latency-ms", type=float, default=1000.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with a 500")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        chat_latency_ms=args.chat_latency_ms,
+        chat_jitter_ms=args.chat_jitter_ms,
+        embedding_latency_ms=args.embedding_latency_ms,
+        embedding_jitter_ms=args.embedding_jitter_ms,
+        slow_rate=args.slow_rate,
+        slow_latency_ms=args.slow_latency_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        host=args.host,
+        port=args.port,
+    )
+    print(f"Serving the OpenAI stand-in at {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
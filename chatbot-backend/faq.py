@@ -0,0 +1,226 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from answer_cache import normalize_question
+from logger import app_logger
+
+STOPWORDS = frozenset(
+    "a an and are at be by can do does for from how i in is it me my of on or the to what when where which who why "
+    "with you your".split()
+)
+
+# Weight of a query token matched through a one-edit typo instead of exactly
+FUZZY_TOKEN_WEIGHT = 0.8
+# Minimum token length for typo tolerance; shorter tokens match exactly only
+FUZZY_MIN_TOKEN_LENGTH = 4
+# Posting lists longer than this are not used to generate candidates, only to score them
+MAX_CANDIDATE_POSTINGS = 2000
+
+
+@dataclass
+class FAQMatch:
+    """A predefined answer matched to a question, with a confidence in [0, 1]."""
+    question: str
+    answer: str
+    confidence: float
+    match_type: str
+
+
+def _deletes(token: str) -> List[str]:
+    return [token[:i] + token[i + 1:] for i in range(len(token))]
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """True if ``a`` and ``b`` differ by at most one insertion, deletion, substitution or transposition."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diffs) == 1:
+            return True
+        return len(diffs) == 2 and diffs[1] == diffs[0] + 1 and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]]
+    if len(a) > len(b):
+        a, b = b, a
+    for i in range(len(b)):
+        if b[:i] + b[i + 1:] == a:
+            return True
+    return False
+
+
+class FAQIndex:
+    """
+    Match index over predefined question/answer pairs.
+
+    A question is first looked up by its normalized form. Otherwise its
+    content tokens are matched against a token inverted index, tolerating
+    one-edit typos through a deletion index over the vocabulary, and the
+    candidates are scored with IDF-weighted Dice similarity:
+    ``2 * matched_weight / (query_weight + entry_weight)``.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str]]):
+        self.questions: List[str] = []
+        self.answers: List[str] = []
+        self.exact: Dict[str, int] = {}
+        postings: Dict[str, List[int]] = defaultdict(list)
+        entry_tokens: List[frozenset] = []
+
+        for question, answer in entries:
+            entry_id = len(self.questions)
+            self.questions.append(question)
+            self.answers.append(answer)
+            normalized = normalize_question(question)
+            self.exact.setdefault(normalized, entry_id)
+            tokens = frozenset(self._content_tokens(normalized))
+            entry_tokens.append(tokens)
+            for token in tokens:
+                postings[token].append(entry_id)
+
+        total = max(len(self.questions), 1)
+        self.postings = dict(postings)
+        self.idf = {token: math.log(1 + total / len(ids)) for token, ids in self.postings.items()}
+        self.entry_tokens = entry_tokens
+        self.entry_weights = [sum(self.idf[token] for token in tokens) for tokens in entry_tokens]
+
+        self.deletes: Dict[str, List[str]] = defaultdict(list)
+        for token in self.postings:
+            if len(token) >= FUZZY_MIN_TOKEN_LENGTH:
+                for deleted in _deletes(token):
+                    self.deletes[deleted].append(token)
+        self.deletes = dict(self.deletes)
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    @classmethod
+    def from_file(cls, path: str) -> "FAQIndex":
+        """Load ``[{"question": ..., "answer": ...}, ...]`` from a JSON file."""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls((item["question"], item["answer"]) for item in data)
+
+    def match(self, question: str, min_confidence: float = 0.0) -> Optional[FAQMatch]:
+        """
+        Find the best matching predefined answer.
+
+        Args:
+            question (str): Sanitized question
+            min_confidence (float): Matches scoring below this are discarded
+
+        Returns:
+            Optional[FAQMatch]: The best match, or None
+        """
+        normalized = normalize_question(question)
+        entry_id = self.exact.get(normalized)
+        if entry_id is not None:
+            return FAQMatch(self.questions[entry_id], self.answers[entry_id], 1.0, "exact")
+
+        query = self._resolve_tokens(self._content_tokens(normalized))
+        if not query:
+            return None
+        query_weight = sum(self.idf.get(token, 0.0) for token, _ in query.values()) or 1.0
+
+        by_df = sorted(query.items(), key=lambda item: len(self.postings[item[1][0]]))
+        scores: Dict[int, float] = defaultdict(float)
+        for _, (token, weight) in by_df:
+            ids = self.postings[token]
+            if not scores or len(ids) <= MAX_CANDIDATE_POSTINGS:
+                for entry_id in ids[:MAX_CANDIDATE_POSTINGS]:
+                    scores[entry_id] += self.idf[token] * weight
+            else:
+                for entry_id in scores:
+                    if token in self.entry_tokens[entry_id]:
+                        scores[entry_id] += self.idf[token] * weight
+
+        best_id, best_score = None, 0.0
+        for entry_id, matched in scores.items():
+            score = 2 * matched / (query_weight + self.entry_weights[entry_id])
+            if score > best_score:
+                best_id, best_score = entry_id, score
+
+        if best_id is None or best_score < min_confidence:
+            return None
+        return FAQMatch(self.questions[best_id], self.answers[best_id], round(min(best_score, 1.0), 4), "fuzzy")
+
+    def _resolve_tokens(self, tokens: List[str]) -> Dict[str, Tuple[str, float]]:
+        """Map each query token to an indexed token and weight, correcting single typos."""
+        resolved = {}
+        for token in tokens:
+            if token in self.postings:
+                resolved[token] = (token, 1.0)
+                continue
+            if len(token) < FUZZY_MIN_TOKEN_LENGTH:
+                continue
+            candidates = set(self.deletes.get(token, ()))
+            for deleted in _deletes(token):
+                if deleted in self.postings:
+                    candidates.add(deleted)
+                candidates.update(self.deletes.get(deleted, ()))
+            candidates = [c for c in candidates if _within_one_edit(token, c)]
+            if candidates:
+                best = max(candidates, key=lambda c: len(self.postings[c]))
+                resolved[token] = (best, FUZZY_TOKEN_WEIGHT)
+        return resolved
+
+    @staticmethod
+    def _content_tokens(normalized: str) -> List[str]:
+        return [token for token in normalized.split() if token not in STOPWORDS]
+
+
+class FAQStore:
+    """
+    Holds the FAQ index for a data file and hot-reloads it when the file changes.
+
+    The file's modification time is checked at most every
+    ``reload_interval`` seconds. A changed file is re-indexed in a background
+    thread while the current index keeps serving, then swapped in.
+    """
+
+    def __init__(self, path: str, reload_interval: float = 5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._mtime = os.stat(path).st_mtime_ns
+        self.index = FAQIndex.from_file(path)
+        self._checked_at = time.monotonic()
+        self._reloading = threading.Lock()
+        app_logger.info(f"Loaded {len(self.index)} FAQ entries from {path}")
+
+    def match(self, question: str, min_confidence: float = 0.0) -> Optional[FAQMatch]:
+        self._maybe_reload()
+        return self.index.match(question, min_confidence)
+
+    def reload(self) -> None:
+        """Rebuild the index from the data file and swap it in."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            index = FAQIndex.from_file(self.path)
+        except Exception as e:
+            app_logger.error(f"Failed to reload FAQ from {self.path}: {str(e)}")
+            return
+        self.index, self._mtime = index, mtime
+        app_logger.info(f"Reloaded {len(index)} FAQ entries from {self.path}")
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtime and self._reloading.acquire(blocking=False):
+            def run():
+                try:
+                    self.reload()
+                finally:
+                    self._reloading.release()
+            threading.Thread(target=run, name="faq-reload", daemon=True).start()
@@ -1,3 +1,10 @@
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
 import dotenv
 from langchain_openai import ChatOpenAI
 from langchain.schema.messages import HumanMessage, SystemMessage
@@ -6,11 +13,30 @@ from langchain.prompts import (
     SystemMessagePromptTemplate,
     HumanMessagePromptTemplate,
     ChatPromptTemplate,
+    MessagesPlaceholder,
 )
+from langchain_core.messages import BaseMessage
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.outputs import ChatGeneration, Generation
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
-from langchain.schema.runnable import RunnablePassthrough
+from langchain.schema.runnable import RunnableBranch, RunnableLambda
+from chromadb.api.shared_system_client import SharedSystemClient
+from answer_cache import AnswerCache, normalize_question
+from corpus_pool import Corpus, CorpusPool, directory_size
+from context_builder import ContextBuilder, TokenCounter
+from logger import app_logger
+from embedding_cache import CachedEmbeddings, build_embeddings
+from embedding_batcher import BatchingEmbeddings
+from metrics import GATED_SECONDS, PipelineMetricsCallback, STAGE_SECONDS
+from relevance import GatedAnswer, RelevanceGate
+from sessions import Session, SessionStore, Turn
+from singleflight import SingleFlight
+from upstream import HedgedEmbeddings, client_kwargs, retry_policy
+from warm_cache import WARM_CACHE_FILENAME, WarmCache
+from bm25 import BM25Index, BM25_INDEX_FILENAME
+from retrievers import AsyncVectorStoreRetriever, HybridRetriever, MmapVectorRetriever
+from vector_index import MmapVectorIndex, VECTOR_INDEX_DIRNAME, manifest_digest
+from config import settings
 
 BOOKS_CHROMA_PATH = "chroma_data/"
 
@@ -55,43 +81,877 @@ review_human_prompt = HumanMessagePromptTemplate(
         template="{question}",
     )
 )
-messages = [review_system_prompt, review_human_prompt]
+# Earlier turns of a conversation session, between the instructions and the question
+review_history_prompt = MessagesPlaceholder(variable_name="history", optional=True)
+messages = [review_system_prompt, review_history_prompt, review_human_prompt]
 
 review_prompt_template = ChatPromptTemplate(
     input_variables=["context", "question"],
     messages=messages,
 )
 
-chat_model = ChatOpenAI(model="gpt-3.5-turbo-0125", model_name="gpt-3.5-turbo-0125", temperature=0)
+summary_template_str = """You maintain a running summary of a conversation between a user and a hospital assistant.
+Update the summary with the new turns below. Keep the facts, names, numbers and open questions a follow-up question could refer to, drop pleasantries, and write at most a short paragraph. Reply with the updated summary only.
 
+Current summary:
+{summary}"""
 
-reviews_vector_db = Chroma(
-    persist_directory=BOOKS_CHROMA_PATH,
-    embedding_function=OpenAIEmbeddings()
+summary_prompt_template = ChatPromptTemplate.from_messages([("system", summary_template_str), ("human", "{turns}")])
+
+condense_template_str = """You turn follow-up questions to a hospital assistant into search queries for its documents.
+Rewrite the user's follow-up question below as a standalone question that can be understood without the conversation, spelling out the people, departments and topics it refers to. Reply with the question only; if it already stands on its own, repeat it unchanged."""
+
+# The conversation so far (summary and recent turns), then the follow-up
+condense_prompt_template = ChatPromptTemplate.from_messages([
+    ("system", condense_template_str),
+    MessagesPlaceholder(variable_name="history"),
+    ("human", "Follow-up question: {question}"),
+])
+
+context_builder = ContextBuilder(
+    max_tokens=settings.CONTEXT_MAX_TOKENS,
+    dedupe_threshold=settings.CONTEXT_DEDUPE_THRESHOLD,
+    mmr_lambda=settings.CONTEXT_MMR_LAMBDA if settings.CONTEXT_MMR_ENABLED else None,
+    token_counter=TokenCounter(settings.CONTEXT_TOKENIZER_ENCODING),
 )
-print("Number of stored documents:", reviews_vector_db._collection.count())
 
-# reviews_retriever = reviews_vector_db.as_retriever(k=10)
-reviews_retriever = reviews_vector_db.as_retriever(search_type="similarity", search_kwargs={"k": 5})
+def inline_lambda(func):
+    """
+    RunnableLambda that also runs ``func`` on the event loop when awaited.
 
-def format_retrieved_documents(docs):
-    """Extracts and formats the retrieved document content into a single string."""
-    return "\n\n".join([doc.page_content for doc in docs]) if docs else "No relevant information found."
+    Without an async function, ainvoke hands every call to a worker thread,
+    which costs far more than the cheap chain steps it is used for.
+    """
+    async def afunc(inputs):
+        return func(inputs)
+
+    return RunnableLambda(func, afunc=afunc)
+
+def chain_question(inputs):
+    """The question of a chain input: a question string, or a dict with the question and the session history."""
+    return inputs["question"] if isinstance(inputs, dict) else inputs
+
+def chain_history(inputs):
+    return inputs.get("history", []) if isinstance(inputs, dict) else []
+
+def condensed_question(model):
+    """
+    Runnable returning the question to retrieve the context with.
+
+    A follow-up is retrieved with little to go on ("is he in today?"), so
+    with a history and SESSION_CONDENSE_QUESTIONS on, ``model`` rewrites it
+    into a standalone question first; the prompt still gets the question as
+    asked. If rewriting fails, the follow-up is retrieved as asked.
+    """
+    condense_model = model.bind(max_tokens=settings.SESSION_CONDENSE_MAX_TOKENS)
+
+    def prompt_value(inputs):
+        history = chain_history(inputs)
+        if not history or not settings.SESSION_CONDENSE_QUESTIONS:
+            return None
+        return condense_prompt_template.format_prompt(question=chain_question(inputs), history=history)
 
-output_parser = StrOutputParser()
+    def standalone(inputs, message, start_time):
+        STAGE_SECONDS.observe(time.perf_counter() - start_time, "condense")
+        question = message.content.strip() or chain_question(inputs)
+        app_logger.info(f"Retrieving follow-up as: {question}")
+        return question
 
+    def condense(inputs):
+        prompt = prompt_value(inputs)
+        if prompt is None:
+            return chain_question(inputs)
+        start_time = time.perf_counter()
+        try:
+            return standalone(inputs, condense_model.invoke(prompt), start_time)
+        except Exception as e:
+            app_logger.warning(f"Could not rewrite follow-up question, retrieving it as asked: {str(e)}")
+            return chain_question(inputs)
 
-review_chain = (
-    {
-        "context": reviews_retriever|format_retrieved_documents,
-        "question": RunnablePassthrough(),
+    async def acondense(inputs):
+        prompt = prompt_value(inputs)
+        if prompt is None:
+            return chain_question(inputs)
+        start_time = time.perf_counter()
+        try:
+            return standalone(inputs, await condense_model.ainvoke(prompt), start_time)
+        except Exception as e:
+            app_logger.warning(f"Could not rewrite follow-up question, retrieving it as asked: {str(e)}")
+            return chain_question(inputs)
+
+    return RunnableLambda(condense, afunc=acondense)
+
+def chain_started_at(inputs):
+    return time.perf_counter()
+
+def format_retrieved_documents(docs):
+    """Merges, deduplicates and packs the retrieved chunks into the token-budgeted prompt context."""
+    start_time = time.perf_counter()
+    context = context_builder.format(docs)
+    STAGE_SECONDS.observe(time.perf_counter() - start_time, "context")
+    return context
+
+def gate_retrieved_documents(inputs):
+    """
+    Applies the relevance gate to the retrieved chunks.
+
+    Returns the prompt inputs with the context built from the chunks the gate
+    keeps or, when none is relevant to the question, the ``answer`` to return
+    without calling the chat model. Follow-ups with a history are not gated:
+    the conversation may answer them.
+    """
+    documents = relevance_gate.select(inputs["documents"], gate=not inputs["history"])
+    if documents is None:
+        answer = relevance_gate.answer(inputs["question"])
+        GATED_SECONDS.observe(time.perf_counter() - inputs["started_at"])
+        app_logger.info("No relevant context found, answering without the chat model")
+        return {"answer": answer}
+    return {
+        "context": format_retrieved_documents(documents),
+        "question": inputs["question"],
+        "history": inputs["history"],
     }
-    | review_prompt_template
-    | chat_model
-    | output_parser
+
+def is_gated(inputs):
+    return "answer" in inputs
+
+def gated_answer(inputs):
+    return inputs["answer"]
+
+def render_prompt(inputs):
+    """Renders the review prompt for the context and question, logging its size in tokens."""
+    start_time = time.perf_counter()
+    prompt_value = review_prompt_template.format_prompt(**inputs)
+    STAGE_SECONDS.observe(time.perf_counter() - start_time, "prompt")
+    return log_prompt_tokens(prompt_value)
+
+def log_prompt_tokens(prompt_value):
+    """Logs the number of tokens in the rendered prompt messages and passes the prompt through."""
+    tokens = sum(context_builder.token_counter.count(message.content) for message in prompt_value.to_messages())
+    app_logger.info(f"Prompt tokens: {tokens}")
+    return prompt_value
+
+
+class InlineStrOutputParser(StrOutputParser):
+    """
+    StrOutputParser that parses on the event loop and records the parse stage.
+
+    The base class hands every async parse, and every streamed chunk, to a
+    worker thread, which costs far more than returning the text.
+    """
+
+    async def aparse_result(self, result, *, partial: bool = False):
+        start_time = time.perf_counter()
+        parsed = self.parse_result(result, partial=partial)
+        STAGE_SECONDS.observe(time.perf_counter() - start_time, "parse")
+        return parsed
+
+    async def _atransform(self, input):
+        elapsed = 0.0
+        async for chunk in input:
+            start_time = time.perf_counter()
+            generation = ChatGeneration(message=chunk) if isinstance(chunk, BaseMessage) else Generation(text=chunk)
+            parsed = self.parse_result([generation])
+            elapsed += time.perf_counter() - start_time
+            yield parsed
+        STAGE_SECONDS.observe(elapsed, "parse")
+
+
+output_parser = InlineStrOutputParser()
+
+pipeline_metrics = PipelineMetricsCallback()
+
+relevance_gate = RelevanceGate(
+    min_score=settings.RELEVANCE_MIN_SCORE,
+    decisive_margin=settings.RELEVANCE_DECISIVE_MARGIN,
+    min_chunks=settings.RELEVANCE_MIN_CHUNKS,
 )
 
 
+def build_review_chain(retriever, model):
+    """
+    Build the RAG chain for a retriever and chat model.
+
+    Args:
+        retriever: Retriever returning the context documents for a question
+        model: Chat model used to answer the question
+
+    Returns:
+        Runnable: Chain taking a question string, or a dict with the
+        ``question`` and the session ``history`` messages, and returning the
+        answer string, reporting its stage timings to ``pipeline_metrics``.
+        Follow-ups are retrieved as rewritten by ``condensed_question``.
+        Questions ``relevance_gate`` finds no relevant context for are
+        answered without the model.
+    """
+    question = inline_lambda(chain_question)
+    return (
+        {
+            "documents": condensed_question(model) | retriever,
+            "question": question,
+            "history": inline_lambda(chain_history),
+            "started_at": inline_lambda(chain_started_at),
+        }
+        | inline_lambda(gate_retrieved_documents)
+        | RunnableBranch(
+            (inline_lambda(is_gated), inline_lambda(gated_answer)),
+            inline_lambda(render_prompt) | model | output_parser,
+        )
+    ).with_config(callbacks=[pipeline_metrics])
+
+
+
+def collection_fingerprint(vector_db=None, persist_directory=BOOKS_CHROMA_PATH):
+    """
+    Return a value that changes whenever the Chroma collection is modified.
+
+    Combines the document count with the modification times of the SQLite
+    files under the persist directory.
+
+    Args:
+        vector_db: Chroma store to fingerprint, by default ``reviews_vector_db``
+        persist_directory: Directory the store is persisted in
+    """
+    mtimes = []
+    for name in ("chroma.sqlite3", "chroma.sqlite3-wal"):
+        path = os.path.join(persist_directory, name)
+        if os.path.exists(path):
+            mtimes.append(os.stat(path).st_mtime_ns)
+    vector_db = vector_db if vector_db is not None else reviews_vector_db
+    return vector_db._collection.count(), tuple(mtimes)
+
+
+# Built by initialize(); None until then, so importing this module opens no
+# database, creates no API clients and does no I/O beyond reading settings
+chat_model = None
+query_embeddings = None
+reviews_vector_db = None
+vector_index = None
+lexical_index = None
+reviews_retriever = None
+review_chain = None
+answer_cache = None
+warm_cache = None
+corpus_pool = None
+
+
+@dataclass
+class StartupState:
+    """
+    Lifecycle of the RAG pipeline.
+
+    ``status`` moves from "cold" through "initializing", "initialized" and
+    "warming" to "ready", or to "failed" with ``error`` set. Requests can be
+    served once the pipeline is initialized; the readiness probe waits for
+    "ready". A failed startup may be retried from ``retry_at`` (monotonic
+    time), which backs off with the number of consecutive ``failures``.
+    """
+    status: str = "cold"
+    error: Optional[str] = None
+    preloaded: bool = False
+    failures: int = 0
+    retry_at: float = 0.0
+    timings_ms: dict = field(default_factory=dict)
+
+    @property
+    def initialized(self) -> bool:
+        return self.status in ("initialized", "warming", "ready")
+
+
+startup = StartupState()
+_startup_lock = threading.RLock()
+
+
+def startup_backoff(failures: int) -> float:
+    """Seconds to wait before retrying a startup step that failed ``failures`` times in a row."""
+    return min(settings.STARTUP_RETRY_SECONDS * 2 ** (failures - 1), settings.STARTUP_RETRY_MAX_SECONDS)
+
+
+class StartupDependency:
+    """
+    Something the app loads at startup besides the pipeline, such as a data file.
+
+    ``state`` moves from "cold" through "initializing" to "ready", or to
+    "failed" with the same backoff as the pipeline startup. ``arun`` loads
+    it from the lifespan startup, retrying until it succeeds; ``aensure``
+    loads it for a request that arrives first, and raises while a failure
+    is backing off.
+    """
+
+    def __init__(self, name: str, load: Callable[[], None]):
+        self.name = name
+        self.load = load
+        self.state = StartupState()
+        self._lock = threading.Lock()
+
+    def ensure(self) -> None:
+        """
+        Load the dependency unless it is loaded. Thread-safe.
+
+        Raises:
+            RuntimeError: If loading failed now or recently
+        """
+        with self._lock:
+            state = self.state
+            if state.status == "ready":
+                return
+            if state.status == "failed" and time.monotonic() < state.retry_at:
+                raise RuntimeError(f"The {self.name} failed to load: {state.error}")
+            state.status = "initializing"
+            start_time = time.perf_counter()
+            try:
+                self.load()
+            except Exception as e:
+                state.status, state.error = "failed", str(e)
+                state.failures += 1
+                backoff = startup_backoff(state.failures)
+                state.retry_at = time.monotonic() + backoff
+                app_logger.error(f"Error loading the {self.name} (retrying in {backoff:.0f} s): {str(e)}")
+                raise RuntimeError(f"The {self.name} failed to load: {state.error}") from e
+            state.status, state.error, state.failures = "ready", None, 0
+            state.timings_ms["load_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+
+    async def aensure(self) -> None:
+        if self.state.status != "ready":
+            await asyncio.to_thread(self.ensure)
+
+    async def arun(self) -> None:
+        """Load in the background, retrying after each backoff until it succeeds."""
+        while True:
+            try:
+                await self.aensure()
+                return
+            except RuntimeError:
+                await asyncio.sleep(max(self.state.retry_at - time.monotonic(), 0.0))
+
+
+def load_indexes(persist_directory: str):
+    """
+    Load the exported vector index and the BM25 index of a persist directory, as enabled in the settings.
+
+    An export whose source digest is not that of the current ingest
+    manifest predates the last ingest and is not used.
+
+    Returns:
+        Tuple[Optional[MmapVectorIndex], Optional[BM25Index]]: Either is None
+        when disabled, not exported or stale
+    """
+    loaded_vector_index = loaded_lexical_index = None
+    if settings.VECTOR_BACKEND == "numpy":
+        loaded_vector_index = MmapVectorIndex.load(
+            os.path.join(persist_directory, VECTOR_INDEX_DIRNAME),
+            rescore_factor=settings.VECTOR_RESCORE_FACTOR,
+        )
+        if loaded_vector_index is None:
+            app_logger.warning(f"No exported vector index found in {persist_directory}, falling back to Chroma")
+        elif loaded_vector_index.source_digest != manifest_digest(persist_directory):
+            app_logger.warning(
+                f"Exported vector index in {persist_directory} is older than the collection, falling back to Chroma; "
+                "re-run retriever.py to refresh it"
+            )
+            loaded_vector_index = None
+        else:
+            app_logger.info(f"Number of memory-mapped vectors: {len(loaded_vector_index)}")
+            app_logger.info(f"Vector index memory footprint: {loaded_vector_index.memory_footprint(persist_directory)}")
+
+    if settings.LEXICAL_INDEX_ENABLED:
+        loaded_lexical_index = BM25Index.load(os.path.join(persist_directory, BM25_INDEX_FILENAME))
+        if loaded_lexical_index is not None:
+            app_logger.info(f"Number of lexically indexed documents: {len(loaded_lexical_index)}")
+    return loaded_vector_index, loaded_lexical_index
+
+
+def matching_vector_index(vector_index, vector_db):
+    """
+    The exported vector index if it has as many rows as the Chroma collection, else None.
+
+    Catches exports that went stale without a manifest change, e.g. a
+    collection modified by another tool.
+    """
+    if vector_index is None:
+        return None
+    count = vector_db._collection.count()
+    if len(vector_index) != count:
+        app_logger.warning(
+            f"Exported vector index has {len(vector_index)} vectors but the collection {count}, falling back to Chroma"
+        )
+        return None
+    return vector_index
+
+
+def build_retriever(vector_db, embeddings, vector_index=None, lexical_index=None):
+    """
+    Build the retriever over one knowledge base.
+
+    Searches the memory-mapped index when one is given and the Chroma store
+    otherwise, combined with BM25 when a lexical index is given.
+    """
+    if vector_index is not None:
+        vector_retriever = MmapVectorRetriever(
+            embeddings=embeddings,
+            index=vector_index,
+            search_kwargs={"k": 5},
+        )
+    else:
+        vector_retriever = AsyncVectorStoreRetriever(
+            vectorstore=vector_db,
+            search_type="similarity",
+            search_kwargs={"k": 5},
+        )
+
+    if lexical_index is None:
+        return vector_retriever
+    return HybridRetriever(
+        vector_retriever=vector_retriever,
+        lexical_index=lexical_index,
+        k=5,
+        fetch_k=10,
+        min_coverage=settings.LEXICAL_FAST_PATH_MIN_COVERAGE,
+        min_margin=settings.LEXICAL_FAST_PATH_MIN_MARGIN,
+    )
+
+
+def build_answer_cache(embeddings, vector_db, persist_directory=BOOKS_CHROMA_PATH):
+    """The answer cache of a knowledge base, invalidated when its collection changes; None if disabled."""
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    return AnswerCache(
+        embeddings=embeddings,
+        max_size=settings.ANSWER_CACHE_MAX_SIZE,
+        ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+        similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        version_func=lambda: collection_fingerprint(vector_db, persist_directory),
+    )
+
+
+def load_warm_cache(cache, vector_db, persist_directory=BOOKS_CHROMA_PATH):
+    """Pin the precomputed answers of a knowledge base in its answer cache; None if either is disabled."""
+    if cache is None or not settings.WARM_CACHE_ENABLED:
+        return None
+    return WarmCache(
+        os.path.join(persist_directory, WARM_CACHE_FILENAME),
+        cache,
+        version_func=lambda: collection_fingerprint(vector_db, persist_directory),
+        reload_interval=settings.WARM_CACHE_RELOAD_SECONDS,
+    )
+
+
+def close_vector_db(vector_db) -> None:
+    """
+    Stop the Chroma system behind a persistent store.
+
+    Chroma keeps one system per persist directory for the life of the
+    process; dropping the store alone would not release it.
+    """
+    system = SharedSystemClient._identifier_to_system.pop(vector_db._client._identifier, None)
+    if system is not None:
+        system.stop()
+
+
+def open_corpus(name: str, persist_directory: str) -> Corpus:
+    """
+    Build the pipeline of one corpus from its persist directory, for the corpus pool.
+
+    The chat model and the embeddings are shared with the default pipeline;
+    the indexes, the Chroma store, the retriever, the chain and the answer
+    cache are the corpus' own.
+    """
+    corpus_vector_index, corpus_lexical_index = load_indexes(persist_directory)
+    vector_db = Chroma(persist_directory=persist_directory, embedding_function=query_embeddings)
+    app_logger.info(f"Number of stored documents in corpus {name}: {vector_db._collection.count()}")
+    corpus_vector_index = matching_vector_index(corpus_vector_index, vector_db)
+    retriever = build_retriever(vector_db, query_embeddings, corpus_vector_index, corpus_lexical_index)
+    cache = build_answer_cache(query_embeddings, vector_db, persist_directory)
+    return Corpus(
+        name=name,
+        chain=build_review_chain(retriever, chat_model),
+        retriever=retriever,
+        answer_cache=cache,
+        warm_cache=load_warm_cache(cache, vector_db, persist_directory),
+        footprint_bytes=directory_size(persist_directory),
+        close=lambda: close_vector_db(vector_db),
+    )
+
+
+def preload():
+    """
+    Load the file-backed indexes and the tokenizer.
+
+    Everything loaded here is read-only and holds no sockets or database
+    connections, so it is safe to call before the server forks its workers
+    (``PRELOAD_INDEXES``): the workers then share the BM25 postings and the
+    memory-mapped vectors instead of each loading its own copy.
+    """
+    global vector_index, lexical_index
+    with _startup_lock:
+        if startup.preloaded:
+            return
+        start_time = time.perf_counter()
+
+        vector_index, lexical_index = load_indexes(BOOKS_CHROMA_PATH)
+        context_builder.token_counter.load()
+
+        startup.preloaded = True
+        startup.timings_ms["preload_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+
+
+def initialize():
+    """
+    Build the RAG pipeline: the indexes, the Chroma store, the OpenAI clients,
+    the retrievers, the chain, the answer cache and the (empty) corpus pool.
+
+    Idempotent and thread-safe; concurrent callers wait for the first one.
+    The pipeline is published only once every part has been built, and a
+    failure leaves ``startup`` in the "failed" state instead of escaping
+    from an import. After a failure, the pipeline is only rebuilt once
+    ``startup.retry_at`` has passed.
+
+    Raises:
+        Exception: Whatever prevented the pipeline from being built, or
+        RuntimeError if the last failure is too recent to retry
+    """
+    global chat_model, query_embeddings, reviews_vector_db, reviews_retriever, review_chain, answer_cache, warm_cache
+    global corpus_pool, vector_index
+    with _startup_lock:
+        if startup.initialized:
+            return
+        if startup.status == "failed" and time.monotonic() < startup.retry_at:
+            raise RuntimeError(f"{startup.error} (retrying in {startup.retry_at - time.monotonic():.0f} s)")
+        startup.status, startup.error = "initializing", None
+        start_time = time.perf_counter()
+        try:
+            preload()
+
+            model = ChatOpenAI(
+                model="gpt-3.5-turbo-0125", model_name="gpt-3.5-turbo-0125", temperature=0, **client_kwargs()
+            )
+            embeddings = build_embeddings()
+            if settings.EMBEDDING_BATCH_ENABLED:
+                embeddings = BatchingEmbeddings(
+                    embeddings,
+                    max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+                    max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+                )
+
+            vector_db = Chroma(
+                persist_directory=BOOKS_CHROMA_PATH,
+                embedding_function=embeddings
+            )
+            app_logger.info(f"Number of stored documents: {vector_db._collection.count()}")
+            vector_index = matching_vector_index(vector_index, vector_db)
+
+            retriever = build_retriever(vector_db, embeddings, vector_index, lexical_index)
+            cache = build_answer_cache(embeddings, vector_db, BOOKS_CHROMA_PATH)
+            warm = load_warm_cache(cache, vector_db, BOOKS_CHROMA_PATH)
+            chain = build_review_chain(retriever, model)
+            pool = CorpusPool(
+                settings.CORPORA_PATH,
+                open_corpus,
+                max_open=settings.CORPUS_POOL_MAX_OPEN,
+                max_bytes=settings.CORPUS_POOL_MAX_MB * 1024 * 1024,
+            )
+        except Exception as e:
+            startup.status, startup.error = "failed", str(e)
+            startup.failures += 1
+            backoff = startup_backoff(startup.failures)
+            startup.retry_at = time.monotonic() + backoff
+            app_logger.error(
+                f"Error initializing the RAG pipeline (retrying in {backoff:.0f} s): {str(e)}", exc_info=True
+            )
+            raise
+
+        chat_model, query_embeddings, reviews_vector_db = model, embeddings, vector_db
+        reviews_retriever, review_chain, answer_cache, warm_cache, corpus_pool = retriever, chain, cache, warm, pool
+        startup.status, startup.failures = "initialized", 0
+        startup.timings_ms["initialize_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+        app_logger.info(f"RAG pipeline initialized in {startup.timings_ms['initialize_ms']:.0f} ms")
+
+
+async def warmup():
+    """
+    Touch everything the first request would otherwise pay for.
+
+    Loads the Chroma segments, runs one scan of the memory-mapped index and,
+    with ``WARMUP_QUERY`` set, retrieves the context for it, which also opens
+    the embedding API connection. A failed warmup is logged and does not
+    keep the pipeline from becoming ready.
+    """
+    if startup.status != "initialized":
+        return
+    startup.status = "warming"
+    start_time = time.perf_counter()
+    try:
+        await asyncio.to_thread(reviews_vector_db._collection.count)
+        if vector_index is not None:
+            await asyncio.to_thread(vector_index.warm)
+        if settings.WARMUP_QUERY:
+            await reviews_retriever.ainvoke(settings.WARMUP_QUERY)
+    except Exception as e:
+        app_logger.warning(f"Warmup failed, continuing cold: {str(e)}")
+    startup.status = "ready"
+    startup.timings_ms["warmup_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+    app_logger.info(f"RAG pipeline warmed up in {startup.timings_ms['warmup_ms']:.0f} ms")
+
+
+async def astartup():
+    """Initialize the pipeline in a worker thread, then warm it up. Failures are recorded in ``startup``."""
+    try:
+        await asyncio.to_thread(initialize)
+    except Exception:
+        return
+    await warmup()
+
+
+async def aensure_initialized():
+    """
+    Wait until the pipeline can serve requests, initializing it if nothing has yet.
+
+    A failed startup is retried once its backoff has passed, and warmed up
+    if the retry succeeds, so the worker becomes ready again.
+
+    Raises:
+        RuntimeError: If initialization failed
+    """
+    if startup.initialized:
+        return
+    retrying = startup.status == "failed"
+    if retrying and time.monotonic() < startup.retry_at:
+        raise RuntimeError(f"RAG pipeline failed to initialize: {startup.error}")
+    try:
+        await asyncio.to_thread(initialize)
+    except Exception as e:
+        raise RuntimeError(f"RAG pipeline failed to initialize: {str(e)}") from e
+    if retrying:
+        await warmup()
+
+
+in_flight_questions = SingleFlight()
+
+
+def format_turns(turns: List[Turn]) -> str:
+    return "\n\n".join(f"User: {turn.question}\nAssistant: {turn.answer}" for turn in turns)
+
+
+async def asummarize_history(summary: str, turns: List[Turn]) -> str:
+    """Fold conversation turns into the rolling summary of a session with the chat model."""
+    prompt_value = summary_prompt_template.format_prompt(summary=summary or "(none yet)", turns=format_turns(turns))
+    message = await chat_model.bind(max_tokens=settings.SESSION_SUMMARY_MAX_TOKENS).ainvoke(prompt_value)
+    return message.content
+
+
+session_store = SessionStore(
+    asummarize_history,
+    token_counter=context_builder.token_counter,
+    max_sessions=settings.SESSION_MAX_SESSIONS,
+    idle_seconds=settings.SESSION_IDLE_SECONDS,
+    recent_turns=settings.SESSION_RECENT_TURNS,
+    history_tokens=settings.SESSION_HISTORY_MAX_TOKENS,
+    summary_tokens=settings.SESSION_SUMMARY_MAX_TOKENS,
+)
+
+
+def chain_input(question: str, session: Optional[Session] = None):
+    """
+    The chain input for a question: the question itself, or with the
+    session's history once the session has one.
+    """
+    if session is None:
+        return question
+    history = session.messages()
+    return {"question": question, "history": history} if history else question
+
+
+def pipeline_stats() -> dict:
+    """
+    Counters of the pipeline components, keyed by component, for the /metrics endpoint.
+
+    Returns:
+        dict: ``stats()`` of the single-flight group, answer and warm cache, embedding
+        batcher, cache and hedging, upstream retries, the hybrid retriever,
+        the corpus pool, the session store and the relevance gate, for those in use
+    """
+    stats = {
+        "singleflight": in_flight_questions.stats(),
+        "sessions": session_store.stats(),
+        "relevance_gate": relevance_gate.stats(),
+    }
+    if answer_cache is not None:
+        stats["answer_cache"] = answer_cache.stats()
+    if warm_cache is not None:
+        stats["warm_cache"] = warm_cache.stats()
+    embeddings = query_embeddings
+    if isinstance(embeddings, BatchingEmbeddings):
+        stats["embedding_batcher"] = embeddings.stats()
+        embeddings = embeddings.underlying
+    if isinstance(embeddings, CachedEmbeddings):
+        stats["embedding_cache"] = embeddings.stats()
+        embeddings = embeddings.underlying
+    if isinstance(embeddings, HedgedEmbeddings):
+        stats["embedding_hedging"] = embeddings.stats()
+    stats["upstream"] = retry_policy.stats()
+    if isinstance(reviews_retriever, HybridRetriever):
+        stats["retrieval"] = reviews_retriever.stats.as_dict()
+    if corpus_pool is not None:
+        stats["corpus_pool"] = corpus_pool.stats()
+    return stats
+
+
+def default_corpus() -> Corpus:
+    """The default knowledge base, as built by initialize()."""
+    return Corpus(
+        name=None, chain=review_chain, retriever=reviews_retriever, answer_cache=answer_cache, warm_cache=warm_cache
+    )
+
+
+@contextlib.asynccontextmanager
+async def acquire_corpus(name: Optional[str] = None):
+    """
+    Use a knowledge base for the duration of the block: the default one, or
+    the named corpus from the corpus pool, opening it if needed.
+
+    Raises:
+        UnknownCorpusError: If there is no corpus with that name
+    """
+    if name is None:
+        yield default_corpus()
+        return
+    async with corpus_pool.acquire(name) as corpus:
+        yield corpus
+
+
+async def agenerate_answer(question: str, corpus: Optional[Corpus] = None, session: Optional[Session] = None) -> str:
+    """
+    Answer a question, serving it from the answer cache when possible.
+
+    Concurrent requests for the same normalized question share one execution.
+    A question in a session with history is answered in the context of that
+    history, bypassing the answer cache, and the turn is added to the session.
+
+    Args:
+        question (str): Sanitized question
+        corpus (Optional[Corpus]): Knowledge base to answer from, by default the default one
+        session (Optional[Session]): Conversation the question belongs to
+
+    Returns:
+        str: The generated or cached answer
+    """
+    corpus = corpus or default_corpus()
+    inputs = chain_input(question, session)
+    if isinstance(inputs, dict):
+        answer = await corpus.chain.ainvoke(inputs)
+    else:
+        answer = await in_flight_questions.do(
+            (corpus.name, normalize_question(question)), lambda: _agenerate_answer(question, corpus)
+        )
+    if session is not None:
+        session_store.record(session, question, answer)
+    return answer
+
+
+async def alookup_cached_answer(question: str, corpus: Optional[Corpus] = None):
+    """
+    Look up a question in the answer cache of a knowledge base.
+
+    The semantic tier is skipped when the lexical fast path will serve
+    retrieval, since it would be the only reason to embed the question.
+
+    Returns:
+        Tuple[Optional[str], Optional[np.ndarray]]: See AnswerCache.alookup
+    """
+    corpus = corpus or default_corpus()
+    if corpus.answer_cache is None:
+        return None, None
+    if corpus.warm_cache is not None:
+        await corpus.warm_cache.amaybe_reload()
+    return await corpus.answer_cache.alookup(question, semantic=not served_lexically(question, corpus.retriever))
+
+
+def served_lexically(question: str, retriever=None) -> bool:
+    """Whether retrieval for a question takes the lexical fast path, without embedding it."""
+    retriever = retriever if retriever is not None else reviews_retriever
+    return isinstance(retriever, HybridRetriever) and retriever.lexical_fast_path(question) is not None
+
+
+async def agenerate_batch(questions: List[str], max_concurrency: int, corpus: Optional[Corpus] = None):
+    """
+    Answer a batch of questions, yielding each result as soon as it is ready.
+
+    Questions that normalize to the same text are answered once, and cached
+    answers are served from the answer cache. The rest run through the
+    chain's ``abatch_as_completed`` with at most ``max_concurrency`` in
+    flight. One failing question does not fail the others. With the
+    embedding batcher, the questions needing a query embedding are embedded
+    up front in one call, instead of each when its turn comes.
+
+    Args:
+        questions (List[str]): Sanitized questions
+        max_concurrency (int): Questions running through the chain at once
+        corpus (Optional[Corpus]): Knowledge base to answer from, by default the default one
+
+    Yields:
+        Tuple[int, Union[str, Exception]]: Position of a question in
+        ``questions`` and its answer, or the exception raised answering it
+    """
+    corpus = corpus or default_corpus()
+    cache = corpus.answer_cache
+    groups = {}
+    for position, question in enumerate(questions):
+        groups.setdefault(normalize_question(question), []).append(position)
+    groups = list(groups.values())
+    distinct = [questions[positions[0]] for positions in groups]
+
+    prefetch = contextlib.nullcontext()
+    if isinstance(query_embeddings, BatchingEmbeddings):
+        prefetch = query_embeddings.prefetched(
+            question for question in distinct if not served_lexically(question, corpus.retriever)
+        )
+
+    async with prefetch:
+        embeddings = [None] * len(distinct)
+        pending = list(range(len(distinct)))
+        if cache is not None:
+            lookups = await asyncio.gather(
+                *(alookup_cached_answer(question, corpus) for question in distinct), return_exceptions=True
+            )
+            pending = []
+            for index, lookup in enumerate(lookups):
+                result = lookup if isinstance(lookup, Exception) else lookup[0]
+                if result is None:
+                    embeddings[index] = lookup[1]
+                    pending.append(index)
+                    continue
+                for position in groups[index]:
+                    yield position, result
+
+        if not pending:
+            return
+        results = corpus.chain.abatch_as_completed(
+            [distinct[index] for index in pending],
+            {"max_concurrency": max_concurrency},
+            return_exceptions=True,
+        )
+        async for pending_index, result in results:
+            index = pending[pending_index]
+            if cache is not None and not isinstance(result, (Exception, GatedAnswer)):
+                cache.store(distinct[index], result, embeddings[index])
+            for position in groups[index]:
+                yield position, result
+
+
+async def _agenerate_answer(question: str, corpus: Corpus) -> str:
+    if corpus.answer_cache is None:
+        return await corpus.chain.ainvoke(question)
+
+    answer, embedding = await alookup_cached_answer(question, corpus)
+    if answer is not None:
+        return answer
+
+    answer = await corpus.chain.ainvoke(question)
+    # Gated answers only say nothing relevant was found, which an ingest can change
+    if not isinstance(answer, GatedAnswer):
+        corpus.answer_cache.store(question, answer, embedding)
+    return answer
+
 
 # # context = "I had a great stay!"
 # question = "Who are the cardiology specialists?"
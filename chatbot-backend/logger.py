@@ -1,8 +1,12 @@
+import atexit
 import logging
+import queue
 import sys
+from contextvars import ContextVar
 from pathlib import Path
 import os
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
 import re
 
 BACKEND_DIR = Path(__file__).parent.absolute()
@@ -10,62 +14,118 @@ BACKEND_DIR = Path(__file__).parent.absolute()
 logs_dir = BACKEND_DIR / "logs"
 logs_dir.mkdir(exist_ok=True)
 
-def setup_logger():
-    # Create a custom formatter that masks sensitive information
-    class SensitiveDataFormatter(logging.Formatter):
-        def format(self, record):
-            # Get the original message
-            message = super().format(record)
-            
-            # List of sensitive patterns to mask
-            sensitive_patterns = [
-                r'api[-_]?key["\']?\s*[:=]\s*["\']?([^"\'\s]+)["\']?',
-                r'openai[-_]?key["\']?\s*[:=]\s*["\']?([^"\'\s]+)["\']?',
-                r'secret["\']?\s*[:=]\s*["\']?([^"\'\s]+)["\']?',
-                r'token["\']?\s*[:=]\s*["\']?([^"\'\s]+)["\']?',
-                r'sk-[a-zA-Z0-9]{32,}',
-                r'eyJ[a-zA-Z0-9_-]*\.[a-zA-Z0-9_-]*\.[a-zA-Z0-9_-]*',
-            ]
-            
-            # Mask each sensitive pattern
-            for pattern in sensitive_patterns:
-                message = re.sub(pattern, '***MASKED***', message, flags=re.IGNORECASE)
-            
-            return message
+CONSOLE_LOG_LEVEL = os.getenv("CONSOLE_LOG_LEVEL", "INFO").upper()
+FILE_LOG_LEVEL = os.getenv("FILE_LOG_LEVEL", "DEBUG").upper()
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(trace_id)s - %(message)s'
+
+# Trace ID of the request being handled, set by metrics.MetricsMiddleware
+current_trace_id: ContextVar[Optional[str]] = ContextVar("current_trace_id", default=None)
+
+MASK = '***MASKED***'
+
+# Sensitive values, combined into one pattern so a message is scanned once
+SENSITIVE_PATTERN = re.compile(
+    "|".join([
+        r'api[-_]?key["\']?\s*[:=]\s*["\']?([^"\'\s]+)["\']?',
+        r'openai[-_]?key["\']?\s*[:=]\s*["\']?([^"\'\s]+)["\']?',
+        r'secret["\']?\s*[:=]\s*["\']?([^"\'\s]+)["\']?',
+        r'token["\']?\s*[:=]\s*["\']?([^"\'\s]+)["\']?',
+        r'sk-[a-zA-Z0-9]{32,}',
+        r'eyJ[a-zA-Z0-9_-]*\.[a-zA-Z0-9_-]*\.[a-zA-Z0-9_-]*',
+    ]),
+    re.IGNORECASE,
+)
+
+
+class SensitiveDataFormatter(logging.Formatter):
+    """Formatter that masks API keys, secrets and tokens in the formatted record."""
+
+    def format(self, record):
+        return SENSITIVE_PATTERN.sub(MASK, super().format(record))
+
+
+class TraceIdFilter(logging.Filter):
+    """
+    Stamp records with the current request's trace ID, or "-" outside a request.
+
+    Must run on the logging thread (e.g. on the queue handler), as the
+    listener thread does not see the request's context.
+    """
+
+    def filter(self, record):
+        record.trace_id = current_trace_id.get() or "-"
+        return True
+
 
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that enqueues records unformatted.
+
+    The stock handler renders ``msg % args`` on the calling thread; here
+    that work, the masking and the I/O all happen on the listener thread,
+    and only for records a handler accepts. Log arguments should therefore
+    not be mutated after the call.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def restart_listener(listener: QueueListener, queue_handler: QueueHandler) -> None:
+    """
+    Give a forked child its own listener thread and queue.
+
+    A child (e.g. a worker of ``gunicorn --preload``) inherits the queue but
+    not the thread draining it, so its records would pile up unwritten. The
+    queue is replaced too: records the parent had not written yet are the
+    parent's to write.
+    """
+    listener.queue = queue_handler.queue = queue.SimpleQueue()
+    listener._thread = None
+    listener.start()
+
+
+def setup_logger():
     # Create logger
     logger = logging.getLogger("rag_chatbot.app")
-    logger.setLevel(logging.DEBUG)
 
     # Create handlers
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(CONSOLE_LOG_LEVEL)
     file_handler = RotatingFileHandler(
         logs_dir / "app.log",
         maxBytes=10*1024*1024,  # 10MB
         backupCount=5,
         encoding='utf-8'
     )
-    file_handler.setLevel(logging.DEBUG)
+    file_handler.setLevel(FILE_LOG_LEVEL)
 
     # Create formatters and add it to handlers
-    formatter = SensitiveDataFormatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    formatter = SensitiveDataFormatter(LOG_FORMAT)
     console_handler.setFormatter(formatter)
     file_handler.setFormatter(formatter)
 
-    # Add handlers to the logger
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    # Records are handed to a background thread that formats and writes them
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(TraceIdFilter())
+    logger.addHandler(queue_handler)
+    os.register_at_fork(after_in_child=lambda: restart_listener(listener, queue_handler))
+    # The logger level is the lowest handler level, so records no handler
+    # would write are discarded before they are created
+    logger.setLevel(min(console_handler.level, file_handler.level))
 
     logger.propagate = False
 
     logger.info("Logger initialized")
-    
-    return logger
 
-app_logger = setup_logger()
+    return logger, listener
+
+app_logger, log_listener = setup_logger()
 
 # Configure other loggers
 uvicorn_access_logger = logging.getLogger("uvicorn.access")
@@ -77,4 +137,4 @@ uvicorn_error_logger.setLevel(logging.INFO)
 slowapi_logger = logging.getLogger("slowapi")
 slowapi_logger.setLevel(logging.DEBUG)
 
-app_logger.info("Logger setup completed successfully") 
\ No newline at end of file
+app_logger.info("Logger setup completed successfully")
@@ -1,22 +1,44 @@
-from fastapi import FastAPI, HTTPException, Request
+import time
+# Start of the import, for the import and time-to-ready timings reported by /ready
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Request
 from pydantic import BaseModel, Field
-from typing import Dict
+from typing import Annotated, List, Optional
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
-from fastapi.responses import JSONResponse
+from slowapi.middleware import SlowAPIASGIMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import time
+import json
 import generator
-from logger import app_logger
-from exceptions import ValidationError, RAGError, DatabaseError, ModelError
+from logger import BACKEND_DIR, app_logger
+from exceptions import ValidationError, RAGError, DatabaseError, ModelError, NotFoundError, ServiceUnavailableError
 from config import settings
 from security import SecurityMiddleware, sanitize_input
+from faq import FAQStore
+import metrics
+from corpus_pool import UnknownCorpusError
+from relevance import GatedAnswer
+from sessions import Session
+import rate_limit_storage  # registers the sqlite:// limiter storage
+
+if settings.PRELOAD_INDEXES:
+    generator.preload()
 
 
 # Rate Limiter Configuration
-limiter = Limiter(key_func=get_remote_address)
+# Shared storages fall back to per-worker memory counters while they are unreachable.
+# The storage is opened and checked at startup (see startup_dependencies), not on import
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=settings.RATE_LIMIT_STORAGE_URI,
+    strategy=settings.RATE_LIMIT_STRATEGY,
+    in_memory_fallback_enabled=not settings.RATE_LIMIT_STORAGE_URI.startswith("memory://"),
+)
 
 # Custom rate limit exceeded handler
 async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
@@ -28,7 +50,7 @@ async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
         client_ip = request.client.host if request.client else "unknown"
         endpoint = request.url.path
         
-        app_logger.debug(f"Handling rate limit: {exc}")
+        app_logger.debug("Handling rate limit: %s", exc)
 
         app_logger.warning(
             f"Rate limit exceeded for IP: {client_ip} on endpoint: {endpoint}. "
@@ -58,12 +80,18 @@ async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
         )
 
 
+SESSION_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+
+
 class QueryRequest(BaseModel):
     """
-    Request model for the generate endpoint.
+    Request model for the generate endpoints.
     
     Attributes:
         question (str): The question to be answered by the RAG system
+        corpus (Optional[str]): The knowledge base to answer from
+        new_session (bool): Whether to start a conversation with this question
+        session_id (Optional[str]): The conversation the question belongs to
     """
     question: str = Field(
         ..., 
@@ -71,6 +99,43 @@ class QueryRequest(BaseModel):
         max_length=settings.MAX_QUESTION_LENGTH, 
         description="The question to be answered"
     )
+    corpus: Optional[str] = Field(
+        None,
+        max_length=64,
+        description="The knowledge base to answer from, by default the main one",
+    )
+    new_session: bool = Field(
+        False,
+        description="Start a conversation with this question; the response carries its session_id",
+    )
+    session_id: Optional[str] = Field(
+        None,
+        pattern=SESSION_ID_PATTERN,
+        description="ID of a conversation the server issued; the question is answered in the context of its earlier turns",
+    )
+
+
+class BatchQueryRequest(BaseModel):
+    """
+    Request model for the batch generate endpoint.
+
+    Attributes:
+        questions (List[str]): The questions to be answered by the RAG system
+        stream (bool): Whether to stream each result as soon as it is ready
+        corpus (Optional[str]): The knowledge base to answer from
+    """
+    questions: List[Annotated[str, Field(min_length=1, max_length=settings.MAX_QUESTION_LENGTH)]] = Field(
+        ...,
+        min_length=1,
+        max_length=settings.BATCH_MAX_QUESTIONS,
+        description="The questions to be answered",
+    )
+    stream: bool = Field(False, description="Stream the results as Server-Sent Events as they complete")
+    corpus: Optional[str] = Field(
+        None,
+        max_length=64,
+        description="The knowledge base to answer from, by default the main one",
+    )
 
 
 class QuestionRequest(BaseModel):
@@ -98,13 +163,88 @@ class Response(BaseModel):
     response: str
 
 
+class GenerateResponse(Response):
+    """
+    Response model for the generate endpoint.
+
+    Attributes:
+        response (str): The generated response
+        session_id (Optional[str]): The conversation the answer was added to, if any
+    """
+    session_id: Optional[str] = None
+
+
+class BatchItem(BaseModel):
+    """
+    Result for one question of a batch.
+
+    Attributes:
+        index (int): Position of the question in the request
+        response (Optional[str]): The generated response, unless answering failed
+        error (Optional[str]): Why the question could not be answered
+    """
+    index: int
+    response: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    """
+    Response model for the batch generate endpoint.
+
+    Attributes:
+        results (List[BatchItem]): One result per question, in request order
+    """
+    results: List[BatchItem]
+
+
+class ChatResponse(Response):
+    """
+    Response model for the chat endpoint.
+
+    Attributes:
+        response (str): The predefined response, or the fallback message
+        confidence (float): How well the question matched a predefined one (0 to 1)
+        matched_question (Optional[str]): The predefined question that was matched
+    """
+    confidence: float = 0.0
+    matched_question: Optional[str] = None
+
+
+async def start_pipeline():
+    await generator.astartup()
+    if generator.startup.status == "ready":
+        generator.startup.timings_ms["ready_ms"] = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+        app_logger.info(f"Ready to serve {generator.startup.timings_ms['ready_ms']:.0f} ms after import")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start building the RAG pipeline and loading the startup dependencies in the background, and serve meanwhile.
+
+    ``/`` answers as soon as the server is up; ``/ready`` answers 503 until
+    the pipeline is initialized and warmed up and the FAQ and rate limit
+    storage are loaded, so traffic is only routed to a worker that can
+    answer it. A dependency that fails to load is retried with backoff.
+    """
+    app_logger.info("FastAPI application startup")
+    settings.log_settings()
+    startup_tasks = [asyncio.create_task(start_pipeline())]
+    startup_tasks += [asyncio.create_task(dependency.arun()) for dependency in startup_dependencies.values()]
+    yield
+    for task in startup_tasks:
+        task.cancel()
+
+
 # Initialize FastAPI with rate limiter
 app = FastAPI(
     title="RAG Chatbot API",
     description="A simple RAG (Retrieval-Augmented Generation) chatbot API that provides answers based on stored knowledge and predefined responses.",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # Add rate limiter to the app
@@ -112,7 +252,7 @@ app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
 
 # Add middleware
-app.add_middleware(SlowAPIMiddleware)
+app.add_middleware(SlowAPIASGIMiddleware)
 app.add_middleware(SecurityMiddleware)
 app.add_middleware(
     CORSMiddleware,
@@ -120,29 +260,83 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[settings.TRACE_ID_HEADER] if settings.TRACE_ID_HEADER else [],
 )
+# Outermost, so rejected and throttled requests are timed and traced too
+app.add_middleware(metrics.MetricsMiddleware, trace_header=settings.TRACE_ID_HEADER)
 
+metrics.registry.register_collector(generator.pipeline_stats)
 
-@app.on_event("startup")
-async def startup_event():
-    app_logger.info("FastAPI application startup")
-    app_logger.info("Rate limiter initialized")
-    app_logger.info("SlowAPI middleware initialized")
-    app_logger.info("Security middleware initialized")
+
+async def require_pipeline():
+    """Wait for the RAG pipeline, or raise 503 if it could not be built."""
+    try:
+        await generator.aensure_initialized()
+    except RuntimeError as e:
+        app_logger.error(str(e))
+        raise ServiceUnavailableError("The knowledge base is not available")
 
 
-@app.post("/generate/", response_model=Response, tags=["RAG"])
-@limiter.limit(settings.RATE_LIMIT_GENERATE)
+async def require_corpus(name: Optional[str]):
+    """Open a named corpus ahead of a streamed response, or raise 404 if there is no such corpus."""
+    if name is None:
+        return
+    try:
+        await generator.corpus_pool.aget(name)
+    except UnknownCorpusError as e:
+        raise NotFoundError(str(e))
+
+
+def resolve_session(query: QueryRequest) -> Optional[Session]:
+    """
+    The session a question belongs to: the one named by ``session_id``, or a
+    new one for ``new_session``. Sessions are only ever started here, under
+    an ID the server issues, so an unknown or expired ID is rejected. A new
+    session is pending until the answer is recorded in it, so a failed
+    question does not leave an empty session behind.
+    """
+    if query.session_id:
+        session = generator.session_store.get(query.session_id)
+        if session is None:
+            raise NotFoundError("Unknown or expired session")
+        return session
+    if query.new_session:
+        return generator.session_store.create(pending=True)
+    return None
+
+
+def log_question(kind: str, question: str, query: QueryRequest) -> None:
+    """
+    Log a received question as one JSON line with its corpus and session use.
+
+    warm_cache.py mines these lines; JSON keeps multi-line questions on one
+    line and lets it tell corpora and session follow-ups apart.
+    """
+    session = "follow-up" if query.session_id else "new" if query.new_session else "none"
+    app_logger.info(
+        "Received %s: %s",
+        kind,
+        json.dumps({"corpus": query.corpus, "session": session, "question": question}, ensure_ascii=False),
+    )
+
+
+@app.post("/generate/", response_model=GenerateResponse, response_model_exclude_none=True, tags=["RAG"])
+@limiter.shared_limit(settings.RATE_LIMIT_GENERATE, scope="generate")
 async def generate_response(request: Request, query: QueryRequest):
+    await require_pipeline()
+    session = resolve_session(query)
     try:
-        app_logger.debug(f"Request from: {request.client.host} - {request.url.path}")
+        app_logger.debug("Request from: %s - %s", request.client.host, request.url.path)
         
         sanitized_question = sanitize_input(query.question)
-        app_logger.info(f"Received question: {sanitized_question}")
+        log_question("question", sanitized_question, query)
         
-        response = generator.review_chain.invoke(sanitized_question)
+        async with generator.acquire_corpus(query.corpus) as corpus:
+            response = await generator.agenerate_answer(sanitized_question, corpus, session)
         app_logger.info("Successfully generated response")
-        return {"response": response}
+        return {"response": response, "session_id": session.session_id if session is not None else None}
+    except UnknownCorpusError as e:
+        raise NotFoundError(str(e))
     except ValueError as e:
         app_logger.error(f"Validation error: {str(e)}")
         raise ValidationError(f"Invalid input: {str(e)}")
@@ -156,6 +350,203 @@ async def generate_response(request: Request, query: QueryRequest):
             raise RAGError("Error generating response")
 
 
+def format_sse_event(event: str, data: dict) -> str:
+    """Format a Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def replay_answer(answer: str):
+    """Yield a cached answer as a single chunk."""
+    yield answer
+
+
+async def stream_answer_events(question: str, corpus_name: Optional[str] = None, session: Optional[Session] = None):
+    """
+    Stream the RAG answer for a question as Server-Sent Events.
+
+    The answer comes from the named corpus, or the default knowledge base,
+    in the context of the session's earlier turns; the answered turn is
+    added to the session.
+
+    Emits one ``token`` event per chunk from ``review_chain.astream`` (or a
+    single one for an answer cache hit), then a ``done`` event with the
+    time-to-first-token and total duration, and the session's ID. Errors after the response has
+    started are reported as an ``error`` event, since the status code has
+    already been sent.
+    """
+    start_time = time.perf_counter()
+    first_token_time = None
+    try:
+        inputs = generator.chain_input(question, session)
+        async with generator.acquire_corpus(corpus_name) as corpus:
+            # Answers given in the context of a history are neither served from nor added to the cache
+            cache = corpus.answer_cache if isinstance(inputs, str) else None
+            cached_answer, embedding = None, None
+            if cache is not None:
+                cached_answer, embedding = await generator.alookup_cached_answer(question, corpus)
+            if cached_answer is not None:
+                chunks = replay_answer(cached_answer)
+            else:
+                chunks = corpus.chain.astream(inputs)
+            answer_parts = []
+            gated = False
+
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                gated = gated or isinstance(chunk, GatedAnswer)
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                    app_logger.info(f"Time to first token: {(first_token_time - start_time) * 1000:.0f} ms")
+                answer_parts.append(chunk)
+                yield format_sse_event("token", {"token": chunk})
+
+        answer = "".join(answer_parts)
+        if cache is not None and cached_answer is None and not gated:
+            cache.store(question, answer, embedding)
+        if session is not None:
+            generator.session_store.record(session, question, answer)
+
+        total_ms = (time.perf_counter() - start_time) * 1000
+        ttft_ms = (first_token_time - start_time) * 1000 if first_token_time else total_ms
+        app_logger.info(f"Successfully streamed response in {total_ms:.0f} ms")
+        done = {"ttft_ms": round(ttft_ms, 1), "total_ms": round(total_ms, 1)}
+        if session is not None:
+            done["session_id"] = session.session_id
+        yield format_sse_event("done", done)
+    except Exception as e:
+        app_logger.error(f"Error streaming response: {str(e)}", exc_info=True)
+        yield format_sse_event("error", {"error": "Error generating response"})
+
+
+@app.post("/generate/stream", tags=["RAG"])
+@limiter.shared_limit(settings.RATE_LIMIT_GENERATE, scope="generate")
+async def generate_response_stream(request: Request, query: QueryRequest):
+    try:
+        app_logger.debug("Request from: %s - %s", request.client.host, request.url.path)
+
+        sanitized_question = sanitize_input(query.question)
+        log_question("streaming question", sanitized_question, query)
+    except ValueError as e:
+        app_logger.error(f"Validation error: {str(e)}")
+        raise ValidationError(f"Invalid input: {str(e)}")
+
+    await require_pipeline()
+    await require_corpus(query.corpus)
+    session = resolve_session(query)
+    return StreamingResponse(
+        stream_answer_events(sanitized_question, query.corpus, session),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+def record_batch_cost(request: Request, batch: BatchQueryRequest):
+    """Dependency storing the number of questions of a batch, which is what it costs against the rate limit."""
+    request.state.rate_limit_cost = len(batch.questions)
+
+
+def rate_limit_cost(request: Request) -> int:
+    return getattr(request.state, "rate_limit_cost", 1)
+
+
+async def answer_batch(questions: List[str], corpus_name: Optional[str] = None):
+    """
+    Answer the questions of a batch, yielding a BatchItem for each as soon as it is ready.
+
+    Questions that are empty once sanitized fail on their own, and so does
+    a question whose answer could not be generated; the rest of the batch
+    is still answered.
+    """
+    sanitized = [sanitize_input(question) for question in questions]
+    valid = [index for index, question in enumerate(sanitized) if question.strip()]
+    for index in sorted(set(range(len(questions))) - set(valid)):
+        yield BatchItem(index=index, error="Invalid input: the question is empty after sanitization")
+
+    async with generator.acquire_corpus(corpus_name) as corpus:
+        results = generator.agenerate_batch(
+            [sanitized[index] for index in valid], settings.BATCH_MAX_CONCURRENCY, corpus
+        )
+        async for position, result in results:
+            if isinstance(result, Exception):
+                app_logger.error(f"Error generating batch response: {str(result)}", exc_info=result)
+                yield BatchItem(index=valid[position], error="Error generating response")
+            else:
+                yield BatchItem(index=valid[position], response=result)
+
+
+async def stream_batch_events(questions: List[str], corpus_name: Optional[str] = None):
+    """
+    Stream the results of a batch as Server-Sent Events.
+
+    Emits one ``result`` event per question, in completion order, then a
+    ``done`` event with the number of answered and failed questions and the
+    total duration.
+    """
+    start_time = time.perf_counter()
+    failed = 0
+    try:
+        async for item in answer_batch(questions, corpus_name):
+            failed += item.error is not None
+            yield format_sse_event("result", item.model_dump())
+        total_ms = (time.perf_counter() - start_time) * 1000
+        app_logger.info(f"Streamed batch of {len(questions)} questions in {total_ms:.0f} ms")
+        yield format_sse_event(
+            "done", {"answered": len(questions) - failed, "failed": failed, "total_ms": round(total_ms, 1)}
+        )
+    except Exception as e:
+        app_logger.error(f"Error streaming batch response: {str(e)}", exc_info=True)
+        yield format_sse_event("error", {"error": "Error generating response"})
+
+
+@app.post("/generate/batch", response_model=BatchResponse, tags=["RAG"], dependencies=[Depends(record_batch_cost)])
+@limiter.shared_limit(settings.RATE_LIMIT_GENERATE, scope="generate", cost=rate_limit_cost)
+async def generate_batch_response(request: Request, batch: BatchQueryRequest):
+    """
+    Answer up to ``BATCH_MAX_QUESTIONS`` questions in one request.
+
+    Every question counts against the ``/generate/`` rate limit. At most
+    ``BATCH_MAX_CONCURRENCY`` questions run through the chain at once;
+    duplicate questions are answered once. A question that cannot be
+    answered gets an ``error`` instead of a ``response``, without failing
+    the batch. With ``stream``, results are sent as Server-Sent Events in
+    completion order.
+    """
+    await require_pipeline()
+    await require_corpus(batch.corpus)
+    app_logger.info(f"Received batch of {len(batch.questions)} questions")
+    if batch.stream:
+        return StreamingResponse(
+            stream_batch_events(batch.questions, batch.corpus),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",
+            },
+        )
+
+    try:
+        results = [item async for item in answer_batch(batch.questions, batch.corpus)]
+    except UnknownCorpusError as e:
+        raise NotFoundError(str(e))
+    except Exception as e:
+        app_logger.error(f"Error generating batch response: {str(e)}", exc_info=True)
+        raise RAGError("Error generating response")
+    app_logger.info("Successfully generated batch response")
+    return {"results": sorted(results, key=lambda item: item.index)}
+
+
+@app.delete("/sessions/{session_id}", status_code=204, tags=["RAG"])
+@limiter.limit(settings.RATE_LIMIT_SESSIONS)
+async def delete_session(request: Request, session_id: str):
+    """Forget the history of a conversation session."""
+    if not generator.session_store.delete(session_id):
+        raise NotFoundError("Unknown session")
+
+
 @app.get("/", tags=["Health"])
 @limiter.limit(settings.RATE_LIMIT_HEALTH)
 async def health_check(request: Request):
@@ -163,25 +554,106 @@ async def health_check(request: Request):
     return {"message": "Backend is running!"}
 
 
-responses: Dict[str, str] = {
-    "What are the visiting hours at the hospital?": "The hospital is open from 8 AM to 8 PM daily.",
-    "Who are the cardiology specialists at Harmony Health Center?": "Dr. John Doe and Dr. Jane Smith are our top cardiology specialists.",
-    "What payment options are available at the hospital?": "We accept cash, credit cards, and insurance payments.",
-    "How can I book an appointment?": "You can book an appointment by calling our front desk at +1-555-44-44 or visiting our website.",
+@app.get("/ready", tags=["Health"])
+async def readiness_check(request: Request):
+    """
+    Readiness probe: 200 once the RAG pipeline is built and warmed up and the
+    startup dependencies are loaded, 503 before that or if any failed.
+
+    The body reports the pipeline's lifecycle status, the error of a failed
+    startup and the startup timings in milliseconds, and the status and
+    error of each dependency. Not rate limited, since a throttled probe
+    would take a healthy worker out of rotation.
+    """
+    startup = generator.startup
+    dependencies = {
+        name: {"status": dependency.state.status, "error": dependency.state.error}
+        for name, dependency in startup_dependencies.items()
+    }
+    ready = startup.status == "ready" and all(state["status"] == "ready" for state in dependencies.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": startup.status,
+            "error": startup.error,
+            "timings_ms": startup.timings_ms,
+            "dependencies": dependencies,
+        },
+    )
+
+
+@app.get("/metrics", tags=["Health"])
+async def metrics_endpoint(request: Request):
+    """
+    Prometheus metrics: request and pipeline stage latency histograms, token
+    and retrieved-chunk count histograms, and the cache and batcher counters.
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# Loaded at startup by load_faq_store
+faq_store: Optional[FAQStore] = None
+
+FALLBACK_CHAT_RESPONSE = "I'm not sure about that. Here's some random advice: Stay hydrated and rest well."
+
+
+def load_faq_store():
+    """Index the FAQ data file; a relative FAQ_PATH is relative to the backend directory."""
+    global faq_store
+    faq_store = FAQStore(str(BACKEND_DIR / settings.FAQ_PATH), reload_interval=settings.FAQ_RELOAD_INTERVAL_SECONDS)
+
+
+def check_rate_limit_storage():
+    """Open the rate limit storage (creating a SQLite database) and check that it answers."""
+    if not limiter.limiter.storage.check():
+        raise RuntimeError("Rate limit storage is unreachable")
+
+
+startup_dependencies = {
+    "faq": generator.StartupDependency("FAQ", load_faq_store),
+    "rate_limit_storage": generator.StartupDependency("rate limit storage", check_rate_limit_storage),
 }
 
 
-@app.post("/chat/", response_model=Response, tags=["Chat"])
+async def require_faq():
+    """Wait for the FAQ, loading it if startup has not yet, or raise 503 if it could not be loaded."""
+    try:
+        await startup_dependencies["faq"].aensure()
+    except RuntimeError as e:
+        app_logger.error(str(e))
+        raise ServiceUnavailableError("The FAQ is not available")
+
+
+def faq_answer(question: str) -> Optional[str]:
+    """The FAQ answer for a question the RAG chain has no relevant context for, if the FAQ is loaded and one matches."""
+    if faq_store is None:
+        return None
+    match = faq_store.match(question, min_confidence=settings.FAQ_MIN_CONFIDENCE)
+    return match.answer if match is not None else None
+
+
+generator.relevance_gate.fallback = faq_answer
+
+
+@app.post("/chat/", response_model=ChatResponse, tags=["Chat"])
 @limiter.limit(settings.RATE_LIMIT_CHAT)
-async def generate_response(request: Request, question_request: QuestionRequest):
+async def chat_response(request: Request, question_request: QuestionRequest):
+    await require_faq()
     try:
         sanitized_question = sanitize_input(question_request.question)
         app_logger.info(f"Received chat question: {sanitized_question}")
         
-        question = sanitized_question.strip()
-        response_text = responses.get(question, f"I'm not sure about that. Here's some random advice: Stay hydrated and rest well.")
-        app_logger.info("Successfully retrieved response")
-        return {"response": response_text}
+        match = faq_store.match(sanitized_question, min_confidence=settings.FAQ_MIN_CONFIDENCE)
+        if match is None:
+            app_logger.info("No predefined response matched")
+            return {"response": FALLBACK_CHAT_RESPONSE}
+
+        app_logger.info(f"Successfully retrieved response ({match.match_type}, confidence {match.confidence})")
+        return {
+            "response": match.answer,
+            "confidence": match.confidence,
+            "matched_question": match.question,
+        }
     except ValueError as e:
         app_logger.error(f"Validation error: {str(e)}")
         raise ValidationError(f"Invalid input: {str(e)}")
@@ -189,3 +661,5 @@ async def generate_response(request: Request, question_request: QuestionRequest)
         app_logger.error(f"Error processing chat request: {str(e)}", exc_info=True)
         raise ValidationError("Error processing request")
 
+
+generator.startup.timings_ms["import_ms"] = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
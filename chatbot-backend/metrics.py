@@ -0,0 +1,272 @@
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from logger import current_trace_id
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+CHUNK_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Trace IDs accepted from clients; anything else is replaced by a generated one
+TRACE_ID_PATTERN = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """
+    Prometheus histogram with fixed buckets and optional labels.
+
+    ``observe`` is one bisect and two additions under a lock; cumulative
+    bucket counts are only computed when the histogram is rendered.
+    """
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        """Record a value for the series with the given label values, in ``labelnames`` order."""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self, *labelvalues: str) -> dict:
+        """Count and sum of one series, for tests and debugging."""
+        with self._lock:
+            counts, total = self._series.get(labelvalues, [[0], 0.0])
+            return {"count": sum(counts), "sum": total}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labelvalues, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += counts[-1]
+            labels = _format_labels(self.labelnames, labelvalues, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Histograms plus collectors, rendered in the Prometheus text exposition format.
+
+    A collector returns ``{component: {key: value}}``, e.g. the ``stats()``
+    of a cache, and is exposed as untyped ``<prefix>_<component>_<key>``
+    samples. Non-numeric values are skipped.
+    """
+
+    def __init__(self, prefix: str = "rag"):
+        self.prefix = prefix
+        self._histograms: List[Histogram] = []
+        self._collectors: List[Callable[[], Dict[str, dict]]] = []
+
+    def histogram(self, name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()) -> Histogram:
+        histogram = Histogram(name, documentation, buckets, labelnames)
+        self._histograms.append(histogram)
+        return histogram
+
+    def register_collector(self, collector: Callable[[], Dict[str, dict]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for histogram in self._histograms:
+            lines.extend(histogram.render())
+        for collector in self._collectors:
+            lines.extend(self._render_collected(collector()))
+        return "\n".join(lines) + "\n"
+
+    def _render_collected(self, components: Dict[str, Optional[dict]]) -> Iterable[str]:
+        for component, stats in components.items():
+            for key, value in (stats or {}).items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = re.sub(r"[^a-zA-Z0-9_]", "_", f"{self.prefix}_{component}_{key}")
+                yield f"# TYPE {name} untyped"
+                yield f"{name} {_format_value(value)}"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in each stage of answering a question.",
+    LATENCY_BUCKETS,
+    ("stage",),
+)
+PROMPT_TOKENS = registry.histogram("rag_prompt_tokens", "Prompt tokens per chat model call.", TOKEN_BUCKETS)
+COMPLETION_TOKENS = registry.histogram("rag_completion_tokens", "Completion tokens per chat model call.", TOKEN_BUCKETS)
+RETRIEVED_CHUNKS = registry.histogram("rag_retrieved_chunks", "Chunks returned by the retriever per question.", CHUNK_BUCKETS)
+GATED_SECONDS = registry.histogram(
+    "rag_gated_answer_duration_seconds",
+    "Time to answer a question the relevance gate kept from the chat model.",
+    LATENCY_BUCKETS,
+)
+HTTP_SECONDS = registry.histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to finishing its response.",
+    LATENCY_BUCKETS,
+    ("method", "route", "status"),
+)
+
+
+class PipelineMetricsCallback(BaseCallbackHandler):
+    """
+    LangChain callback handler timing the retrieval and chat model stages of the RAG chain.
+
+    Nested retrievers only count once, as the outermost retrieval, which
+    also records the number of chunks returned. Token counts come from the
+    usage the chat model reports. Chain events are ignored: dispatching them
+    for every runnable step costs more than the stages they would time, so
+    the chain's own steps record their durations directly. The handler runs
+    inline, so each event costs a dictionary update and no thread hop.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._started: Dict[object, Tuple[str, float]] = {}
+
+    @property
+    def ignore_chain(self) -> bool:
+        return True
+
+    def _start(self, run_id, stage: Optional[str]) -> None:
+        if stage is not None:
+            self._started[run_id] = (stage, time.perf_counter())
+
+    def _end(self, run_id) -> Optional[str]:
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return None
+        stage, start_time = started
+        STAGE_SECONDS.observe(time.perf_counter() - start_time, stage)
+        return stage
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        parent = self._started.get(parent_run_id)
+        self._start(run_id, "retrieval" if parent is None or parent[0] != "retrieval" else None)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        if self._end(run_id) == "retrieval":
+            RETRIEVED_CHUNKS.observe(len(documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "llm")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "llm")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+        prompt_tokens, completion_tokens = _token_usage(response)
+        if prompt_tokens is not None:
+            PROMPT_TOKENS.observe(prompt_tokens)
+        if completion_tokens is not None:
+            COMPLETION_TOKENS.observe(completion_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+
+
+def _token_usage(response) -> Tuple[Optional[int], Optional[int]]:
+    """Prompt and completion tokens of an LLMResult, from the message usage metadata or the provider output."""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens"), usage.get("output_tokens")
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens"), usage.get("completion_tokens")
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware recording request latency by route and status.
+
+    With a trace header configured, the request's trace ID (the client's,
+    if it is well formed, otherwise a generated one) is set in
+    ``logger.current_trace_id``, which stamps the request's log lines, and
+    echoed in the response header.
+    """
+
+    def __init__(self, app: ASGIApp, trace_header: str = ""):
+        self.app = app
+        self.trace_header = trace_header.lower()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        trace_id = None
+        token = None
+        if self.trace_header:
+            trace_id = Headers(scope=scope).get(self.trace_header)
+            if not trace_id or not TRACE_ID_PATTERN.fullmatch(trace_id):
+                trace_id = uuid.uuid4().hex
+            token = current_trace_id.set(trace_id)
+        status = 500
+
+        async def send_with_trace_id(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace_id is not None:
+                    message["headers"] = [*message.get("headers", []), (self.trace_header.encode("latin-1"), trace_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            route = scope.get("route")
+            HTTP_SECONDS.observe(
+                time.perf_counter() - start_time,
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                str(status),
+            )
+            if token is not None:
+                current_trace_id.reset(token)
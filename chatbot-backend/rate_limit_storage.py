@@ -0,0 +1,202 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+
+from logger import BACKEND_DIR, app_logger
+
+# Expired counters are purged after this many writes from a process
+SQLITE_CLEANUP_INTERVAL = 1000
+# Lock timeout when creating the database, which workers starting together may race on
+SQLITE_SETUP_TIMEOUT = 30.0
+
+
+def sliding_window_info(previous_count: int, current_count: int, expiry: int, now: float) -> Tuple[int, float, int, float]:
+    """
+    Window counts and TTLs as expected by the sliding window counter strategy.
+
+    Mirrors limits' memory storage: the previous window is weighted by the
+    part of it that still overlaps the sliding window.
+    """
+    previous_ttl = 0.0 if previous_count == 0 else (1 - (((now - expiry) / expiry) % 1)) * expiry
+    current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+    return previous_count, previous_ttl, current_count, current_ttl
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """
+    Rate limit counters in a SQLite database shared by every worker on a host.
+
+    ``sqlite:///relative/path.sqlite3`` (relative to the backend directory)
+    or ``sqlite:////absolute/path.sqlite3``. The database runs in WAL mode;
+    a sliding window check reads both window counters and increments the
+    current one inside one ``BEGIN IMMEDIATE`` transaction, so concurrent
+    workers cannot over-admit.
+
+    slowapi checks limits synchronously on the event loop, so a write waits
+    at most ``timeout`` seconds for the database lock. If another worker
+    holds it longer, the hit is admitted uncounted (fail-open) rather than
+    stalling every request of the worker; ``lock_timeouts`` counts them.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, timeout: float = 0.05, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        path = uri[len("sqlite:///"):] if uri.startswith("sqlite:///") else uri[len("sqlite://"):]
+        self.path = os.path.join(BACKEND_DIR, path)
+        self.timeout = float(timeout)
+        self.lock_timeouts = 0
+        self._local = threading.local()
+        self._setup_lock = threading.Lock()
+        self._set_up = False
+
+    def setup(self) -> None:
+        """
+        Create the database and its table, once.
+
+        Runs on first use, or from check() at startup, so creating the
+        limiter does no I/O when the app is imported.
+        """
+        if self._set_up:
+            return
+        with self._setup_lock:
+            if self._set_up:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            except OSError as e:
+                raise sqlite3.OperationalError(f"Cannot create the rate limit database directory: {e}") from e
+            conn = sqlite3.connect(self.path, timeout=SQLITE_SETUP_TIMEOUT, isolation_level=None)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS counters ("
+                    "key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)"
+                )
+            finally:
+                conn.close()
+            self._set_up = True
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread and process, in autocommit mode with explicit transactions."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            self.setup()
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid, self._local.writes = conn, os.getpid(), 0
+        return conn
+
+    def _transaction(self) -> "_ImmediateTransaction":
+        return _ImmediateTransaction(self._connection())
+
+    def _fail_open(self, error: sqlite3.OperationalError) -> None:
+        """Admit a hit whose write timed out on the database lock; re-raise any other error."""
+        if "locked" not in str(error) and "busy" not in str(error):
+            raise error
+        self.lock_timeouts += 1
+        app_logger.warning(f"Rate limit database busy for over {self.timeout * 1000:.0f} ms, admitting the request")
+
+    @staticmethod
+    def _get(conn: sqlite3.Connection, key: str, now: float) -> int:
+        row = conn.execute("SELECT count FROM counters WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        return row[0] if row else 0
+
+    def _incr(self, conn: sqlite3.Connection, key: str, expiry: float, amount: int, now: float) -> int:
+        self._local.writes += 1
+        if self._local.writes % SQLITE_CLEANUP_INTERVAL == 0:
+            conn.execute("DELETE FROM counters WHERE expires_at <= ?", (now,))
+        return conn.execute(
+            "INSERT INTO counters (key, count, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            "count = CASE WHEN expires_at <= ? THEN excluded.count ELSE count + excluded.count END, "
+            "expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END "
+            "RETURNING count",
+            (key, amount, now + expiry, now, now),
+        ).fetchone()[0]
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        try:
+            with self._transaction() as conn:
+                return self._incr(conn, key, expiry, amount, time.time())
+        except sqlite3.OperationalError as e:
+            self._fail_open(e)
+            return 0
+
+    def get(self, key: str) -> int:
+        return self._get(self._connection(), key, time.time())
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT expires_at FROM counters WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    def check(self) -> bool:
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM counters").rowcount
+
+    def clear(self, key: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM counters WHERE key = ?", (key,))
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        try:
+            with self._transaction() as conn:
+                previous_count, previous_ttl, current_count, _ = sliding_window_info(
+                    self._get(conn, previous_key, now), self._get(conn, current_key, now), expiry, now
+                )
+                if math.floor(previous_count * previous_ttl / expiry + current_count) + amount > limit:
+                    return False
+                self._incr(conn, current_key, 2 * expiry, amount, now)
+                return True
+        except sqlite3.OperationalError as e:
+            self._fail_open(e)
+            return True
+
+    def get_sliding_window(self, key: str, expiry: int) -> Tuple[int, float, int, float]:
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        conn = self._connection()
+        return sliding_window_info(self._get(conn, previous_key, now), self._get(conn, current_key, now), expiry, now)
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM counters WHERE key IN (?, ?)", (previous_key, current_key))
+
+
+class _ImmediateTransaction:
+    """``BEGIN IMMEDIATE`` ... ``COMMIT`` (or ``ROLLBACK`` on error) around a block."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
@@ -0,0 +1,125 @@
+from typing import Callable, List, Optional
+
+from langchain_core.documents import Document
+
+RELEVANCE_SCORE_KEY = "relevance_score"
+
+GATED_ANSWER = (
+    "I don't know. I couldn't find anything about that in the hospital's documents; "
+    "please rephrase your question or contact the hospital directly."
+)
+
+
+class GatedAnswer(str):
+    """
+    An answer the relevance gate gave without the chat model.
+
+    It is not cached: it only says that nothing relevant was found, which a
+    later ingest or FAQ change can make wrong.
+    """
+
+
+def with_relevance_score(document: Document, score: float) -> Document:
+    """A copy of a retrieved document carrying its cosine similarity to the query in its metadata."""
+    return Document(
+        id=document.id,
+        page_content=document.page_content,
+        metadata={**document.metadata, RELEVANCE_SCORE_KEY: float(score)},
+    )
+
+
+def cosine_from_distance(distance: float, space: str = "l2") -> float:
+    """
+    Cosine similarity from a Chroma distance.
+
+    Chroma's ``l2`` space is the squared Euclidean distance, which for
+    unit-length embeddings (as OpenAI's are) is ``2 - 2 * cosine``; its
+    ``cosine`` and ``ip`` spaces are ``1 - cosine`` and ``1 - dot``.
+    """
+    if space == "l2":
+        return 1.0 - distance / 2
+    return 1.0 - distance
+
+
+class RelevanceGate:
+    """
+    Decides from the retrieval scores whether a question needs the chat model.
+
+    Vector hits carry their cosine similarity to the question (see
+    ``with_relevance_score``). When the best one is below ``min_score`` none
+    of the chunks is about the question, and the model would only say it
+    does not know; so too when nothing is retrieved at all. The question is answered by ``fallback(question)`` (e.g.
+    an FAQ match) or ``GATED_ANSWER`` instead. When the best hit beats the
+    runner-up by ``decisive_margin``, only the chunks within that margin of
+    it are kept, at least ``min_chunks``, so the prompt carries fewer
+    distractors. Documents without a score are kept, and only scored ones
+    decide: lexical fast-path hits, which carry none, already passed the
+    fast path's own query coverage test and are never gated. A 0
+    ``min_score`` or ``decisive_margin`` disables that part.
+    """
+
+    def __init__(
+        self,
+        min_score: float = 0.0,
+        decisive_margin: float = 0.0,
+        min_chunks: int = 1,
+        fallback: Optional[Callable[[str], Optional[str]]] = None,
+    ):
+        self.min_score = min_score
+        self.decisive_margin = decisive_margin
+        self.min_chunks = min_chunks
+        self.fallback = fallback
+
+        self.questions = 0
+        self.gated = 0
+        self.fallback_answers = 0
+        self.trimmed = 0
+        self.trimmed_chunks = 0
+
+    def select(self, documents: List[Document], gate: bool = True) -> Optional[List[Document]]:
+        """
+        The documents to build the prompt from, or None if the question should not reach the model.
+
+        Args:
+            documents: Retrieved documents, best first
+            gate: Whether the question may be gated, e.g. not for a follow-up
+                the conversation history may answer
+        """
+        self.questions += 1
+        if gate and self.min_score and not documents:
+            self.gated += 1
+            return None
+        scores = [document.metadata.get(RELEVANCE_SCORE_KEY) for document in documents]
+        ranked = sorted((score for score in scores if score is not None), reverse=True)
+        if not ranked:
+            return documents
+        if gate and self.min_score and ranked[0] < self.min_score:
+            self.gated += 1
+            return None
+        if self.decisive_margin and len(ranked) > 1 and ranked[0] - ranked[1] >= self.decisive_margin:
+            cutoff = min(ranked[0] - self.decisive_margin, ranked[min(self.min_chunks, len(ranked)) - 1])
+            kept = [document for document, score in zip(documents, scores) if score is None or score >= cutoff]
+            if len(kept) < len(documents):
+                self.trimmed += 1
+                self.trimmed_chunks += len(documents) - len(kept)
+            return kept
+        return documents
+
+    def answer(self, question: str) -> GatedAnswer:
+        """The answer to a gated question, without the chat model."""
+        if self.fallback is not None:
+            answer = self.fallback(question)
+            if answer:
+                self.fallback_answers += 1
+                return GatedAnswer(answer)
+        return GatedAnswer(GATED_ANSWER)
+
+    def stats(self) -> dict:
+        return {
+            "questions": self.questions,
+            "llm_calls_avoided": self.gated,
+            "fallback_answers": self.fallback_answers,
+            "gated_rate": self.gated / self.questions if self.questions else 0.0,
+            "trimmed": self.trimmed,
+            "trimmed_chunks": self.trimmed_chunks,
+        }
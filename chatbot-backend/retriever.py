@@ -1,31 +1,458 @@
 from langchain_core.documents import Document
+import argparse
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from itertools import groupby
+from pathlib import Path
+from typing import Optional
 import dotenv
-from langchain_community.document_loaders import PyPDFLoader
+from pypdf import PdfReader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+from embedding_cache import build_embeddings
+from bm25 import BM25Index, BM25_INDEX_FILENAME
+from vector_index import (
+    MANIFEST_FILENAME,
+    QUANTIZATIONS,
+    VECTOR_INDEX_DIRNAME,
+    export_vector_index,
+    manifest_digest,
+    quantize_vector_index,
+    read_index_meta,
+)
 
-PDF_BOOK_PATH = "../data/harmony.pdf"
+DATA_DIR = "../data"
 BOOK_CHROMA_PATH = "chroma_data"
+MANIFEST_VERSION = 1
 
-dotenv.load_dotenv()
+# Pages a parser process extracts per task, so only a few pages of a file are held at a time
+PARSE_PAGES_PER_TASK = 16
+EMBED_BATCH_SIZE = 128
+MAX_BATCHES_IN_FLIGHT = 4
+CHECKPOINT_INTERVAL_SECONDS = 5.0
 
-loader = PyPDFLoader(PDF_BOOK_PATH)
-pdf_documents = loader.load()
+dotenv.load_dotenv()
 
 text_splitter = RecursiveCharacterTextSplitter(
     chunk_size=500,
     chunk_overlap=50
 )
 
-split_docs = []
-for doc in pdf_documents:
-    chunks = text_splitter.split_text(doc.page_content)
-    for chunk in chunks:
-        split_docs.append(Document(page_content=chunk, metadata={"page": doc.metadata["page"]}))
 
-reviews_vector_db = Chroma.from_documents(
-    split_docs, OpenAIEmbeddings(), persist_directory=BOOK_CHROMA_PATH
-)
+@dataclass
+class IngestReport:
+    """Summary of one ingest run."""
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    skipped: int = 0
+    files: int = 0
+    pages: int = 0
+    chunks: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def __str__(self):
+        return (
+            f"added={self.added} updated={self.updated} removed={self.removed} "
+            f"skipped={self.skipped} in {self.elapsed_seconds:.2f}s "
+            f"({self.files} files, {self.pages_per_second:.1f} pages/s, {self.chunks_per_second:.1f} chunks/s)"
+        )
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_key(path: str, data_dir: Optional[str] = None) -> str:
+    """
+    The source ID of a file in the manifest and chunk IDs.
+
+    This is its path relative to ``data_dir`` when it lies inside it, and
+    its resolved path otherwise, so the same file gets the same ID whatever
+    the working directory of the ingest.
+    """
+    resolved = Path(path).resolve()
+    if data_dir is not None and resolved.is_relative_to(Path(data_dir).resolve()):
+        return resolved.relative_to(Path(data_dir).resolve()).as_posix()
+    return resolved.as_posix()
+
+
+def chunk_id(source: str, page: int, index: int) -> str:
+    """Stable ID of the index-th chunk of a page, so re-ingesting the same position upserts in place."""
+    return f"{source}:{page}:{index}"
+
+
+def load_manifest(persist_directory: str) -> dict:
+    path = os.path.join(persist_directory, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return {"version": MANIFEST_VERSION, "sources": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(persist_directory: str, manifest: dict) -> None:
+    """Write the manifest atomically, so a crash never leaves a half-written file."""
+    os.makedirs(persist_directory, exist_ok=True)
+    path = os.path.join(persist_directory, MANIFEST_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def pdf_page_count(pdf_path: str) -> int:
+    return len(PdfReader(pdf_path).pages)
+
+
+def parse_pdf(pdf_path: str, start: int = 0, stop: Optional[int] = None):
+    """Extract the ``(page, text)`` pairs of pages ``start`` to ``stop`` of a PDF. Runs in a worker process."""
+    pages = PdfReader(pdf_path).pages
+    stop = len(pages) if stop is None else min(stop, len(pages))
+    return [(page, pages[page].extract_text(extraction_mode="plain").strip()) for page in range(start, stop)]
+
+
+def diff_pages(source: str, pages, old_pages: dict, report: IngestReport, new_pages: dict, delete_ids: list):
+    """
+    Compare the pages of a source with its manifest entry.
+
+    Yields ``(chunk_id, Document)`` for every new or changed chunk, as the
+    pages are split. Unchanged pages are skipped without splitting. The new
+    manifest pages are written to ``new_pages`` and the IDs of chunks that no
+    longer exist are appended to ``delete_ids``.
+    """
+    for doc in pages:
+        page = doc.metadata["page"]
+        page_key = str(page)
+        page_hash = content_hash(doc.page_content)
+        old_page = old_pages.get(page_key)
+        report.pages += 1
+
+        if old_page and old_page["hash"] == page_hash:
+            new_pages[page_key] = old_page
+            report.skipped += len(old_page["chunks"])
+            continue
+
+        old_chunks = old_page["chunks"] if old_page else {}
+        new_chunks = {}
+        for index, chunk in enumerate(text_splitter.split_text(doc.page_content)):
+            id_ = chunk_id(source, page, index)
+            new_chunks[id_] = content_hash(chunk)
+            report.chunks += 1
+            old_hash = old_chunks.get(id_)
+            if old_hash == new_chunks[id_]:
+                report.skipped += 1
+                continue
+            if old_hash is None:
+                report.added += 1
+            else:
+                report.updated += 1
+            yield id_, Document(page_content=chunk, metadata={"page": page, "source": source})
+
+        delete_ids.extend(id_ for id_ in old_chunks if id_ not in new_chunks)
+        new_pages[page_key] = {"hash": page_hash, "chunks": new_chunks}
+
+    for page_key, old_page in old_pages.items():
+        if page_key not in new_pages:
+            delete_ids.extend(old_page["chunks"])
+
+
+def find_pdfs(directory: str):
+    return sorted(str(path) for path in Path(directory).rglob("*.pdf"))
+
+
+def parse_tasks(sources):
+    """Split ``(source, path)`` pairs into ``(source, path, start, stop)`` page ranges of PARSE_PAGES_PER_TASK pages."""
+    for source, path in sources:
+        count = pdf_page_count(path)
+        # A file without pages still gets a task, so it is recorded as done
+        for start in range(0, max(count, 1), PARSE_PAGES_PER_TASK):
+            yield source, path, start, min(start + PARSE_PAGES_PER_TASK, count)
+
+
+def parse_in_pool(tasks, executor, lookahead: int):
+    """Yield ``(source, pages)`` per task in order, keeping at most ``lookahead`` tasks parsed ahead of the consumer."""
+    pending = deque()
+    tasks = iter(tasks)
+    for source, path, start, stop in tasks:
+        pending.append((source, executor.submit(parse_pdf, path, start, stop)))
+        if len(pending) >= lookahead:
+            break
+    while pending:
+        source, future = pending.popleft()
+        next_task = next(tasks, None)
+        if next_task is not None:
+            next_source, path, start, stop = next_task
+            pending.append((next_source, executor.submit(parse_pdf, path, start, stop)))
+        yield source, future.result()
+
+
+class _SourceDone:
+    """Marker in the chunk stream: every chunk of ``source`` has been emitted."""
+
+    def __init__(self, source: str, entry: dict, delete_ids: list):
+        self.source = source
+        self.entry = entry
+        self.delete_ids = delete_ids
+
+
+def ingest_directory(
+    paths,
+    vector_db: Chroma,
+    manifest: dict,
+    persist_directory: str,
+    workers: int = None,
+    batch_size: int = EMBED_BATCH_SIZE,
+    max_batches_in_flight: int = MAX_BATCHES_IN_FLIGHT,
+    prune_missing: bool = True,
+    data_dir: Optional[str] = None,
+) -> IngestReport:
+    """
+    Incrementally index many PDFs with parallel parsing and embedding.
+
+    Pages are extracted in a process pool, PARSE_PAGES_PER_TASK at a time
+    so memory stays flat however large a file is, split lazily into a
+    chunk stream and embedded in batches of ``batch_size`` with up to
+    ``max_batches_in_flight`` batches in flight. Batches are written to
+    Chroma in order. The manifest doubles as the resume checkpoint: a source
+    is recorded (and the manifest saved, at most every
+    CHECKPOINT_INTERVAL_SECONDS) only after all of its chunks are written,
+    so a crashed run resumes with the unfinished sources. Files whose bytes
+    are unchanged are skipped without parsing.
+
+    Args:
+        paths: PDF paths
+        vector_db (Chroma): Vector store to update
+        manifest (dict): Manifest from load_manifest, updated in place
+        persist_directory (str): Where checkpoints of the manifest are saved
+        workers (int): Parser processes, defaults to the CPU count
+        batch_size (int): Chunks per embedding call and Chroma write
+        max_batches_in_flight (int): Embedding batches running concurrently
+        prune_missing (bool): Delete sources in the manifest that are not in ``paths``
+        data_dir (str): Directory the source IDs are relative to (see source_key)
+
+    Returns:
+        IngestReport: Counts, elapsed time and throughput
+    """
+    start_time = time.perf_counter()
+    report = IngestReport()
+    paths = {source_key(path, data_dir): path for path in paths}
+    sources = manifest["sources"]
+    last_checkpoint = time.perf_counter()
+
+    delete_ids = []
+    if prune_missing:
+        wanted = set(paths)
+        for source in [source for source in sources if source not in wanted]:
+            for page in sources.pop(source)["pages"].values():
+                delete_ids.extend(page["chunks"])
+    if delete_ids:
+        vector_db.delete(ids=delete_ids)
+        report.removed += len(delete_ids)
+
+    to_parse, hashes = [], {}
+    for source, path in paths.items():
+        hashes[source] = file_hash(path)
+        entry = sources.get(source)
+        if entry and entry.get("file_hash") == hashes[source]:
+            report.skipped += sum(len(page["chunks"]) for page in entry["pages"].values())
+        else:
+            to_parse.append((source, path))
+    report.files = len(to_parse)
+
+    def chunk_stream(parsed):
+        for source, tasks in groupby(parsed, key=lambda item: item[0]):
+            pages = (page for _, task_pages in tasks for page in task_pages)
+            old_pages = sources.get(source, {}).get("pages", {})
+            new_pages, source_deletes = {}, []
+            page_docs = (Document(page_content=text, metadata={"page": page}) for page, text in pages)
+            yield from diff_pages(source, page_docs, old_pages, report, new_pages, source_deletes)
+            yield _SourceDone(source, {"file_hash": hashes[source], "pages": new_pages}, source_deletes)
+
+    def batches(stream):
+        batch, done = [], []
+        for item in stream:
+            if isinstance(item, _SourceDone):
+                done.append(item)
+                continue
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield batch, done
+                batch, done = [], []
+        if batch or done:
+            yield batch, done
+
+    def flush(future, batch, done):
+        nonlocal last_checkpoint
+        if batch:
+            vector_db._collection.upsert(
+                ids=[id_ for id_, _ in batch],
+                embeddings=future.result(),
+                documents=[doc.page_content for _, doc in batch],
+                metadatas=[doc.metadata for _, doc in batch],
+            )
+        for marker in done:
+            if marker.delete_ids:
+                vector_db.delete(ids=marker.delete_ids)
+                report.removed += len(marker.delete_ids)
+            sources[marker.source] = marker.entry
+        if done and time.perf_counter() - last_checkpoint >= CHECKPOINT_INTERVAL_SECONDS:
+            save_manifest(persist_directory, manifest)
+            last_checkpoint = time.perf_counter()
+
+    workers = workers or os.cpu_count() or 1
+    embed = vector_db.embeddings.embed_documents
+    with ProcessPoolExecutor(max_workers=workers) as parse_pool, \
+            ThreadPoolExecutor(max_workers=max_batches_in_flight) as embed_pool:
+        in_flight = deque()
+        for batch, done in batches(chunk_stream(parse_in_pool(parse_tasks(to_parse), parse_pool, lookahead=2 * workers))):
+            texts = [doc.page_content for _, doc in batch]
+            future = embed_pool.submit(embed, texts) if texts else None
+            in_flight.append((future, batch, done))
+            while len(in_flight) >= max_batches_in_flight:
+                flush(*in_flight.popleft())
+        while in_flight:
+            flush(*in_flight.popleft())
+
+    save_manifest(persist_directory, manifest)
+    report.elapsed_seconds = time.perf_counter() - start_time
+    return report
+
+
+def rebuild_lexical_index(vector_db: Chroma, persist_directory: str) -> BM25Index:
+    """Build the BM25 index from every chunk in the collection and save it next to the Chroma data."""
+    data = vector_db.get(include=["documents", "metadatas"])
+    index = BM25Index(data["ids"], data["documents"], data["metadatas"])
+    index.save(os.path.join(persist_directory, BM25_INDEX_FILENAME))
+    return index
+
+
+def refresh_vector_index(
+    vector_db: Chroma,
+    persist_directory: str,
+    export: bool = False,
+    quantization: Optional[str] = None,
+    keep_exact: Optional[bool] = None,
+) -> Optional[dict]:
+    """
+    Re-export the collection for VECTOR_BACKEND=numpy after an ingest.
+
+    Runs when ``export`` is set or an export already exists, so an ingest
+    never leaves a stale export behind. Unless given, the quantization and
+    whether the exact vectors are kept are those of the existing export.
+
+    Returns:
+        Optional[dict]: The new export's ``count``, ``quantization`` and
+        ``exact_vectors``, or None if there is no export
+    """
+    directory = os.path.join(persist_directory, VECTOR_INDEX_DIRNAME)
+    previous = read_index_meta(directory)
+    if not export and previous is None:
+        return None
+    previous = previous or {}
+    if keep_exact is None:
+        keep_exact = not previous.get("quantization") or os.path.exists(os.path.join(directory, "vectors.npy"))
+    quantization = quantization or previous.get("quantization")
+    count = export_vector_index(vector_db, directory, source_digest=manifest_digest(persist_directory))
+    if quantization:
+        quantize_vector_index(directory, quantization, keep_exact=keep_exact)
+    return {"count": count, "quantization": quantization, "exact_vectors": keep_exact or not quantization}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index PDFs into ChromaDB.")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Directory of PDFs to index (recursively)")
+    parser.add_argument("--pdf", help="Index a single PDF instead of --data-dir")
+    parser.add_argument("--persist-directory", default=BOOK_CHROMA_PATH)
+    parser.add_argument("--full", action="store_true", help="Drop the collection and re-index from scratch")
+    parser.add_argument("--workers", type=int, default=None, help="PDF parser processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Chunks per embedding batch")
+    parser.add_argument("--max-in-flight", type=int, default=MAX_BATCHES_IN_FLIGHT, help="Concurrent embedding batches")
+    parser.add_argument(
+        "--export-vector-index",
+        action="store_true",
+        help="Also export the collection for VECTOR_BACKEND=numpy (an existing export is always refreshed)",
+    )
+    parser.add_argument(
+        "--quantize",
+        choices=QUANTIZATIONS,
+        help="Scan compressed vectors in the exported index, rescoring a shortlist against the float32 ones",
+    )
+    parser.add_argument(
+        "--drop-exact-vectors",
+        action="store_true",
+        help="With --quantize, delete the float32 vectors to save disk and rank by the compressed ones alone",
+    )
+    args = parser.parse_args()
+
+    vector_db = Chroma(persist_directory=args.persist_directory, embedding_function=build_embeddings())
+    manifest = load_manifest(args.persist_directory)
+
+    if not manifest["sources"] and vector_db._collection.count() > 0:
+        print("⚠️  Collection has no manifest (indexed by an older version), rebuilding it")
+        args.full = True
+    if args.full:
+        vector_db.reset_collection()
+        manifest = {"version": MANIFEST_VERSION, "sources": {}}
+
+    paths = [args.pdf] if args.pdf else find_pdfs(args.data_dir)
+    report = ingest_directory(
+        paths,
+        vector_db,
+        manifest,
+        args.persist_directory,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        max_batches_in_flight=args.max_in_flight,
+        prune_missing=not args.pdf,
+        data_dir=args.data_dir,
+    )
+
+    lexical_index = rebuild_lexical_index(vector_db, args.persist_directory)
+
+    print(f"✅ Indexed {len(paths)} PDFs: {report}")
+    print(f"✅ Built BM25 index over {len(lexical_index)} chunks")
+
+    exported = refresh_vector_index(
+        vector_db,
+        args.persist_directory,
+        export=args.export_vector_index or bool(args.quantize),
+        quantization=args.quantize,
+        keep_exact=False if args.drop_exact_vectors else None,
+    )
+    if exported is not None:
+        print(f"✅ Exported {exported['count']} vectors to the memory-mapped index")
+        if exported["quantization"]:
+            print(
+                f"✅ Quantized the exported vectors to {exported['quantization']}"
+                f"{' (float32 kept for rescoring)' if exported['exact_vectors'] else ''}"
+            )
+    print(json.dumps({
+        **asdict(report),
+        "pages_per_second": report.pages_per_second,
+        "chunks_per_second": report.chunks_per_second,
+    }))
+
 
-print(f"✅ Indexed {len(split_docs)} chunks into ChromaDB")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import asyncio
+import time
+from functools import partial
+from typing import Any, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStoreRetriever
+from pydantic import Field
+
+from bm25 import reciprocal_rank_fusion
+from metrics import STAGE_SECONDS
+from relevance import RELEVANCE_SCORE_KEY, cosine_from_distance, with_relevance_score
+
+
+class AsyncVectorStoreRetriever(VectorStoreRetriever):
+    """
+    Vector store retriever whose async path never blocks the event loop.
+
+    The query embedding goes through the embeddings' native async client and
+    only the local vector search is pushed to the default thread pool.
+    Similarity search results carry their cosine similarity to the query
+    under ``relevance_score`` in their metadata.
+    """
+
+    async def _aget_relevant_documents(self, query, *, run_manager, **kwargs):
+        if self.search_type != "similarity":
+            return await super()._aget_relevant_documents(query, run_manager=run_manager, **kwargs)
+        search_kwargs = self.search_kwargs | kwargs
+        start_time = time.perf_counter()
+        embedding = await self.vectorstore.embeddings.aembed_query(query)
+        embedded_time = time.perf_counter()
+        STAGE_SECONDS.observe(embedded_time - start_time, "embedding")
+        loop = asyncio.get_running_loop()
+        documents = await loop.run_in_executor(None, partial(self._search_with_scores, embedding, **search_kwargs))
+        STAGE_SECONDS.observe(time.perf_counter() - embedded_time, "vector_search")
+        return documents
+
+    def _search_with_scores(self, embedding, **search_kwargs) -> List[Document]:
+        space = (self.vectorstore._collection.metadata or {}).get("hnsw:space", "l2")
+        return [
+            with_relevance_score(document, cosine_from_distance(distance, space))
+            for document, distance in self.vectorstore.similarity_search_by_vector_with_relevance_scores(
+                embedding, **search_kwargs
+            )
+        ]
+
+
+class MmapVectorRetriever(BaseRetriever):
+    """
+    Retriever over a MmapVectorIndex, returning the same Documents as the
+    Chroma retriever, with their cosine similarity under ``relevance_score``.
+    """
+
+    embeddings: Any
+    index: Any
+    search_kwargs: dict = Field(default_factory=lambda: {"k": 5})
+
+    def _get_relevant_documents(self, query, *, run_manager, **kwargs) -> List[Document]:
+        start_time = time.perf_counter()
+        embedding = self.embeddings.embed_query(query)
+        embedded_time = time.perf_counter()
+        STAGE_SECONDS.observe(embedded_time - start_time, "embedding")
+        documents = self._search_with_scores(embedding, **(self.search_kwargs | kwargs))
+        STAGE_SECONDS.observe(time.perf_counter() - embedded_time, "vector_search")
+        return documents
+
+    async def _aget_relevant_documents(self, query, *, run_manager, **kwargs) -> List[Document]:
+        start_time = time.perf_counter()
+        embedding = await self.embeddings.aembed_query(query)
+        embedded_time = time.perf_counter()
+        STAGE_SECONDS.observe(embedded_time - start_time, "embedding")
+        loop = asyncio.get_running_loop()
+        documents = await loop.run_in_executor(
+            None, partial(self._search_with_scores, embedding, **(self.search_kwargs | kwargs))
+        )
+        STAGE_SECONDS.observe(time.perf_counter() - embedded_time, "vector_search")
+        return documents
+
+    def _search_with_scores(self, embedding, **search_kwargs) -> List[Document]:
+        return [
+            with_relevance_score(document, score)
+            for document, score in self.index.similarity_search_with_score_by_vector(embedding, **search_kwargs)
+        ]
+
+
+class RetrievalStats:
+    """Counts of lexical fast-path and fused retrievals, with the vector-path latency they avoid."""
+
+    def __init__(self, ewma_alpha: float = 0.1):
+        self.ewma_alpha = ewma_alpha
+        self.queries = 0
+        self.fast_path = 0
+        self.fused = 0
+        self.vector_latency = None
+
+    def record_vector_latency(self, seconds: float) -> None:
+        if self.vector_latency is None:
+            self.vector_latency = seconds
+        else:
+            self.vector_latency += self.ewma_alpha * (seconds - self.vector_latency)
+
+    def as_dict(self) -> dict:
+        vector_ms = (self.vector_latency or 0.0) * 1000
+        return {
+            "queries": self.queries,
+            "fast_path": self.fast_path,
+            "fused": self.fused,
+            "fast_path_rate": self.fast_path / self.queries if self.queries else 0.0,
+            "mean_vector_latency_ms": vector_ms,
+            "estimated_saved_ms": vector_ms * self.fast_path,
+        }
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Lexical-first retriever with reciprocal rank fusion.
+
+    Every query is first scored against the local BM25 index. When the top
+    hit covers at least ``min_coverage`` of the query's IDF weight and beats
+    the runner-up by ``min_margin``, the BM25 hits are returned as they are
+    and no query embedding is computed. Otherwise BM25 and vector results
+    (``fetch_k`` each) are fused with reciprocal rank fusion. Fused documents
+    keep the ``relevance_score`` of their vector hit; BM25-only hits, which
+    are not among the ``fetch_k`` nearest, get the lowest vector score, an
+    upper bound of their own.
+    """
+
+    vector_retriever: BaseRetriever
+    lexical_index: Any
+    k: int = 5
+    fetch_k: int = 10
+    min_coverage: float = 0.9
+    min_margin: float = 1.3
+    stats: RetrievalStats = Field(default_factory=RetrievalStats)
+
+    def lexical_fast_path(self, query: str) -> Optional[List[Document]]:
+        """Return the BM25 hits if they are confident enough to skip vector search, else None."""
+        return self._fast_path(self.lexical_index.search(query, self.fetch_k))
+
+    def _get_relevant_documents(self, query, *, run_manager, **kwargs) -> List[Document]:
+        start_time = time.perf_counter()
+        lexical = self.lexical_index.search(query, self.fetch_k)
+        STAGE_SECONDS.observe(time.perf_counter() - start_time, "lexical_search")
+        self.stats.queries += 1
+        documents = self._fast_path(lexical)
+        if documents is not None:
+            self.stats.fast_path += 1
+            return documents
+
+        start_time = time.perf_counter()
+        vector_documents = self.vector_retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}, k=self.fetch_k
+        )
+        self.stats.record_vector_latency(time.perf_counter() - start_time)
+        self.stats.fused += 1
+        return self._fuse(lexical.documents, vector_documents)
+
+    async def _aget_relevant_documents(self, query, *, run_manager, **kwargs) -> List[Document]:
+        start_time = time.perf_counter()
+        lexical = self.lexical_index.search(query, self.fetch_k)
+        STAGE_SECONDS.observe(time.perf_counter() - start_time, "lexical_search")
+        self.stats.queries += 1
+        documents = self._fast_path(lexical)
+        if documents is not None:
+            self.stats.fast_path += 1
+            return documents
+
+        start_time = time.perf_counter()
+        vector_documents = await self.vector_retriever.ainvoke(
+            query, config={"callbacks": run_manager.get_child()}, k=self.fetch_k
+        )
+        self.stats.record_vector_latency(time.perf_counter() - start_time)
+        self.stats.fused += 1
+        return self._fuse(lexical.documents, vector_documents)
+
+    def _fuse(self, lexical_documents: List[Document], vector_documents: List[Document]) -> List[Document]:
+        scores = {
+            document.id or document.page_content: document.metadata[RELEVANCE_SCORE_KEY]
+            for document in vector_documents
+            if RELEVANCE_SCORE_KEY in document.metadata
+        }
+        fused = reciprocal_rank_fusion([lexical_documents, vector_documents], self.k)
+        if not scores or len(scores) < len(vector_documents):
+            return fused
+        bound = min(scores.values())
+        return [
+            document
+            if RELEVANCE_SCORE_KEY in document.metadata
+            else with_relevance_score(document, scores.get(document.id or document.page_content, bound))
+            for document in fused
+        ]
+
+    def _fast_path(self, lexical) -> Optional[List[Document]]:
+        if lexical.documents and lexical.coverage >= self.min_coverage and lexical.margin >= self.min_margin:
+            return lexical.documents[:self.k]
+        return None
@@ -1,116 +1,167 @@
-from fastapi import Request, HTTPException, status
-from fastapi.security import APIKeyHeader
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
-import re
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import hmac
 from config import settings
+from exceptions import AuthenticationError, RequestTooLargeError, ValidationError
 from logger import app_logger
+from metrics import STAGE_SECONDS
 import time
 
-class SecurityMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
-        app_logger.debug(f"Processing request from IP: {request.client.host}")
-        app_logger.debug(f"Request path: {request.url.path}")
-        app_logger.debug(f"Request headers: {dict(request.headers)}")
-        app_logger.debug(f"Expected API key header: {settings.API_KEY_HEADER}")
-        app_logger.debug(f"API key present: {settings.API_KEY is not None and len(settings.API_KEY) > 0}")
+# Probe endpoints that load balancers and orchestrators call without an API key
+PUBLIC_PATHS = frozenset({"/", "/ready"})
 
-        try:
-            content_length = request.headers.get('content-length')
-            if content_length and int(content_length) > settings.MAX_REQUEST_SIZE:
-                app_logger.warning(f"Request size exceeded from IP: {request.client.host}")
-                raise HTTPException(
-                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                    detail={
-                        "error": "Request too large",
-                        "max_size": settings.MAX_REQUEST_SIZE,
-                        "requested_size": int(content_length)
-                    }
-                )
+class SecurityMiddleware:
+    """
+    Plain ASGI middleware enforcing the request size limit and the API key.
+
+    Requests whose ``Content-Length`` exceeds ``MAX_REQUEST_SIZE`` are
+    rejected with 413; bodies sent without a length are counted as they are
+    received. The health and readiness probes and development mode skip the API key
+    check; otherwise the key is compared in constant time. Being a plain
+    ASGI app, it adds no task or stream wrapping around the response, so
+    streaming responses pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-            # Skip API key check for health endpoint
-            if request.url.path == "/":
-                app_logger.debug("Skipping API key check for health endpoint")
-                response = await call_next(request)
-                return response
+        start_time = time.perf_counter()
+        headers = Headers(scope=scope)
+        client_host = scope["client"][0] if scope.get("client") else "unknown"
+        path = scope["path"]
 
+        app_logger.debug("Processing request from IP: %s", client_host)
+        app_logger.debug("Request path: %s", path)
+        app_logger.debug("Request headers: %s", headers)
+        app_logger.debug("Expected API key header: %s", settings.API_KEY_HEADER)
+        app_logger.debug("API key present: %s", bool(settings.API_KEY))
+
+        try:
+            try:
+                content_length = int(headers.get('content-length') or 0)
+            except ValueError:
+                raise ValidationError("Invalid Content-Length header")
+            if content_length > settings.MAX_REQUEST_SIZE:
+                app_logger.warning(f"Request size exceeded from IP: {client_host}")
+                raise RequestTooLargeError({
+                    "error": "Request too large",
+                    "max_size": settings.MAX_REQUEST_SIZE,
+                    "requested_size": content_length
+                })
+
+            # Skip API key check for health and readiness probes
+            if path in PUBLIC_PATHS:
+                app_logger.debug("Skipping API key check for probe endpoint")
             # Skip API key check for development mode
-            if settings.DEVELOPMENT_MODE:
+            elif settings.DEVELOPMENT_MODE:
                 app_logger.debug("Development mode: Skipping API key check")
-                response = await call_next(request)
-                return response
-
-            # Check API key
-            api_key = request.headers.get(settings.API_KEY_HEADER)
-            if not api_key:
-                app_logger.warning(f"Missing API key from IP: {request.client.host}")
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail={
-                        "error": "API key is required",
-                        "header": settings.API_KEY_HEADER
-                    }
-                )
-            
-            if api_key != settings.API_KEY:
-                app_logger.warning(f"Invalid API key from IP: {request.client.host}")
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail={
-                        "error": "Invalid API key",
-                        "header": settings.API_KEY_HEADER
-                    }
-                )
-
-            app_logger.debug("API key validation successful")
-            response = await call_next(request)
-            
-            # Log request duration
-            duration = time.time() - start_time
-            app_logger.debug(f"Request completed in {duration:.2f} seconds")
-            
-            return response
-            
+            else:
+                self._check_api_key(headers.get(settings.API_KEY_HEADER), client_host)
+                app_logger.debug("API key validation successful")
         except HTTPException as e:
-            # Log the error with more details
             app_logger.error(f"HTTP Exception: {e.detail}")
-            raise
-        except Exception as e:
-            # Log unexpected errors
-            app_logger.error(f"Unexpected error in security middleware: {str(e)}", exc_info=True)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail={
-                    "error": "Internal server error",
-                    "message": "An unexpected error occurred"
-                }
-            )
+            await JSONResponse({"detail": e.detail}, status_code=e.status_code)(scope, receive, send)
+            return
+
+        await self._call_app(scope, receive, send)
+        app_logger.debug("Request completed in %.2f seconds", time.perf_counter() - start_time)
+
+    @staticmethod
+    def _check_api_key(api_key, client_host):
+        if not api_key:
+            app_logger.warning(f"Missing API key from IP: {client_host}")
+            raise AuthenticationError({
+                "error": "API key is required",
+                "header": settings.API_KEY_HEADER
+            })
+        if not hmac.compare_digest(api_key.encode("utf-8"), settings.API_KEY.encode("utf-8")):
+            app_logger.warning(f"Invalid API key from IP: {client_host}")
+            raise AuthenticationError({
+                "error": "Invalid API key",
+                "header": settings.API_KEY_HEADER
+            })
+
+    async def _call_app(self, scope: Scope, receive: Receive, send: Send):
+        """Run the app, counting the body bytes it receives against MAX_REQUEST_SIZE."""
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > settings.MAX_REQUEST_SIZE:
+                    raise RequestTooLargeError({
+                        "error": "Request too large",
+                        "max_size": settings.MAX_REQUEST_SIZE
+                    })
+            return message
+
+        async def tracking_send(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except RequestTooLargeError as e:
+            if response_started:
+                raise
+            app_logger.warning(f"Streamed request body exceeded {settings.MAX_REQUEST_SIZE} bytes")
+            await JSONResponse({"detail": e.detail}, status_code=e.status_code)(scope, receive, send)
+
+
+# Characters removed from questions outside of tags
+_REMOVED_CHARACTERS = str.maketrans("", "", "<>{}()[]\\/")
+
 
 def sanitize_input(text: str) -> str:
     """
     Sanitize input text to prevent potential security issues.
-    
+
+    Removes ``<...>`` tags (and with them any ``<script>`` element markup)
+    and the characters ``<>{}()[]\\/``, in a single left-to-right pass that
+    is linear in the length of the input.
+
     Args:
         text (str): Input text to sanitize
-        
+
     Returns:
         str: Sanitized text
     """
     if not text:
         return ""
-        
-    text = re.sub(r'<[^>]+>', '', text)
-    
-    text = re.sub(r'<script\b[^<]*(?:(?!<\/script>)<[^<]*)*<\/script>', '', text)
-    
-    text = re.sub(r'[<>{}()\[\]\\/]', '', text)
-    
-    text = text.strip()
-    
+
+    start_time = time.perf_counter()
+    parts = []
+    position = 0
+    tag_start = text.find("<")
+    while tag_start != -1:
+        # A tag needs at least one character between the brackets
+        if text.startswith(">", tag_start + 1):
+            tag_start = text.find("<", tag_start + 1)
+            continue
+        tag_end = text.find(">", tag_start + 2)
+        if tag_end == -1:
+            break
+        parts.append(text[position:tag_start].translate(_REMOVED_CHARACTERS))
+        position = tag_end + 1
+        tag_start = text.find("<", position)
+    parts.append(text[position:].translate(_REMOVED_CHARACTERS))
+    text = "".join(parts).strip()
+
     if len(text) > settings.MAX_QUESTION_LENGTH:
         text = text[:settings.MAX_QUESTION_LENGTH]
         app_logger.warning(f"Input text truncated to {settings.MAX_QUESTION_LENGTH} characters")
-    
-    return text 
\ No newline at end of file
+
+    STAGE_SECONDS.observe(time.perf_counter() - start_time, "sanitize")
+    return text
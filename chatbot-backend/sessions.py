@@ -0,0 +1,218 @@
+import asyncio
+import secrets
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from context_builder import TokenCounter
+from logger import app_logger
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+# Random bytes of a session ID; the ID is the only credential for the session
+SESSION_ID_BYTES = 24
+
+
+@dataclass(eq=False)
+class Turn:
+    """One question of a conversation, its answer and their size in tokens."""
+    question: str
+    answer: str
+    tokens: int
+
+
+@dataclass(eq=False)
+class Session:
+    """
+    History of one conversation.
+
+    Attributes:
+        session_id: Server-issued, unguessable identifier of the conversation
+        summary: Rolling summary of the turns older than ``turns``
+        turns: Most recent turns, kept verbatim
+        folding: Turns moved out of ``turns`` that are not in the summary yet
+        last_used: When the session was last read, from the store's clock
+        pending: Created but not kept by the store until its first turn is recorded
+    """
+    session_id: str
+    summary: str = ""
+    turns: Deque[Turn] = field(default_factory=deque)
+    folding: List[Turn] = field(default_factory=list)
+    last_used: float = 0.0
+    pending: bool = False
+    summarizing: Optional[asyncio.Task] = None
+
+    @property
+    def log_id(self) -> str:
+        """A prefix of the ID to name the session in logs without disclosing it."""
+        return self.session_id[:6]
+
+    def history_tokens(self) -> int:
+        return sum(turn.tokens for turn in self.turns)
+
+    def messages(self) -> List[BaseMessage]:
+        """The history as chat messages: the summary, then the turns not summarized yet."""
+        messages = []
+        if self.summary:
+            messages.append(SystemMessage(content=SUMMARY_PREFIX + self.summary))
+        for turn in [*self.folding, *self.turns]:
+            messages.append(HumanMessage(content=turn.question))
+            messages.append(AIMessage(content=turn.answer))
+        return messages
+
+
+class SessionStore:
+    """
+    Server-side conversation histories with bounded size.
+
+    A session keeps its last ``recent_turns`` turns verbatim, as long as
+    they fit in ``history_tokens``; older turns are folded into a rolling
+    summary of at most ``summary_tokens`` by ``summarize(summary, turns)``,
+    which only sees the previous summary and the turns being folded, so a
+    long conversation costs no more to summarize than a short one. Folding
+    runs in the background, after the answer was sent; until it is done the
+    folded turns are still sent verbatim. If summarizing fails, they are
+    retried with the next fold, and the oldest are dropped once they exceed
+    ``history_tokens``. A session thus holds at most about
+    ``2 * history_tokens + summary_tokens`` tokens.
+
+    Sessions are started with ``create``, which issues a random ID; ``get``
+    only returns sessions that exist, so a client cannot open a session
+    under an ID of its choosing. A session created ``pending`` is only kept
+    once its first turn is recorded, so a question that could not be
+    answered leaves no session behind. Sessions idle for ``idle_seconds`` are
+    dropped, and the least recently used ones once there are more than
+    ``max_sessions``.
+    """
+
+    def __init__(
+        self,
+        summarize: Callable[[str, List[Turn]], Awaitable[str]],
+        token_counter: Optional[TokenCounter] = None,
+        max_sessions: int = 10000,
+        idle_seconds: float = 1800.0,
+        recent_turns: int = 4,
+        history_tokens: int = 800,
+        summary_tokens: int = 250,
+        time_func: Callable[[], float] = time.monotonic,
+    ):
+        self.summarize = summarize
+        self.token_counter = token_counter or TokenCounter()
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.recent_turns = recent_turns
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.time_func = time_func
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+        self.summaries = 0
+        self.summary_failures = 0
+        self.dropped_turns = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def create(self, pending: bool = False) -> Session:
+        """Start a session under a new random ID, kept by the store now or, if ``pending``, on its first turn."""
+        now = self.time_func()
+        session = Session(session_id=secrets.token_urlsafe(SESSION_ID_BYTES), last_used=now, pending=pending)
+        if not pending:
+            self._add(session, now)
+        return session
+
+    def _add(self, session: Session, now: float) -> None:
+        self._sessions[session.session_id] = session
+        self._evict(now)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """Return the session, or None for an unknown or expired ID."""
+        now = self.time_func()
+        self._evict(now)
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+            session.last_used = now
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def _evict(self, now: float) -> None:
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - session.last_used < self.idle_seconds:
+                return
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def record(self, session: Session, question: str, answer: str) -> None:
+        """
+        Add a turn to a session, folding the oldest turns into the summary
+        in the background once the session exceeds its budget.
+
+        Must be called from the event loop.
+        """
+        if session.pending:
+            session.pending = False
+            session.last_used = self.time_func()
+            self._add(session, session.last_used)
+        question_tokens = self.token_counter.count(question)
+        answer = self.token_counter.truncate(answer, self.history_tokens - question_tokens)
+        tokens = question_tokens + self.token_counter.count(answer)
+        session.turns.append(Turn(question=question, answer=answer, tokens=tokens))
+        while session.turns and (
+            len(session.turns) > self.recent_turns or session.history_tokens() > self.history_tokens
+        ):
+            session.folding.append(session.turns.popleft())
+        self._limit_folding(session)
+        if session.folding and session.summarizing is None:
+            session.summarizing = asyncio.create_task(self._asummarize(session))
+
+    def _limit_folding(self, session: Session) -> None:
+        while session.folding and sum(turn.tokens for turn in session.folding) > self.history_tokens:
+            session.folding.pop(0)
+            self.dropped_turns += 1
+
+    async def _asummarize(self, session: Session) -> None:
+        try:
+            while session.folding:
+                turns = list(session.folding)
+                start_time = time.perf_counter()
+                try:
+                    summary = await self.summarize(session.summary, turns)
+                except Exception as e:
+                    self.summary_failures += 1
+                    app_logger.warning(f"Could not summarize session {session.log_id}: {str(e)}")
+                    return
+                session.summary = self.token_counter.truncate(summary.strip(), self.summary_tokens)
+                # Turns may have been dropped from folding meanwhile
+                session.folding = [turn for turn in session.folding if turn not in turns]
+                self.summaries += 1
+                app_logger.info(
+                    f"Summarized {len(turns)} turns of session {session.log_id} "
+                    f"in {(time.perf_counter() - start_time) * 1000:.0f} ms"
+                )
+        finally:
+            session.summarizing = None
+
+    async def asettle(self, session: Session) -> None:
+        """Wait until the session's folded turns are summarized (or summarizing failed)."""
+        while session.summarizing is not None:
+            await asyncio.shield(session.summarizing)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures,
+            "dropped_turns": self.dropped_turns,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,56 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the computation as a task; callers
+    arriving while it runs await the same task. Every waiter is shielded, so
+    a cancelled (e.g. disconnected) caller never cancels the shared task for
+    the others. A failure is raised to every waiter and the key is released,
+    so the next call starts a fresh execution.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run ``func`` for ``key``, or join the execution already in flight.
+
+        Args:
+            key: Identity of the computation, e.g. the normalized question
+            func: Zero-argument coroutine function doing the work
+
+        Returns:
+            The result of the shared execution
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+        }
+
+    def _release(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when every waiter has gone away
+            task.exception()
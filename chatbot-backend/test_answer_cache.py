@@ -0,0 +1,194 @@
+import asyncio
+import threading
+
+import httpx
+
+import generator
+import main
+from answer_cache import AnswerCache, normalize_question
+from conftest import StreamingFakeChatModel, parse_sse_events
+from relevance import GATED_ANSWER, RelevanceGate
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class KeywordEmbeddings:
+    """Embeds a question as a bag of the keywords it contains."""
+
+    keywords = ["visiting", "hours", "cardiology", "specialists", "payment"]
+
+    def __init__(self):
+        self.calls = 0
+
+    async def aembed_query(self, text):
+        self.calls += 1
+        words = normalize_question(text).split()
+        return [float(keyword in words) for keyword in self.keywords]
+
+
+def test_normalize_question():
+    assert normalize_question("  What are the Visiting   hours?? ") == "what are the visiting hours"
+
+
+def test_exact_hit_after_normalization():
+    cache = AnswerCache()
+    cache.store("What are the visiting hours?", "8 AM to 8 PM")
+
+    answer, _ = asyncio.run(cache.alookup("what are the VISITING hours"))
+
+    assert answer == "8 AM to 8 PM"
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_semantic_hit_above_threshold():
+    embeddings = KeywordEmbeddings()
+    cache = AnswerCache(embeddings=embeddings, similarity_threshold=0.9)
+
+    answer, embedding = asyncio.run(cache.alookup("visiting hours please"))
+    assert answer is None
+    cache.store("visiting hours please", "8 AM to 8 PM", embedding)
+
+    answer, _ = asyncio.run(cache.alookup("When are visiting hours?"))
+    assert answer == "8 AM to 8 PM"
+
+    answer, _ = asyncio.run(cache.alookup("Who are the cardiology specialists?"))
+    assert answer is None
+
+    stats = cache.stats()
+    assert (stats["semantic_hits"], stats["misses"]) == (1, 2)
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = AnswerCache(ttl_seconds=10, time_func=clock)
+    cache.store("visiting hours", "8 AM to 8 PM")
+
+    clock.now = 11
+    answer, _ = asyncio.run(cache.alookup("visiting hours"))
+
+    assert answer is None
+    assert len(cache) == 0
+
+
+def test_lru_eviction():
+    cache = AnswerCache(max_size=2)
+    cache.store("a", "1")
+    cache.store("b", "2")
+    asyncio.run(cache.alookup("a"))
+    cache.store("c", "3")
+
+    assert asyncio.run(cache.alookup("a"))[0] == "1"
+    assert asyncio.run(cache.alookup("b"))[0] is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidated_when_version_changes():
+    clock = FakeClock()
+    version = {"value": 1}
+    cache = AnswerCache(version_func=lambda: version["value"], version_check_interval=5, time_func=clock)
+    cache.store("visiting hours", "8 AM to 8 PM")
+
+    version["value"] = 2
+    assert asyncio.run(cache.alookup("visiting hours"))[0] == "8 AM to 8 PM"
+
+    clock.now = 6
+    assert asyncio.run(cache.alookup("visiting hours"))[0] is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_version_is_read_off_the_event_loop():
+    clock = FakeClock()
+    threads = []
+
+    def version():
+        threads.append(threading.get_ident())
+        return 1
+
+    cache = AnswerCache(version_func=version, version_check_interval=5, time_func=clock)
+    clock.now = 6
+    asyncio.run(cache.alookup("visiting hours"))
+
+    assert len(threads) == 2
+    assert threads[0] == threading.get_ident()  # at construction, outside any request
+    assert threads[1] != threading.get_ident()
+
+
+def test_pinned_entries_outlive_ttl_and_eviction_until_invalidated():
+    clock = FakeClock()
+    embeddings = KeywordEmbeddings()
+    cache = AnswerCache(embeddings=embeddings, max_size=1, ttl_seconds=10, similarity_threshold=0.9, time_func=clock)
+    cache.pin([("What are the visiting hours?", "8 AM to 8 PM", [1.0, 1.0, 0.0, 0.0, 0.0])])
+    cache.store("Payment?", "Cash or card")
+    cache.store("Cardiology?", "Dr. Doe")
+    clock.now = 100
+
+    exact, _ = asyncio.run(cache.alookup("visiting hours?", semantic=False))
+    assert exact is None
+    exact, _ = asyncio.run(cache.alookup("what are the visiting hours"))
+    similar, _ = asyncio.run(cache.alookup("When are visiting hours?"))
+
+    assert exact == similar == "8 AM to 8 PM"
+    assert embeddings.calls == 1
+    assert cache.stats()["pinned_hits"] == 2
+
+    cache.invalidate()
+    answer, _ = asyncio.run(cache.alookup("what are the visiting hours"))
+    assert answer is None
+    assert cache.stats()["pinned"] == 0
+
+
+def test_stream_endpoint_fills_and_serves_an_empty_cache(pipeline, build_stub_chain, monkeypatch):
+    # An empty cache has len() 0, so it must not be taken for a missing one
+    cache = AnswerCache()
+    monkeypatch.setattr(generator, "review_chain", build_stub_chain(StreamingFakeChatModel(token_delay=0)))
+    monkeypatch.setattr(generator, "answer_cache", cache)
+    main.limiter.reset()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            first = await client.post("/generate/stream", json={"question": "Visiting hours?"})
+            second = await client.post("/generate/stream", json={"question": "visiting hours"})
+            return first, second
+
+    first, second = asyncio.run(run())
+
+    def tokens(response):
+        return [data["token"] for event, data in parse_sse_events(response.text) if event == "token"]
+
+    assert tokens(first) == ["stub ", "streamed ", "answer"]
+    # Replayed from the cache as a single chunk
+    assert tokens(second) == ["stub streamed answer"]
+    assert (cache.stats()["exact_hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_gated_answers_are_not_cached(pipeline, build_stub_chain, monkeypatch):
+    cache = AnswerCache()
+    model = StreamingFakeChatModel(token_delay=0)
+    monkeypatch.setattr(generator, "review_chain", build_stub_chain(model))
+    monkeypatch.setattr(generator, "answer_cache", cache)
+    # Nothing in the stub corpus is this close to any question
+    monkeypatch.setattr(generator, "relevance_gate", RelevanceGate(min_score=0.999))
+    main.limiter.reset()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            plain = await client.post("/generate/", json={"question": "Can I bring my dog?"})
+            streamed = await client.post("/generate/stream", json={"question": "Can I bring my dog?"})
+            batch = await client.post("/generate/batch", json={"questions": ["Can I bring my dog?"]})
+            return plain, streamed, batch
+
+    plain, streamed, batch = asyncio.run(run())
+
+    assert plain.json() == {"response": GATED_ANSWER}
+    assert "".join(data["token"] for event, data in parse_sse_events(streamed.text) if event == "token") == GATED_ANSWER
+    assert batch.json()["results"] == [{"index": 0, "response": GATED_ANSWER, "error": None}]
+    assert len(cache) == 0
+    assert cache.stats()["misses"] == 3
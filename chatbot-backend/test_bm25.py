@@ -0,0 +1,82 @@
+import asyncio
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from bm25 import BM25Index, reciprocal_rank_fusion
+from retrievers import HybridRetriever
+
+CHUNKS = [
+    "Visiting hours are from 8 AM to 8 PM daily for all wards.",
+    "Dr. John Doe and Dr. Jane Smith are our cardiology specialists.",
+    "We accept cash, credit cards and insurance payments.",
+    "The pediatrics ward offers play areas for young patients.",
+]
+
+
+def make_index():
+    return BM25Index(
+        [f"chunk-{i}" for i in range(len(CHUNKS))],
+        CHUNKS,
+        [{"page": i} for i in range(len(CHUNKS))],
+    )
+
+
+class CountingVectorRetriever(BaseRetriever):
+    calls: int = 0
+
+    def _get_relevant_documents(self, query, *, run_manager, **kwargs):
+        self.calls += 1
+        return [Document(id="chunk-3", page_content=CHUNKS[3], metadata={"page": 3})]
+
+    async def _aget_relevant_documents(self, query, *, run_manager, **kwargs):
+        return self._get_relevant_documents(query, run_manager=run_manager, **kwargs)
+
+
+def test_search_ranks_matching_chunk_first_with_confidence():
+    result = make_index().search("Who are the cardiology specialists?", k=3)
+
+    assert result.documents[0].id == "chunk-1"
+    assert result.documents[0].metadata == {"page": 1}
+    assert result.coverage == 1.0
+    assert result.margin > 1
+
+
+def test_unknown_terms_lower_coverage():
+    result = make_index().search("cardiology parking garage")
+
+    assert result.documents[0].id == "chunk-1"
+    assert result.coverage < 0.5
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "bm25_index.json")
+    make_index().save(path)
+
+    loaded = BM25Index.load(path)
+
+    assert loaded.search("insurance payments").documents[0].id == "chunk-2"
+    assert BM25Index.load(str(tmp_path / "missing.json")) is None
+
+
+def test_reciprocal_rank_fusion_prefers_documents_ranked_by_both():
+    a, b, c = (Document(id=name, page_content=name) for name in "abc")
+
+    fused = reciprocal_rank_fusion([[a, b], [c, b]], k=3)
+
+    assert [doc.id for doc in fused] == ["b", "a", "c"]
+
+
+def test_hybrid_retriever_skips_vector_search_when_lexical_is_confident():
+    vector = CountingVectorRetriever()
+    retriever = HybridRetriever(vector_retriever=vector, lexical_index=make_index(), k=2)
+
+    confident = asyncio.run(retriever.ainvoke("cardiology specialists"))
+    fused = asyncio.run(retriever.ainvoke("cardiology parking garage"))
+
+    assert confident[0].id == "chunk-1"
+    assert {doc.id for doc in fused} == {"chunk-1", "chunk-3"}
+    assert vector.calls == 1
+    stats = retriever.stats.as_dict()
+    assert (stats["fast_path"], stats["fused"], stats["fast_path_rate"]) == (1, 1, 0.5)
+    assert stats["estimated_saved_ms"] > 0
@@ -0,0 +1,72 @@
+from langchain_core.documents import Document
+
+from context_builder import ContextBuilder, TokenCounter, EMPTY_CONTEXT
+
+# An unknown encoding makes the counter use its offline estimate, so the tests need no tiktoken download
+COUNTER = TokenCounter("offline-estimate")
+
+PAGE_TEXT = (
+    "Visiting hours on the cardiology ward are from 10am to 8pm every day. "
+    "Children under twelve must be accompanied by an adult at all times. "
+    "Flowers are not allowed in the intensive care unit for hygiene reasons."
+)
+
+
+def chunk(source, page, index, text):
+    return Document(id=f"{source}:{page}:{index}", page_content=text, metadata={"page": page, "source": source})
+
+
+def test_overlapping_chunks_of_a_page_are_merged():
+    first, second = PAGE_TEXT[:90], PAGE_TEXT[60:]
+    docs = [chunk("doc.pdf", 2, 1, second), chunk("other.pdf", 0, 0, "Parking costs 2 pounds per hour."), chunk("doc.pdf", 2, 0, first)]
+
+    context = ContextBuilder(token_counter=COUNTER).build(docs)
+
+    assert context.merged == 1
+    assert [doc.page_content for doc in context.passages] == [PAGE_TEXT, "Parking costs 2 pounds per hour."]
+    assert context.tokens < context.input_tokens
+
+
+def test_near_duplicates_are_dropped():
+    docs = [
+        chunk("a.pdf", 0, 0, PAGE_TEXT),
+        chunk("b.pdf", 3, 0, PAGE_TEXT + " Thank you."),
+        chunk("c.pdf", 1, 0, "The cafeteria opens at 7am."),
+    ]
+
+    context = ContextBuilder(dedupe_threshold=0.8, token_counter=COUNTER).build(docs)
+
+    assert context.duplicates == 1
+    assert [doc.metadata["source"] for doc in context.passages] == ["a.pdf", "c.pdf"]
+
+
+def test_mmr_moves_redundant_passages_down():
+    similar = "Visiting hours on the cardiology ward are from 10am to 8pm, children must be accompanied."
+    docs = [
+        chunk("a.pdf", 0, 0, PAGE_TEXT),
+        chunk("b.pdf", 0, 0, similar),
+        chunk("c.pdf", 0, 0, "The cafeteria opens at 7am."),
+    ]
+
+    context = ContextBuilder(mmr_lambda=0.3, token_counter=COUNTER).build(docs)
+
+    assert [doc.metadata["source"] for doc in context.passages] == ["a.pdf", "c.pdf", "b.pdf"]
+
+
+def test_token_budget():
+    docs = [chunk("a.pdf", i, 0, f"Passage {i}. " + "word " * 40) for i in range(5)]
+    builder = ContextBuilder(max_tokens=120, token_counter=COUNTER)
+
+    context = builder.build(docs)
+
+    assert context.tokens <= 120
+    assert len(context.passages) == 2
+    assert context.dropped == 3
+
+    long_context = builder.build([chunk("a.pdf", 0, 0, "x" * 2000)])
+    assert long_context.truncated
+    assert long_context.tokens == 120
+
+
+def test_empty_retrieval():
+    assert ContextBuilder(token_counter=COUNTER).format([]) == EMPTY_CONTEXT
@@ -0,0 +1,161 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from chromadb.api.shared_system_client import SharedSystemClient
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import generator
+import main
+from conftest import SlowFakeChatModel
+from corpus_pool import Corpus, CorpusPool, UnknownCorpusError
+
+
+class FakeCorpora:
+    def __init__(self, delay=0.0, footprint_bytes=100):
+        self.delay = delay
+        self.footprint_bytes = footprint_bytes
+        self.opened = []
+        self.closed = []
+
+    def open(self, name, path):
+        time.sleep(self.delay)
+        self.opened.append(name)
+        return Corpus(
+            name=name,
+            chain=None,
+            retriever=None,
+            footprint_bytes=self.footprint_bytes,
+            close=lambda: self.closed.append(name),
+        )
+
+
+@pytest.fixture
+def corpora_root(tmp_path):
+    for name in ("a", "b", "c"):
+        (tmp_path / name).mkdir()
+    return str(tmp_path)
+
+
+def test_pool_opens_lazily_and_evicts_least_recently_used(corpora_root):
+    corpora = FakeCorpora()
+    pool = CorpusPool(corpora_root, corpora.open, max_open=2)
+
+    async def run():
+        for name in ("a", "b", "a", "c"):
+            async with pool.acquire(name):
+                pass
+
+    asyncio.run(run())
+
+    assert corpora.opened == ["a", "b", "c"]
+    assert corpora.closed == ["b"]
+    assert "a" in pool and "c" in pool
+    assert pool.stats()["hits"] == 1
+    assert pool.stats()["evictions"] == 1
+
+
+def test_pool_evicts_by_footprint(corpora_root):
+    corpora = FakeCorpora(footprint_bytes=100)
+    pool = CorpusPool(corpora_root, corpora.open, max_open=10, max_bytes=250)
+
+    async def run():
+        for name in ("a", "b", "c"):
+            await pool.aget(name)
+
+    asyncio.run(run())
+
+    assert len(pool) == 2
+    assert pool.footprint_bytes() == 200
+    assert corpora.closed == ["a"]
+
+
+def test_evicted_corpus_is_closed_only_after_its_last_request(corpora_root):
+    corpora = FakeCorpora()
+    pool = CorpusPool(corpora_root, corpora.open, max_open=1)
+
+    async def run():
+        async with pool.acquire("a") as in_use:
+            await pool.aget("b")
+            assert corpora.closed == []
+            assert await pool.aget("a") is in_use
+            await pool.aget("c")
+        return pool.stats()
+
+    stats = asyncio.run(run())
+
+    assert corpora.opened == ["a", "b", "c"]
+    assert corpora.closed == ["b", "a"]
+    assert stats["retiring"] == 0
+
+
+def test_opening_a_corpus_does_not_block_open_ones(corpora_root):
+    corpora = FakeCorpora(delay=0.3)
+    pool = CorpusPool(corpora_root, corpora.open)
+
+    async def run():
+        await pool.aget("a")
+        opening = [asyncio.create_task(pool.aget("b")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        await pool.aget("a")
+        elapsed = time.perf_counter() - start
+        await asyncio.gather(*opening)
+        return elapsed
+
+    elapsed = asyncio.run(run())
+
+    assert elapsed < 0.05
+    assert corpora.opened == ["a", "b"]
+
+
+def test_unknown_and_malformed_corpus_names_are_rejected(corpora_root):
+    pool = CorpusPool(corpora_root, FakeCorpora().open)
+
+    for name in ("missing", "../a", ""):
+        with pytest.raises(UnknownCorpusError):
+            asyncio.run(pool.aget(name))
+
+
+def test_open_corpus_builds_a_chain_and_releases_chroma(tmp_path, monkeypatch):
+    embeddings = DeterministicFakeEmbedding(size=32)
+    path = str(tmp_path / "site-a")
+    Chroma(persist_directory=path, embedding_function=embeddings).add_texts(["Site A opens at 7 AM."])
+    monkeypatch.setattr(generator, "query_embeddings", embeddings)
+    monkeypatch.setattr(generator, "chat_model", SlowFakeChatModel(delay=0))
+
+    corpus = generator.open_corpus("site-a", path)
+    answer = asyncio.run(corpus.chain.ainvoke("When does site A open?"))
+    corpus.close()
+
+    assert answer == "stub answer"
+    assert corpus.footprint_bytes > 0
+    assert path not in SharedSystemClient._identifier_to_system
+
+
+def test_generate_routes_to_the_requested_corpus(pipeline, corpora_root, build_stub_chain, monkeypatch):
+    # Built here: Chroma's in-memory database does not outlive the pool's worker thread
+    chain = build_stub_chain(SlowFakeChatModel(delay=0))
+
+    def open_stub_corpus(name, path):
+        return Corpus(name=name, chain=chain, retriever=None)
+
+    monkeypatch.setattr(generator, "corpus_pool", CorpusPool(corpora_root, open_stub_corpus))
+    main.limiter.reset()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            found = await client.post("/generate/", json={"question": "Visiting hours?", "corpus": "b"})
+            missing = await client.post("/generate/", json={"question": "Visiting hours?", "corpus": "zzz"})
+            streamed = await client.post("/generate/stream", json={"question": "Visiting hours?", "corpus": "zzz"})
+            return found, missing, streamed
+
+    found, missing, streamed = asyncio.run(run())
+
+    assert found.json() == {"response": "stub answer"}
+    assert missing.status_code == 404
+    assert streamed.status_code == 404
+    assert "b" in generator.corpus_pool
@@ -0,0 +1,72 @@
+import asyncio
+
+from embedding_batcher import BatchingEmbeddings
+
+class RecordingEmbeddings:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    async def aembed_documents(self, texts):
+        self.calls.append(list(texts))
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("upstream error")
+        return [[float(len(text))] for text in texts]
+
+def test_concurrent_queries_share_one_call():
+    underlying = RecordingEmbeddings()
+    batcher = BatchingEmbeddings(underlying, max_wait_ms=20, max_batch_size=64)
+
+    async def run():
+        return await asyncio.gather(*(batcher.aembed_query("q" * n) for n in range(1, 9)))
+
+    vectors = asyncio.run(run())
+
+    assert vectors == [[float(n)] for n in range(1, 9)]
+    assert len(underlying.calls) == 1
+    assert batcher.stats()["mean_batch_size"] == 8
+
+def test_batches_are_capped_and_duplicates_embedded_once():
+    underlying = RecordingEmbeddings()
+    batcher = BatchingEmbeddings(underlying, max_wait_ms=20, max_batch_size=3)
+
+    async def run():
+        return await asyncio.gather(*(batcher.aembed_query(text) for text in ["a", "a", "b", "c", "d"]))
+
+    asyncio.run(run())
+
+    assert underlying.calls == [["a", "b"], ["c", "d"]]
+    assert batcher.stats()["batch_sizes"] == {2: 1, 3: 1}
+
+def test_errors_reach_every_waiting_caller():
+    batcher = BatchingEmbeddings(RecordingEmbeddings(fail=True), max_wait_ms=5)
+
+    async def run():
+        return await asyncio.gather(batcher.aembed_query("a"), batcher.aembed_query("b"), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+def test_works_across_event_loops():
+    batcher = BatchingEmbeddings(RecordingEmbeddings(), max_wait_ms=1)
+
+    assert asyncio.run(batcher.aembed_query("ab")) == [2.0]
+    assert asyncio.run(batcher.aembed_query("abc")) == [3.0]
+
+def test_prefetched_queries_are_embedded_in_one_call_and_released():
+    underlying = RecordingEmbeddings()
+    batcher = BatchingEmbeddings(underlying, max_wait_ms=1)
+
+    async def run():
+        async with batcher.prefetched(["a", "bb", "a"]):
+            vectors = await asyncio.gather(batcher.aembed_query("bb"), batcher.aembed_query("a"))
+        return vectors, await batcher.aembed_query("a")
+
+    vectors, after = asyncio.run(run())
+
+    assert vectors == [[2.0], [1.0]]
+    assert after == [1.0]
+    assert underlying.calls == [["a", "bb"], ["a"]]
+    assert batcher.stats()["prefetch_hits"] == 2
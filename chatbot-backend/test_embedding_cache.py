@@ -0,0 +1,132 @@
+import asyncio
+import sqlite3
+import time
+
+import embedding_cache
+from embedding_cache import CachedEmbeddings, SQLiteEmbeddingStore, embedding_key
+
+
+class CountingEmbeddings:
+    """Embedding stand-in that records every call it receives."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+
+def make_cached(tmp_path, max_entries=100, batch_size=512):
+    underlying = CountingEmbeddings()
+    store = SQLiteEmbeddingStore(tmp_path / "embeddings.sqlite3", max_entries=max_entries)
+    return CachedEmbeddings(underlying, store, model="test-model", batch_size=batch_size), underlying
+
+
+def test_key_depends_on_model_and_text():
+    assert embedding_key("a", "text") != embedding_key("b", "text")
+    assert embedding_key("a", "text") == embedding_key("a", "text")
+
+
+def test_misses_are_embedded_in_one_batch_and_reused(tmp_path):
+    cached, underlying = make_cached(tmp_path)
+
+    first = cached.embed_documents(["alpha", "beta", "alpha"])
+    second = cached.embed_documents(["beta", "alpha", "gamma"])
+
+    assert underlying.calls == [["alpha", "beta"], ["gamma"]]
+    assert first == [[5.0, 1.0], [4.0, 1.0], [5.0, 1.0]]
+    assert second[:2] == [[4.0, 1.0], [5.0, 1.0]]
+
+
+def test_misses_respect_batch_size(tmp_path):
+    cached, underlying = make_cached(tmp_path, batch_size=2)
+
+    cached.embed_documents(["a", "b", "c", "d", "e"])
+
+    assert [len(call) for call in underlying.calls] == [2, 2, 1]
+
+
+def test_reingest_after_restart_makes_no_calls(tmp_path):
+    cached, _ = make_cached(tmp_path)
+    cached.embed_documents(["chunk one", "chunk two"])
+    cached.store.close()
+
+    reopened, underlying = make_cached(tmp_path)
+    reopened.embed_documents(["chunk one", "chunk two"])
+    reopened.embed_query("chunk one")
+
+    assert underlying.calls == []
+    assert reopened.stats()["hits"] == 3
+
+
+def test_async_query_path_uses_cache(tmp_path):
+    cached, underlying = make_cached(tmp_path)
+
+    asyncio.run(cached.aembed_query("visiting hours"))
+    asyncio.run(cached.aembed_documents(["visiting hours"]))
+
+    assert underlying.calls == [["visiting hours"]]
+
+
+def test_size_cap_evicts_least_recently_used(tmp_path):
+    cached, underlying = make_cached(tmp_path, max_entries=2)
+    cached.embed_documents(["a"])
+    cached.embed_documents(["b"])
+    cached.embed_documents(["a"])
+    cached.embed_documents(["c"])
+
+    assert len(cached.store) == 2
+    cached.embed_documents(["a", "c"])
+    cached.embed_documents(["b"])
+    assert underlying.calls == [["a"], ["b"], ["c"], ["b"]]
+
+
+def last_access(path, key):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT last_access FROM embeddings WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_access_times_are_written_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "ACCESS_FLUSH_KEYS", 2)
+    path = tmp_path / "embeddings.sqlite3"
+    store = SQLiteEmbeddingStore(path)
+    store.put_many({"a": [1.0], "b": [2.0]})
+    stored = last_access(path, "a")
+
+    assert store.get_many(["a"]) == {"a": [1.0]}
+    assert last_access(path, "a") == stored
+
+    store.get_many(["b"])
+    assert last_access(path, "a") > stored
+    assert last_access(path, "b") > stored
+
+
+def test_reads_do_not_wait_for_a_held_write_lock(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "ACCESS_FLUSH_KEYS", 1)
+    path = tmp_path / "embeddings.sqlite3"
+    store = SQLiteEmbeddingStore(path)
+    store.put_many({"a": [1.0]})
+    stored = last_access(path, "a")
+
+    writer = sqlite3.connect(path)
+    writer.execute("BEGIN IMMEDIATE")
+    start = time.perf_counter()
+    assert store.get_many(["a"]) == {"a": [1.0]}
+    assert time.perf_counter() - start < 1
+    writer.rollback()
+    writer.close()
+
+    # The access time stayed buffered and goes out with the next write
+    assert last_access(path, "a") == stored
+    store.put_many({"b": [2.0]})
+    assert last_access(path, "a") > stored
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+import numpy as np
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from fake_openai import FakeOpenAIServer
+
+
+def test_openai_clients_talk_to_the_stand_in():
+    with FakeOpenAIServer(chat_latency_ms=50, embedding_latency_ms=10, answer="stub answer") as server:
+        model = ChatOpenAI(model="gpt-3.5-turbo-0125", base_url=server.base_url, api_key="sk-test", max_retries=0)
+        embeddings = OpenAIEmbeddings(base_url=server.base_url, api_key="sk-test", check_embedding_ctx_length=False)
+
+        start = time.perf_counter()
+        answer = model.invoke("Visiting hours?").content
+        elapsed = time.perf_counter() - start
+        vectors = embeddings.embed_documents(["visiting hours", "cardiology", "visiting hours"])
+
+        assert answer == "stub answer"
+        assert elapsed >= 0.05
+        assert len(vectors) == 3 and len(vectors[0]) == server.dimensions
+        assert np.allclose(vectors[0], vectors[2])
+        assert np.allclose(vectors[0], server.embed("visiting hours"), atol=1e-6)
+        assert server.stats() == {
+            "chat_requests": 1,
+            "embedding_requests": 1,
+            "embedded_inputs": 3,
+            "slow_responses": 0,
+            "injected_errors": 0,
+        }
+
+
+def test_stand_in_serves_requests_concurrently_with_seeded_jitter():
+    with FakeOpenAIServer(chat_latency_ms=200, chat_jitter_ms=50, seed=1) as server:
+        model = ChatOpenAI(model="gpt-3.5-turbo-0125", base_url=server.base_url, api_key="sk-test", max_retries=0)
+
+        async def run():
+            # The first call pays for creating the client's connection pool
+            await model.ainvoke("Warm up")
+            start = time.perf_counter()
+            await asyncio.gather(*(model.ainvoke(f"Question {i}?") for i in range(8)))
+            return time.perf_counter() - start
+
+        assert asyncio.run(run()) < 2 * 0.25
+        assert server.stats()["chat_requests"] == 9
+
+
+
+def test_jitter_is_reproducible_for_a_seed():
+    delays = []
+    for _ in range(2):
+        with FakeOpenAIServer(seed=1) as server:
+            delays.append([server._delay(200, 50) for _ in range(5)])
+
+    assert delays[0] == delays[1]
+    assert all(0.15 <= delay <= 0.25 for delay in delays[0])
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+import main
+from faq import FAQIndex, FAQStore
+
+ENTRIES = [
+    ("What are the visiting hours at the hospital?", "8 AM to 8 PM"),
+    ("Who are the cardiology specialists at Harmony Health Center?", "Dr. John Doe and Dr. Jane Smith"),
+    ("What payment options are available at the hospital?", "Cash, cards and insurance"),
+]
+
+
+def test_normalized_exact_match():
+    match = FAQIndex(ENTRIES).match("  what are the VISITING hours at the hospital ")
+
+    assert (match.answer, match.confidence, match.match_type) == ("8 AM to 8 PM", 1.0, "exact")
+
+
+def test_fuzzy_match_tolerates_typos_and_rewording():
+    index = FAQIndex(ENTRIES)
+
+    reworded = index.match("hospital visiting hours")
+    typo = index.match("who are the cardiolgy specialsts")
+
+    assert reworded.answer == "8 AM to 8 PM" and reworded.match_type == "fuzzy"
+    assert typo.answer == "Dr. John Doe and Dr. Jane Smith"
+    assert 0 < typo.confidence < 1
+
+
+def test_unrelated_question_scores_below_threshold():
+    index = FAQIndex(ENTRIES)
+
+    assert index.match("Do you have parking for bicycles?", min_confidence=0.6) is None
+    assert index.match("the and of") is None
+
+
+def test_store_hot_reloads_changed_file(tmp_path):
+    path = tmp_path / "faq.json"
+    path.write_text(json.dumps([{"question": "Where is the hospital?", "answer": "Main street"}]))
+    store = FAQStore(str(path), reload_interval=0)
+
+    path.write_text(json.dumps([{"question": "Where is the hospital?", "answer": "Harbor road"}]))
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000_000))
+    store.match("Where is the hospital?")
+    deadline = time.monotonic() + 5
+    while store.match("Where is the hospital?").answer != "Harbor road" and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert store.match("Where is the hospital?").answer == "Harbor road"
+
+
+def test_chat_endpoint_returns_confidence():
+    main.limiter.reset()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            matched = await client.post("/chat/", json={"question": "what are the visiting hours?"})
+            fallback = await client.post("/chat/", json={"question": "Tell me a joke"})
+            return matched.json(), fallback.json()
+
+    matched, fallback = asyncio.run(run())
+
+    assert matched["response"] == "The hospital is open from 8 AM to 8 PM daily."
+    assert matched["confidence"] > 0.6
+    assert fallback == {"response": main.FALLBACK_CHAT_RESPONSE, "confidence": 0.0, "matched_question": None}
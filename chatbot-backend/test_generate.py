@@ -0,0 +1,159 @@
+import asyncio
+import time
+
+import httpx
+
+import generator
+from answer_cache import AnswerCache
+from conftest import LLM_DELAY, SlowFakeChatModel, StreamingFakeChatModel, parse_sse_events
+from singleflight import SingleFlight
+import main
+
+CONCURRENT_QUESTIONS = 5
+
+
+def test_chain_ainvoke_runs_concurrently(build_stub_chain):
+    chain = build_stub_chain()
+
+    async def run():
+        start = time.perf_counter()
+        answers = await asyncio.gather(
+            *(chain.ainvoke(f"Question {i}?") for i in range(CONCURRENT_QUESTIONS))
+        )
+        return answers, time.perf_counter() - start
+
+    answers, elapsed = asyncio.run(run())
+
+    assert answers == ["stub answer"] * CONCURRENT_QUESTIONS
+    assert elapsed < 2 * LLM_DELAY
+
+
+def test_generate_endpoint_does_not_block_event_loop(pipeline, build_stub_chain, monkeypatch):
+    monkeypatch.setattr(generator, "review_chain", build_stub_chain())
+    main.limiter.reset()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            start = time.perf_counter()
+            generate_calls = [
+                client.post("/generate/", json={"question": f"Question {i}?"})
+                for i in range(CONCURRENT_QUESTIONS)
+            ]
+            health_call = asyncio.create_task(client.get("/"))
+            responses = await asyncio.gather(*generate_calls)
+            health = await health_call
+            return responses, health, time.perf_counter() - start
+
+    responses, health, elapsed = asyncio.run(run())
+
+    assert all(r.status_code == 200 for r in responses)
+    assert all(r.json() == {"response": "stub answer"} for r in responses)
+    assert health.status_code == 200
+    assert elapsed < 2 * LLM_DELAY
+
+
+def test_generate_stream_emits_tokens_and_timing(pipeline, build_stub_chain, monkeypatch):
+    monkeypatch.setattr(generator, "review_chain", build_stub_chain(StreamingFakeChatModel()))
+    main.limiter.reset()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            return await client.post("/generate/stream", json={"question": "<b>Visiting hours?</b>"})
+
+    response = asyncio.run(run())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse_events(response.text)
+    tokens = [data["token"] for event, data in events if event == "token"]
+    assert "".join(tokens) == "stub streamed answer"
+    assert len(tokens) == 3
+    event, timing = events[-1]
+    assert event == "done"
+    assert 0 < timing["ttft_ms"] <= timing["total_ms"]
+
+
+def test_generate_serves_repeated_question_from_answer_cache(pipeline, build_stub_chain, monkeypatch):
+    monkeypatch.setattr(generator, "review_chain", build_stub_chain(SlowFakeChatModel(delay=0.2)))
+    monkeypatch.setattr(generator, "answer_cache", AnswerCache())
+    main.limiter.reset()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            await client.post("/generate/", json={"question": "What are the visiting hours?"})
+            start = time.perf_counter()
+            response = await client.post("/generate/", json={"question": "what are the visiting hours"})
+            return response, time.perf_counter() - start
+
+    response, elapsed = asyncio.run(run())
+
+    assert response.json() == {"response": "stub answer"}
+    assert elapsed < 0.1
+    assert generator.answer_cache.stats()["exact_hits"] == 1
+
+
+def test_identical_concurrent_questions_run_the_chain_once(pipeline, build_stub_chain, monkeypatch):
+    model = SlowFakeChatModel(delay=0.2)
+    monkeypatch.setattr(generator, "review_chain", build_stub_chain(model))
+    monkeypatch.setattr(generator, "in_flight_questions", SingleFlight())
+
+    async def run():
+        return await asyncio.gather(
+            generator.agenerate_answer("Visiting hours?"),
+            generator.agenerate_answer("visiting hours"),
+            generator.agenerate_answer("VISITING HOURS!"),
+        )
+
+    assert asyncio.run(run()) == ["stub answer"] * 3
+    assert model.calls == 1
+    assert generator.in_flight_questions.stats()["coalesced"] == 2
+
+
+def test_generate_batch_answers_each_question_once_with_bounded_concurrency(pipeline, build_stub_chain, monkeypatch):
+    model = SlowFakeChatModel(delay=0.2)
+    monkeypatch.setattr(generator, "review_chain", build_stub_chain(model))
+    monkeypatch.setattr(generator, "query_embeddings", None)
+    monkeypatch.setattr(main.settings, "BATCH_MAX_CONCURRENCY", 2)
+    main.limiter.reset()
+    questions = ["Visiting hours?", "Who is Dr. Doe?", "visiting hours", "<b></b>", "Parking?", "Insurance?"]
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            start = time.perf_counter()
+            response = await client.post("/generate/batch", json={"questions": questions})
+            return response, time.perf_counter() - start
+
+    response, elapsed = asyncio.run(run())
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [item["index"] for item in results] == list(range(len(questions)))
+    assert [item["response"] for item in results] == ["stub answer"] * 3 + [None] + ["stub answer"] * 2
+    assert results[3]["error"].startswith("Invalid input")
+    # Four distinct questions, two at a time
+    assert model.calls == 4
+    assert 2 * 0.2 <= elapsed < 3 * 0.2
+
+
+def test_generate_batch_streams_results_as_they_complete(pipeline, build_stub_chain, monkeypatch):
+    monkeypatch.setattr(generator, "review_chain", build_stub_chain(SlowFakeChatModel(delay=0.05)))
+    monkeypatch.setattr(generator, "query_embeddings", None)
+    main.limiter.reset()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            return await client.post("/generate/batch", json={"questions": ["Visiting hours?", "Parking?"], "stream": True})
+
+    response = asyncio.run(run())
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse_events(response.text)
+    assert sorted(data["index"] for event, data in events if event == "result") == [0, 1]
+    event, summary = events[-1]
+    assert event == "done"
+    assert summary["answered"] == 2 and summary["failed"] == 0
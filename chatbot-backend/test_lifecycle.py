@@ -0,0 +1,188 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+from langchain_core.runnables import RunnableLambda
+
+import generator
+import main
+from config import settings
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+async def get(path, **kwargs):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        return await client.request(kwargs.pop("method", "GET"), path, **kwargs)
+
+
+def test_importing_generator_builds_nothing():
+    result = subprocess.run(
+        [sys.executable, "-c", "import generator; print(generator.startup.status, generator.reviews_vector_db, generator.review_chain)"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+
+    assert result.stdout.splitlines()[-1] == "cold None None"
+
+
+def test_lifespan_reports_ready_after_initialization_and_warmup(cold_pipeline, monkeypatch):
+    main.limiter.reset()
+
+    async def run():
+        before = await get("/ready")
+        async with main.app.router.lifespan_context(main.app):
+            for _ in range(500):
+                dependencies = main.startup_dependencies.values()
+                if generator.startup.status == "ready" and all(d.state.status == "ready" for d in dependencies):
+                    break
+                await asyncio.sleep(0.01)
+            return before, await get("/ready"), await get("/")
+
+    before, ready, health = asyncio.run(run())
+
+    assert before.status_code == 503
+    assert before.json()["status"] == "cold"
+    assert ready.status_code == 200
+    body = ready.json()
+    assert body["status"] == "ready"
+    assert body["error"] is None
+    assert {"initialize_ms", "warmup_ms", "ready_ms"} <= set(body["timings_ms"])
+    assert body["dependencies"]["faq"] == {"status": "ready", "error": None}
+    assert health.status_code == 200
+
+
+def test_failed_initialization_is_not_ready_and_returns_503(cold_pipeline, monkeypatch):
+    def broken_chroma(**kwargs):
+        raise RuntimeError("corrupt index")
+
+    monkeypatch.setattr(generator, "Chroma", broken_chroma)
+    main.limiter.reset()
+
+    async def run():
+        await generator.astartup()
+        return await get("/ready"), await get("/generate/", method="POST", json={"question": "Visiting hours?"})
+
+    ready, generate = asyncio.run(run())
+
+    assert ready.status_code == 503
+    assert ready.json()["status"] == "failed"
+    assert ready.json()["error"] == "corrupt index"
+    assert generate.status_code == 503
+    assert generate.json() == {"detail": "The knowledge base is not available"}
+
+
+def test_failed_startup_is_retried_with_backoff(cold_pipeline, monkeypatch):
+    attempts = []
+    real_chroma = generator.Chroma
+
+    def broken_chroma(**kwargs):
+        attempts.append(kwargs)
+        raise RuntimeError("index is being restored")
+
+    monkeypatch.setattr(generator, "Chroma", broken_chroma)
+    monkeypatch.setattr(settings, "STARTUP_RETRY_SECONDS", 60.0)
+
+    async def require_pipeline():
+        try:
+            await main.require_pipeline()
+        except main.ServiceUnavailableError:
+            return 503
+        return 200
+
+    for dependency in main.startup_dependencies.values():
+        dependency.ensure()
+
+    async def run():
+        await generator.astartup()
+        statuses = [await require_pipeline()]
+        # The backoff has passed, but the index is still broken: the wait doubles
+        generator.startup.retry_at = 0.0
+        statuses.append(await require_pipeline())
+        backoff = generator.startup.retry_at - time.monotonic()
+        monkeypatch.setattr(generator, "Chroma", real_chroma)
+        statuses.append(await require_pipeline())
+        generator.startup.retry_at = 0.0
+        statuses.append(await require_pipeline())
+        return statuses, backoff, await get("/ready")
+
+    statuses, backoff, ready = asyncio.run(run())
+
+    assert statuses == [503, 503, 503, 200]
+    assert len(attempts) == 2
+    assert 60.0 < backoff <= 120.0
+    assert generator.startup.failures == 0
+    assert ready.status_code == 200
+
+
+def test_importing_main_reads_no_data_files(tmp_path):
+    env = {
+        **os.environ,
+        "FAQ_PATH": str(tmp_path / "missing.json"),
+        "RATE_LIMIT_STORAGE_URI": f"sqlite:///{tmp_path}/rate_limits.sqlite3",
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", "import main; print(main.faq_store)"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+
+    assert result.stdout.splitlines()[-1] == "None"
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failed_dependencies_are_reported_and_retried(tmp_path, monkeypatch):
+    path = tmp_path / "faq.json"
+    monkeypatch.setattr(settings, "FAQ_PATH", str(path))
+    monkeypatch.setattr(settings, "STARTUP_RETRY_SECONDS", 60.0)
+    faq = generator.StartupDependency("FAQ", main.load_faq_store)
+    monkeypatch.setitem(main.startup_dependencies, "faq", faq)
+    monkeypatch.setattr(main, "faq_store", None)
+    for dependency in main.startup_dependencies.values():
+        if dependency is not faq:
+            dependency.ensure()
+    main.limiter.reset()
+
+    async def run():
+        chat = await get("/chat/", method="POST", json={"question": "Where is it?"})
+        missing = await get("/ready"), chat
+        path.write_text('[{"question": "Where is the hospital?", "answer": "Main street"}]')
+        backing_off = await get("/chat/", method="POST", json={"question": "Where is the hospital?"})
+        faq.state.retry_at = 0.0
+        return missing, backing_off, await get("/chat/", method="POST", json={"question": "Where is the hospital?"})
+
+    (ready, chat), backing_off, loaded = asyncio.run(run())
+
+    assert ready.status_code == 503
+    assert ready.json()["dependencies"]["faq"]["status"] == "failed"
+    assert str(path) in ready.json()["dependencies"]["faq"]["error"]
+    assert ready.json()["dependencies"]["rate_limit_storage"] == {"status": "ready", "error": None}
+    assert chat.status_code == backing_off.status_code == 503
+    assert loaded.json()["response"] == "Main street"
+    assert faq.state.status == "ready" and faq.state.failures == 0
+
+
+def test_failed_warmup_still_becomes_ready(cold_pipeline, monkeypatch):
+    async def failing_retrieval(question):
+        raise ConnectionError("embedding API unreachable")
+
+    monkeypatch.setattr(settings, "WARMUP_QUERY", "What are the visiting hours?")
+    generator.initialize()
+    monkeypatch.setattr(generator, "reviews_retriever", RunnableLambda(lambda q: [], afunc=failing_retrieval))
+
+    asyncio.run(generator.warmup())
+
+    assert generator.startup.status == "ready"
+    assert "warmup_ms" in generator.startup.timings_ms
+
+
+def test_initialize_builds_the_answer_cache_against_the_new_store(cold_pipeline, monkeypatch):
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", True)
+
+    generator.initialize()
+
+    assert generator.startup.status == "initialized"
+    assert generator.answer_cache is not None
+    assert generator.answer_cache.stats()["size"] == 0
@@ -0,0 +1,112 @@
+import io
+import logging
+import os
+import queue
+from logging.handlers import QueueListener
+
+import pytest
+
+from logger import (
+    DeferredQueueHandler,
+    SensitiveDataFormatter,
+    TraceIdFilter,
+    app_logger,
+    current_trace_id,
+    log_listener,
+)
+
+
+@pytest.mark.parametrize("message", [
+    "api_key=abc123",
+    "headers: {'x-api-key': 'abc123'}",
+    "OPENAI_KEY: abc123",
+    "client secret = 'abc123'",
+    "token: abc123",
+    "using sk-" + "a" * 40,
+    "bearer eyJhbGciOiJIUzI1NiJ9.eyJzdWIiOiIxIn0.abc123",
+])
+def test_sensitive_values_are_masked(message):
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, "%s", (message,), None)
+
+    formatted = SensitiveDataFormatter("%(message)s").format(record)
+
+    assert "abc123" not in formatted and "a" * 40 not in formatted
+    assert "***MASKED***" in formatted
+
+
+def test_records_are_formatted_on_the_listener_thread():
+    log_queue = queue.SimpleQueue()
+    output = io.StringIO()
+    handler = logging.StreamHandler(output)
+    handler.setLevel(logging.INFO)
+    handler.setFormatter(SensitiveDataFormatter("%(levelname)s %(message)s"))
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    logger = logging.getLogger("test_logger.deferred")
+    logger.propagate = False
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    logger.setLevel(logging.DEBUG)
+
+    formatted = []
+
+    class Lazy:
+        def __str__(self):
+            formatted.append(True)
+            return "api_key=abc123"
+
+    logger.info("Config %s", Lazy())
+    logger.debug("Dropped %s", Lazy())
+    assert formatted == []
+
+    listener.start()
+    listener.stop()
+
+    assert output.getvalue() == "INFO Config ***MASKED***\n"
+    assert formatted == [True]
+
+
+def test_records_carry_the_trace_id_of_the_calling_context():
+    log_queue = queue.SimpleQueue()
+    output = io.StringIO()
+    handler = logging.StreamHandler(output)
+    handler.setFormatter(SensitiveDataFormatter("%(trace_id)s %(message)s"))
+    listener = QueueListener(log_queue, handler)
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(TraceIdFilter())
+    logger = logging.getLogger("test_logger.trace")
+    logger.propagate = False
+    logger.addHandler(queue_handler)
+
+    logger.warning("outside")
+    token = current_trace_id.set("req-123")
+    try:
+        logger.warning("inside")
+    finally:
+        current_trace_id.reset(token)
+    listener.start()
+    listener.stop()
+
+    assert output.getvalue() == "- outside\nreq-123 inside\n"
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_children_write_their_records(tmp_path):
+    path = tmp_path / "child.log"
+
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            handler = logging.FileHandler(path)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            log_listener.handlers += (handler,)
+            app_logger.warning("from the child")
+            log_listener.stop()
+            handler.close()
+            status = 0
+        finally:
+            os._exit(status)
+
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert path.read_text() == "from the child\n"
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+import generator
+import main
+import metrics
+from fake_openai import FakeOpenAIServer
+from logger import app_logger
+
+
+def test_histogram_renders_cumulative_buckets_and_escaped_labels():
+    histogram = metrics.Histogram("test_seconds", "Test histogram.", (0.1, 1.0), ("path",))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, 'say "hi"\n')
+
+    lines = histogram.render()
+
+    assert lines == [
+        "# HELP test_seconds Test histogram.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{path="say \\"hi\\"\\n",le="0.1"} 2',
+        'test_seconds_bucket{path="say \\"hi\\"\\n",le="1"} 3',
+        'test_seconds_bucket{path="say \\"hi\\"\\n",le="+Inf"} 4',
+        'test_seconds_sum{path="say \\"hi\\"\\n"} 3.65',
+        'test_seconds_count{path="say \\"hi\\"\\n"} 4',
+    ]
+
+
+def test_chain_reports_stage_timings_tokens_and_chunks(build_stub_chain):
+    stages = ("embedding", "vector_search", "retrieval", "context", "prompt", "llm", "parse")
+    before = {stage: metrics.STAGE_SECONDS.snapshot(stage)["count"] for stage in stages}
+    tokens_before = metrics.PROMPT_TOKENS.snapshot()["count"]
+    chunks_before = metrics.RETRIEVED_CHUNKS.snapshot()
+
+    with FakeOpenAIServer(chat_latency_ms=0, answer="stub answer") as server:
+        model = ChatOpenAI(model="gpt-3.5-turbo-0125", base_url=server.base_url, api_key="sk-test", max_retries=0)
+        answer = asyncio.run(build_stub_chain(model).ainvoke("What are the visiting hours?"))
+
+    assert answer == "stub answer"
+    assert all(metrics.STAGE_SECONDS.snapshot(stage)["count"] == before[stage] + 1 for stage in stages)
+    assert metrics.PROMPT_TOKENS.snapshot()["count"] == tokens_before + 1
+    assert metrics.RETRIEVED_CHUNKS.snapshot()["sum"] == chunks_before["sum"] + 2
+    assert generator.pipeline_metrics._started == {}
+
+
+def test_metrics_endpoint_and_trace_id_header(pipeline, build_stub_chain, monkeypatch):
+    monkeypatch.setattr(generator, "review_chain", build_stub_chain())
+    main.limiter.reset()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            traced = await client.post(
+                "/generate/", json={"question": "Visiting hours?"}, headers={"X-Request-ID": "req-123"}
+            )
+            untraced = await client.get("/", headers={"X-Request-ID": "bad id\r\n"})
+            return traced, untraced, await client.get("/metrics")
+
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    app_logger.addHandler(handler)
+    try:
+        traced, untraced, scraped = asyncio.run(run())
+    finally:
+        app_logger.removeHandler(handler)
+
+    assert traced.status_code == 200
+    assert traced.headers["X-Request-ID"] == "req-123"
+    received = [record for record in records if record.getMessage().startswith("Received question")]
+    assert [record.trace_id for record in received] == ["req-123"]
+    assert len(untraced.headers["X-Request-ID"]) == 32
+    assert scraped.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = scraped.text
+    assert 'rag_stage_duration_seconds_count{stage="sanitize"}' in body
+    assert 'rag_stage_duration_seconds_count{stage="llm"}' in body
+    assert 'http_request_duration_seconds_count{method="POST",route="/generate/",status="200"}' in body
+    assert "rag_singleflight_executions " in body
@@ -1,25 +1,81 @@
-import requests
-import time
-from logger import logger
-
-def test_rate_limit():
-    base_url = "http://localhost:8000/chat/"
-    
-    logger.info("Starting rate limit test")
-    
-    for i in range(15):  
-        try:
-            response = requests.get(f"{base_url}/")
-            logger.info(f"Request {i+1}: Status {response.status_code}")
-            if response.status_code == 429:
-                logger.warning(f"Rate limit hit! Response: {response.json()}")
-                retry_after = int(response.headers.get('Retry-After', 60))
-                logger.info(f"Waiting {retry_after} seconds before next request")
-                time.sleep(retry_after)
-            else:
-                time.sleep(0.1)  
-        except Exception as e:
-            logger.error(f"Error during request {i+1}: {str(e)}")
-
-if __name__ == "__main__":
-    test_rate_limit() 
\ No newline at end of file
+import asyncio
+
+import httpx
+
+import generator
+import main
+from config import settings
+from conftest import SlowFakeChatModel
+
+
+def limit_count(limit: str) -> int:
+    return int(limit.split("/")[0])
+
+
+async def send(method, path, times, **kwargs):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        return [await client.request(method, path, **kwargs) for _ in range(times)]
+
+
+def test_chat_is_rate_limited_with_retry_after():
+    main.limiter.reset()
+    allowed = limit_count(settings.RATE_LIMIT_CHAT)
+
+    responses = asyncio.run(send("POST", "/chat/", allowed + 1, json={"question": "Visiting hours?"}))
+
+    assert [r.status_code for r in responses[:allowed]] == [200] * allowed
+    limited = responses[-1]
+    assert limited.status_code == 429
+    assert limited.json()["error"] == "Too many requests"
+    assert 0 < int(limited.headers["Retry-After"]) <= 60
+
+
+def test_health_limit_does_not_throttle_the_readiness_probe():
+    main.limiter.reset()
+    allowed = limit_count(settings.RATE_LIMIT_HEALTH)
+
+    async def run():
+        health = await send("GET", "/", allowed + 1)
+        ready = await send("GET", "/ready", 5)
+        return health, ready
+
+    health, ready = asyncio.run(run())
+
+    assert health[-1].status_code == 429
+    assert all(r.status_code != 429 for r in ready)
+
+
+def test_batch_counts_each_question_against_the_generate_limit(pipeline, build_stub_chain, monkeypatch):
+    monkeypatch.setattr(generator, "review_chain", build_stub_chain(SlowFakeChatModel(delay=0)))
+    monkeypatch.setattr(generator, "query_embeddings", None)
+    main.limiter.reset()
+    allowed = limit_count(settings.RATE_LIMIT_GENERATE)
+
+    async def run():
+        batch = {"questions": [f"Question {i}?" for i in range(allowed - 1)]}
+        first = await send("POST", "/generate/batch", 1, json=batch)
+        too_large = await send("POST", "/generate/batch", 1, json={"questions": ["One?", "Two?"]})
+        single = await send("POST", "/generate/", 2, json={"question": "Visiting hours?"})
+        return first + too_large + single
+
+    responses = asyncio.run(run())
+
+    assert [r.status_code for r in responses] == [200, 429, 200, 429]
+
+
+def test_deleting_sessions_does_not_use_the_generate_quota(pipeline, build_stub_chain, monkeypatch):
+    monkeypatch.setattr(generator, "review_chain", build_stub_chain(SlowFakeChatModel(delay=0)))
+    main.limiter.reset()
+    deletes = max(limit_count(settings.RATE_LIMIT_GENERATE), limit_count(settings.RATE_LIMIT_SESSIONS)) + 1
+
+    async def run():
+        deleted = await send("DELETE", "/sessions/unknown", deletes)
+        generated = await send("POST", "/generate/", 1, json={"question": "Visiting hours?"})
+        return deleted, generated
+
+    deleted, generated = asyncio.run(run())
+
+    assert deleted[0].status_code == 404
+    assert deleted[-1].status_code == 429
+    assert generated[0].status_code == 200
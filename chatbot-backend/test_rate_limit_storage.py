@@ -0,0 +1,132 @@
+import multiprocessing
+import sqlite3
+import threading
+import time
+
+import pytest
+from fakeredis import TcpFakeServer
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+from redis.commands.core import Script
+
+import rate_limit_storage  # registers the sqlite:// scheme
+from rate_limit_storage import SQLiteStorage
+
+
+def storages(tmp_path):
+    """Two storage instances on one database, standing in for two workers."""
+    uri = f"sqlite:///{tmp_path}/limits.sqlite3"
+    return storage_from_string(uri), storage_from_string(uri)
+
+
+# Limits use day windows so a run never straddles a window boundary, where
+# the sliding window counter legitimately admits one more hit
+def test_limit_is_shared_between_workers(tmp_path):
+    first, second = storages(tmp_path)
+    limiters = [SlidingWindowCounterRateLimiter(first), SlidingWindowCounterRateLimiter(second)]
+    limit = parse("10/day")
+
+    allowed = [limiters[i % 2].hit(limit, "127.0.0.1") for i in range(25)]
+
+    assert sum(allowed) == 10
+    assert not limiters[0].test(limit, "127.0.0.1")
+    assert limiters[1].get_window_stats(limit, "127.0.0.1").remaining == 0
+
+    first.reset()
+    assert limiters[1].hit(limit, "127.0.0.1")
+
+
+def test_fixed_window_counters(tmp_path):
+    storage, _ = storages(tmp_path)
+
+    assert storage.incr("LIMITS/key", 60) == 1
+    assert storage.incr("LIMITS/key", 60, amount=2) == 3
+    assert storage.get("LIMITS/key") == 3
+    assert 0 < storage.get_expiry("LIMITS/key") - time.time() <= 60
+
+    storage.clear("LIMITS/key")
+    assert storage.get("LIMITS/key") == 0
+    assert storage.check()
+
+
+@pytest.fixture
+def redis_uri():
+    """A local stand-in Redis server for limits' redis:// storage."""
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    uri = f"redis://127.0.0.1:{server.server_address[1]}/0"
+    # fakeredis drops a connection after an error reply, which breaks the
+    # EVALSHA, NOSCRIPT, SCRIPT LOAD round trip, so the Lua scripts of the
+    # storage are loaded up front, as on a server that has run them before
+    storage = storage_from_string(uri)
+    for script in vars(storage).values():
+        if isinstance(script, Script):
+            storage.get_connection().script_load(script.script)
+    yield uri
+    server.shutdown()
+    server.server_close()
+
+
+def _hammer(uri, hits, results, options):
+    limiter = SlidingWindowCounterRateLimiter(storage_from_string(uri, **options))
+    limit = parse("50/day")
+    results.put(sum(limiter.hit(limit, "127.0.0.1") for _ in range(hits)))
+
+
+def admitted_across_processes(uri, **options):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [context.Process(target=_hammer, args=(uri, 40, results, options)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    allowed = sum(results.get(timeout=60) for _ in workers)
+    for worker in workers:
+        worker.join()
+    return allowed
+
+
+def test_sqlite_limit_holds_across_processes(tmp_path):
+    uri = f"sqlite:///{tmp_path}/limits.sqlite3"
+    SQLiteStorage(uri)
+
+    # A long lock timeout, so no hit fails open and the count is exact
+    assert admitted_across_processes(uri, timeout=5.0) == 50
+
+
+def test_redis_limit_holds_across_processes(redis_uri):
+    storage = storage_from_string(redis_uri)
+    assert storage.check()
+
+    assert admitted_across_processes(redis_uri) == 50
+    assert not SlidingWindowCounterRateLimiter(storage).test(parse("50/day"), "127.0.0.1")
+
+
+def test_checks_fail_open_when_the_database_stays_locked(tmp_path):
+    storage = SQLiteStorage(f"sqlite:///{tmp_path}/limits.sqlite3", timeout=0.05)
+    limiter = SlidingWindowCounterRateLimiter(storage)
+    limit = parse("1/day")
+    assert limiter.hit(limit, "127.0.0.1")
+
+    # Another worker holding the write lock
+    other = sqlite3.connect(storage.path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    start = time.perf_counter()
+    admitted = limiter.hit(limit, "127.0.0.1")
+    elapsed = time.perf_counter() - start
+    other.execute("ROLLBACK")
+
+    assert admitted
+    assert elapsed < 0.5
+    assert storage.lock_timeouts == 1
+    assert not limiter.hit(limit, "127.0.0.1")
+
+
+def test_relative_paths_are_anchored_to_the_backend_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limit_storage, "BACKEND_DIR", tmp_path)
+
+    storage = storage_from_string("sqlite:///cache/limits.sqlite3")
+
+    assert storage.path == str(tmp_path / "cache" / "limits.sqlite3")
+    assert storage.check()
@@ -0,0 +1,140 @@
+import asyncio
+import uuid
+
+import httpx
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import generator
+import main
+from bm25 import BM25Index
+from conftest import SlowFakeChatModel, parse_sse_events
+from relevance import GATED_ANSWER, RELEVANCE_SCORE_KEY, RelevanceGate, with_relevance_score
+from retrievers import AsyncVectorStoreRetriever, HybridRetriever
+from sessions import SessionStore
+
+TEXTS = ["The hospital is open from 8 AM to 8 PM daily.", "Dr. John Doe is a cardiology specialist."]
+
+
+def scored(*scores):
+    return [with_relevance_score(Document(page_content=f"chunk {i}"), score) for i, score in enumerate(scores)]
+
+
+def build_cosine_retriever():
+    vector_db = Chroma(
+        collection_name=f"test-{uuid.uuid4().hex}",
+        embedding_function=DeterministicFakeEmbedding(size=32),
+        collection_metadata={"hnsw:space": "cosine"},
+    )
+    vector_db.add_texts(TEXTS, ids=[f"chunk-{i}" for i in range(len(TEXTS))])
+    return AsyncVectorStoreRetriever(vectorstore=vector_db, search_type="similarity", search_kwargs={"k": 2})
+
+
+def test_gate_drops_irrelevant_questions_and_trims_to_the_decisive_chunks():
+    gate = RelevanceGate(min_score=0.75, decisive_margin=0.1, min_chunks=2)
+
+    assert gate.select(scored(0.7, 0.6)) is None
+    assert gate.select(scored(0.7, 0.6), gate=False) is not None
+    assert [doc.page_content for doc in gate.select(scored(0.95, 0.8, 0.78))] == ["chunk 0", "chunk 1"]
+    assert len(gate.select(scored(0.9, 0.85, 0.84))) == 3
+    # Lexical fast-path hits have no score
+    assert len(gate.select([Document(page_content="bm25 hit")])) == 1
+    assert gate.answer("anything") == GATED_ANSWER
+    assert gate.stats() == {
+        "questions": 5,
+        "llm_calls_avoided": 1,
+        "fallback_answers": 0,
+        "gated_rate": 0.2,
+        "trimmed": 1,
+        "trimmed_chunks": 1,
+    }
+
+
+def test_retriever_scores_are_cosine_similarities():
+    retriever = build_cosine_retriever()
+
+    documents = asyncio.run(retriever.ainvoke(TEXTS[1]))
+
+    assert documents[0].page_content == TEXTS[1]
+    assert abs(documents[0].metadata[RELEVANCE_SCORE_KEY] - 1.0) < 1e-4
+    assert documents[1].metadata[RELEVANCE_SCORE_KEY] < 0.9
+
+
+def test_fused_hybrid_results_are_gated_on_their_vector_scores():
+    model = SlowFakeChatModel(delay=0)
+    lexical_index = BM25Index([f"chunk-{i}" for i in range(len(TEXTS))], TEXTS, [{} for _ in TEXTS])
+    # fetch_k=1: BM25 finds a chunk the vector search does not return
+    retriever = HybridRetriever(
+        vector_retriever=build_cosine_retriever(), lexical_index=lexical_index, k=2, fetch_k=1,
+        min_coverage=0.9, min_margin=1.3,
+    )
+    chain = generator.build_review_chain(retriever, model)
+    gate = RelevanceGate(min_score=0.9)
+
+    async def run():
+        fused = await retriever.ainvoke("Is cardiology parking free?")
+        generator.relevance_gate = gate
+        return fused, await chain.ainvoke("Is cardiology parking free?")
+
+    original_gate = generator.relevance_gate
+    try:
+        fused, answer = asyncio.run(run())
+    finally:
+        generator.relevance_gate = original_gate
+
+    assert retriever.stats.fused == 2
+    assert len(fused) == 2
+    assert all(RELEVANCE_SCORE_KEY in doc.metadata for doc in fused)
+    assert answer == GATED_ANSWER
+    assert model.calls == 0
+    assert gate.stats()["llm_calls_avoided"] == 1
+
+
+def test_gated_questions_are_answered_without_the_model(pipeline, monkeypatch):
+    model = SlowFakeChatModel(delay=0)
+    monkeypatch.setattr(generator, "review_chain", generator.build_review_chain(build_cosine_retriever(), model))
+    monkeypatch.setattr(generator, "relevance_gate", RelevanceGate(min_score=0.9, fallback=main.faq_answer))
+    monkeypatch.setattr(generator, "session_store", SessionStore(generator.asummarize_history))
+    main.startup_dependencies["faq"].ensure()
+    main.limiter.reset()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            faq = await client.post("/generate/", json={"question": "What are the visiting hours at the hospital?"})
+            unknown = await client.post("/generate/stream", json={"question": "Can I bring my dog?", "new_session": True})
+            session_id = parse_sse_events(unknown.text)[-1][1]["session_id"]
+            follow_up = await client.post("/generate/", json={"question": "What about cats?", "session_id": session_id})
+            relevant = await client.post("/generate/", json={"question": TEXTS[0]})
+            return faq, unknown, follow_up, relevant, session_id
+
+    faq, unknown, follow_up, relevant, session_id = asyncio.run(run())
+
+    assert faq.json() == {"response": "The hospital is open from 8 AM to 8 PM daily."}
+    assert "".join(data["token"] for event, data in parse_sse_events(unknown.text) if event == "token") == GATED_ANSWER
+    # A follow-up may be answered by the conversation, so it goes to the model
+    assert follow_up.json() == {"response": "stub answer", "session_id": session_id}
+    assert relevant.json() == {"response": "stub answer"}
+    # The follow-up costs two calls: the rewrite into a standalone question, then the answer
+    assert model.calls == 3
+    stats = generator.pipeline_stats()["relevance_gate"]
+    assert (stats["llm_calls_avoided"], stats["fallback_answers"]) == (2, 1)
+
+
+def test_questions_with_nothing_retrieved_are_gated(monkeypatch):
+    model = SlowFakeChatModel(delay=0)
+    empty = Chroma(collection_name=f"test-{uuid.uuid4().hex}", embedding_function=DeterministicFakeEmbedding(size=32))
+    retriever = AsyncVectorStoreRetriever(vectorstore=empty, search_type="similarity", search_kwargs={"k": 2})
+    chain = generator.build_review_chain(retriever, model)
+    gate = RelevanceGate(min_score=0.5)
+    monkeypatch.setattr(generator, "relevance_gate", gate)
+
+    answer = asyncio.run(chain.ainvoke("Is there a pharmacy on site?"))
+
+    assert answer == GATED_ANSWER
+    assert model.calls == 0
+    assert gate.stats()["llm_calls_avoided"] == 1
+    # Without a threshold, or for a follow-up, the model still gets the question
+    assert RelevanceGate().select([]) == []
+    assert gate.select([], gate=False) == []
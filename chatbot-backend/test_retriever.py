@@ -0,0 +1,203 @@
+import shutil
+import uuid
+from pathlib import Path
+
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import retriever
+from bm25 import BM25Index, BM25_INDEX_FILENAME
+from retriever import (
+    ingest_directory,
+    load_manifest,
+    rebuild_lexical_index,
+    refresh_vector_index,
+    save_manifest,
+    source_key,
+)
+from vector_index import VECTOR_INDEX_DIRNAME, MmapVectorIndex, manifest_digest
+
+PAGE_ONE = "Visiting hours are from 8 AM to 8 PM daily. " * 30
+PAGE_TWO = "Dr. John Doe and Dr. Jane Smith are cardiology specialists. " * 5
+
+
+def make_vector_db():
+    return Chroma(collection_name=f"test-{uuid.uuid4().hex}", embedding_function=DeterministicFakeEmbedding(size=16))
+
+
+def parse_text_pages(path, start=0, stop=None):
+    """Stands in for parse_pdf: pages of a text file are separated by form feeds."""
+    return list(enumerate(Path(path).read_text(encoding="utf-8").split("\f")))[start:stop]
+
+
+def count_text_pages(path):
+    return len(parse_text_pages(path))
+
+
+@pytest.fixture
+def text_pdfs(monkeypatch):
+    """Parse page-text files instead of PDFs; the forked parser processes inherit the patch."""
+    monkeypatch.setattr(retriever, "parse_pdf", parse_text_pages)
+    monkeypatch.setattr(retriever, "pdf_page_count", count_text_pages)
+
+    def write(path, *texts):
+        path.write_text("\f".join(texts), encoding="utf-8")
+        return str(path)
+
+    return write
+
+
+def ingest(paths, vector_db, manifest, persist_directory):
+    return ingest_directory(
+        paths, vector_db, manifest, str(persist_directory), workers=1, data_dir=str(persist_directory)
+    )
+
+
+def test_second_run_on_unchanged_document_skips_everything(tmp_path, text_pdfs):
+    vector_db = make_vector_db()
+    manifest = {"version": 1, "sources": {}}
+    paths = [text_pdfs(tmp_path / "doc.pdf", PAGE_ONE, PAGE_TWO)]
+
+    first = ingest(paths, vector_db, manifest, tmp_path)
+    count = vector_db._collection.count()
+    second = ingest(paths, vector_db, manifest, tmp_path)
+
+    assert first.added == count > 0
+    assert (second.files, second.added, second.updated, second.removed, second.skipped) == (0, 0, 0, 0, count)
+    assert vector_db._collection.count() == count
+
+
+def test_changed_and_removed_chunks_are_upserted_and_deleted(tmp_path, text_pdfs):
+    vector_db = make_vector_db()
+    manifest = {"version": 1, "sources": {}}
+    path = text_pdfs(tmp_path / "doc.pdf", PAGE_ONE, PAGE_TWO)
+    ingest([path], vector_db, manifest, tmp_path)
+    page_one_chunks = len(manifest["sources"]["doc.pdf"]["pages"]["0"]["chunks"])
+
+    text_pdfs(tmp_path / "doc.pdf", PAGE_ONE.replace("8 PM", "9 PM", 1))
+    report = ingest([path], vector_db, manifest, tmp_path)
+
+    assert report.updated == 1
+    assert report.skipped == page_one_chunks - 1
+    assert report.removed == 1
+    assert vector_db._collection.count() == page_one_chunks
+    assert "9 PM" in vector_db.get(ids=["doc.pdf:0:0"])["documents"][0]
+
+
+def test_manifest_round_trip(tmp_path, text_pdfs):
+    manifest = {"version": 1, "sources": {}}
+    ingest([text_pdfs(tmp_path / "doc.pdf", PAGE_TWO)], make_vector_db(), manifest, tmp_path)
+
+    save_manifest(str(tmp_path), manifest)
+
+    assert load_manifest(str(tmp_path)) == manifest
+    assert load_manifest(str(tmp_path / "missing")) == {"version": 1, "sources": {}}
+
+
+def copy_pdfs(tmp_path, names):
+    source = Path(__file__).parent.parent / "data" / "harmony.pdf"
+    paths = []
+    for name in names:
+        path = tmp_path / name
+        shutil.copy(source, path)
+        paths.append(str(path))
+    return paths
+
+
+def test_directory_ingest_is_incremental_and_prunes_missing_files(tmp_path):
+    paths = copy_pdfs(tmp_path, ["a.pdf", "b.pdf"])
+    vector_db = make_vector_db()
+    manifest = {"version": 1, "sources": {}}
+
+    first = ingest_directory(paths, vector_db, manifest, str(tmp_path), workers=2, batch_size=8)
+    total = vector_db._collection.count()
+    second = ingest_directory(paths, vector_db, manifest, str(tmp_path), workers=2, batch_size=8)
+    third = ingest_directory(paths[:1], vector_db, manifest, str(tmp_path), workers=2, batch_size=8)
+
+    assert first.files == 2 and first.pages == 12
+    assert first.added == first.chunks == total > 0
+    assert first.pages_per_second > 0
+    assert (second.files, second.added, second.skipped) == (0, 0, total)
+    assert third.removed == total // 2
+    assert vector_db._collection.count() == total // 2
+    assert load_manifest(str(tmp_path)) == manifest
+
+
+def test_directory_ingest_resumes_after_crash_without_duplicates(tmp_path):
+    paths = copy_pdfs(tmp_path, ["a.pdf", "b.pdf"])
+    vector_db = make_vector_db()
+    manifest = {"version": 1, "sources": {}}
+    ingest_directory(paths, vector_db, manifest, str(tmp_path), workers=1, batch_size=4)
+    total = vector_db._collection.count()
+
+    # The crash happened after b.pdf's chunks were written but before its checkpoint
+    del manifest["sources"][source_key(paths[1])]
+    resumed = ingest_directory(paths, vector_db, manifest, str(tmp_path), workers=1, batch_size=4)
+
+    assert resumed.files == 1
+    assert resumed.added == total // 2
+    assert vector_db._collection.count() == total
+
+
+def test_source_ids_do_not_depend_on_the_working_directory(tmp_path, text_pdfs, monkeypatch):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    text_pdfs(data_dir / "doc.pdf", PAGE_ONE, PAGE_TWO)
+    vector_db = make_vector_db()
+    manifest = {"version": 1, "sources": {}}
+
+    monkeypatch.chdir(data_dir)
+    ingest_directory(["doc.pdf"], vector_db, manifest, str(tmp_path), workers=1, data_dir=".")
+    count = vector_db._collection.count()
+    monkeypatch.chdir(tmp_path)
+    again = ingest_directory(["data/doc.pdf"], vector_db, manifest, str(tmp_path), workers=1, data_dir="data")
+
+    assert list(manifest["sources"]) == ["doc.pdf"]
+    assert (again.files, again.removed, again.skipped) == (0, 0, count)
+    assert vector_db.get(ids=["doc.pdf:1:0"])["metadatas"][0]["source"] == "doc.pdf"
+    assert source_key(str(data_dir / "doc.pdf")) == (data_dir / "doc.pdf").resolve().as_posix()
+
+
+def test_large_files_are_parsed_a_few_pages_at_a_time(tmp_path, monkeypatch):
+    path = copy_pdfs(tmp_path, ["a.pdf"])[0]
+    whole = retriever.parse_pdf(path)
+    vector_db = make_vector_db()
+    manifest = {"version": 1, "sources": {}}
+    monkeypatch.setattr(retriever, "PARSE_PAGES_PER_TASK", 4)
+
+    tasks = list(retriever.parse_tasks([("a.pdf", path)]))
+    report = ingest_directory([path], vector_db, manifest, str(tmp_path), workers=2, data_dir=str(tmp_path))
+
+    assert [(start, stop) for _, _, start, stop in tasks] == [(0, 4), (4, 6)]
+    assert retriever.parse_pdf(path, 0, 4) + retriever.parse_pdf(path, 4, 6) == whole
+    assert report.pages == len(whole) == len(manifest["sources"]["a.pdf"]["pages"])
+
+
+def test_lexical_index_is_rebuilt_from_collection(tmp_path, text_pdfs):
+    vector_db = make_vector_db()
+    ingest([text_pdfs(tmp_path / "doc.pdf", PAGE_ONE, PAGE_TWO)], vector_db, {"version": 1, "sources": {}}, tmp_path)
+
+    rebuild_lexical_index(vector_db, str(tmp_path))
+    index = BM25Index.load(str(tmp_path / BM25_INDEX_FILENAME))
+
+    assert len(index) == vector_db._collection.count()
+    assert index.search("cardiology specialists").documents[0].metadata["page"] == 1
+
+
+def test_existing_vector_export_is_refreshed_after_ingest(tmp_path, text_pdfs):
+    vector_db = make_vector_db()
+    manifest = {"version": 1, "sources": {}}
+    ingest([text_pdfs(tmp_path / "doc.pdf", PAGE_ONE)], vector_db, manifest, tmp_path)
+    assert refresh_vector_index(vector_db, str(tmp_path)) is None
+
+    refresh_vector_index(vector_db, str(tmp_path), export=True, quantization="int8")
+    ingest([text_pdfs(tmp_path / "doc.pdf", PAGE_ONE, PAGE_TWO)], vector_db, manifest, tmp_path)
+    # A later ingest without the export flags keeps the export's layout
+    refreshed = refresh_vector_index(vector_db, str(tmp_path))
+    index = MmapVectorIndex.load(str(tmp_path / VECTOR_INDEX_DIRNAME))
+
+    assert refreshed == {"count": vector_db._collection.count(), "quantization": "int8", "exact_vectors": True}
+    assert len(index) == vector_db._collection.count()
+    assert index.quantization == "int8" and index.vectors is not None
+    assert index.source_digest == manifest_digest(str(tmp_path))
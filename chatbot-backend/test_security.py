@@ -0,0 +1,92 @@
+import asyncio
+import random
+import re
+import time
+
+import httpx
+import pytest
+
+import main
+from config import settings
+from security import sanitize_input
+
+
+def legacy_sanitize(text):
+    """The previous three-regex implementation, kept as the reference behaviour."""
+    text = re.sub(r'<[^>]+>', '', text)
+    text = re.sub(r'<script\b[^<]*(?:(?!<\/script>)<[^<]*)*<\/script>', '', text)
+    text = re.sub(r'[<>{}()\[\]\\/]', '', text)
+    return text.strip()[:settings.MAX_QUESTION_LENGTH]
+
+
+def test_sanitizer_matches_previous_behaviour():
+    rng = random.Random(7)
+    alphabet = "<>ab /(){}[]\\ script"
+    samples = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40))) for _ in range(3000)]
+    samples += [
+        "<script>alert('x')</script> visiting hours?",
+        "<b>bold</b> question",
+        "a <> b << c >> d",
+        "<<a>",
+        "x" * (settings.MAX_QUESTION_LENGTH + 50),
+    ]
+
+    for sample in samples:
+        assert sanitize_input(sample) == legacy_sanitize(sample), sample
+
+
+@pytest.mark.parametrize("adversarial", [
+    "<" * 200_000,
+    "<a" * 100_000,
+    "<>" * 100_000,
+    "<script>" + "<" * 200_000,
+    "<" + "a" * 200_000,
+])
+def test_sanitizer_worst_case_inputs_are_linear(adversarial):
+    start = time.perf_counter()
+    sanitize_input(adversarial)
+    # The old tag pattern needs on the order of n^2 steps for these inputs
+    assert time.perf_counter() - start < 0.5
+
+
+def post(path, **kwargs):
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            return await client.post(path, **kwargs)
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def production_mode(monkeypatch):
+    main.limiter.reset()
+    monkeypatch.setattr(settings, "DEVELOPMENT_MODE", False)
+
+
+def test_api_key_is_required(production_mode):
+    missing = post("/chat/", json={"question": "visiting hours"})
+    wrong = post("/chat/", json={"question": "visiting hours"}, headers={settings.API_KEY_HEADER: "wrong"})
+    valid = post("/chat/", json={"question": "visiting hours"}, headers={settings.API_KEY_HEADER: settings.API_KEY})
+
+    assert missing.status_code == 401
+    assert missing.json()["detail"]["error"] == "API key is required"
+    assert wrong.status_code == 401
+    assert wrong.json()["detail"]["error"] == "Invalid API key"
+    assert valid.status_code == 200
+
+
+def test_request_size_limit(production_mode, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_REQUEST_SIZE", 100)
+    headers = {settings.API_KEY_HEADER: settings.API_KEY}
+
+    async def chunked_body():
+        for _ in range(10):
+            yield b" " * 20
+
+    declared = post("/chat/", content=b"x" * 200, headers=headers)
+    streamed = post("/chat/", content=chunked_body(), headers=headers)
+
+    assert declared.status_code == 413
+    assert declared.json()["detail"]["requested_size"] == 200
+    assert streamed.status_code == 413
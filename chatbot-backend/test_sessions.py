@@ -0,0 +1,236 @@
+import asyncio
+
+import httpx
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.retrievers import BaseRetriever
+
+import generator
+import main
+from config import settings
+from conftest import SlowFakeChatModel, parse_sse_events
+from sessions import SessionStore
+
+
+class FakeSummarizer:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    async def __call__(self, summary, turns):
+        self.calls.append((summary, [turn.question for turn in turns]))
+        if self.fail:
+            raise RuntimeError("summarizer unavailable")
+        return " ".join([summary, *(turn.question for turn in turns)]).strip()[-200:]
+
+
+class RecordingChatModel(SlowFakeChatModel):
+    """Chat model stand-in that records the messages of every call."""
+
+    delay: float = 0.0
+    prompts: list = []
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=f"answer {len(self.prompts)}"))])
+
+
+def test_old_turns_are_folded_into_the_summary_and_history_stays_bounded():
+    summarizer = FakeSummarizer()
+    store = SessionStore(summarizer, recent_turns=3, history_tokens=10000)
+
+    async def run():
+        session = store.create()
+        sizes = []
+        for i in range(30):
+            store.record(session, f"question {i}", f"answer {i}")
+            await store.asettle(session)
+            sizes.append(len(session.messages()))
+        return session, sizes
+
+    session, sizes = asyncio.run(run())
+
+    # One summary message and three verbatim turns, however long the conversation
+    assert sizes[-1] == sizes[10] == 7
+    assert [turn.question for turn in session.turns] == ["question 27", "question 28", "question 29"]
+    assert session.summary.endswith("question 26")
+    assert isinstance(session.messages()[0], SystemMessage)
+    # Each fold only sees the previous summary and the new turns
+    assert all(len(questions) == 1 for _, questions in summarizer.calls)
+    assert store.stats()["summaries"] == 27
+
+
+def test_turns_over_the_token_budget_are_folded_even_with_few_turns():
+    store = SessionStore(FakeSummarizer(), recent_turns=10, history_tokens=20)
+
+    async def run():
+        session = store.create()
+        store.record(session, "short question", "long answer " * 20)
+        store.record(session, "next question", "short answer")
+        await store.asettle(session)
+        return session
+
+    session = asyncio.run(run())
+
+    assert [turn.question for turn in session.turns] == ["next question"]
+    assert session.summary == "short question"
+
+
+def test_failed_summaries_keep_turns_verbatim_within_the_budget():
+    store = SessionStore(FakeSummarizer(fail=True), recent_turns=1, history_tokens=12)
+
+    async def run():
+        session = store.create()
+        for i in range(6):
+            store.record(session, f"question {i}", f"answer {i}")
+            await store.asettle(session)
+        return session
+
+    session = asyncio.run(run())
+
+    assert session.summary == ""
+    assert len(session.folding) < 5
+    assert sum(turn.tokens for turn in session.folding) <= 12
+    assert store.stats()["summary_failures"] == 5
+    assert store.stats()["dropped_turns"] > 0
+
+
+class RecordingRetriever(BaseRetriever):
+    """Retriever stand-in that records the queries it is called with."""
+
+    queries: list = []
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        self.queries.append(query)
+        return [Document(page_content="Dr. John Doe is a cardiology specialist.")]
+
+
+class FailingChatModel(SlowFakeChatModel):
+    delay: float = 0.0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise RuntimeError("upstream unavailable")
+
+
+def test_follow_ups_are_retrieved_as_standalone_questions(monkeypatch):
+    history = [HumanMessage(content="Who is Dr. Doe?"), AIMessage(content="A cardiologist.")]
+    follow_up = {"question": "Is he in today?", "history": history}
+    model = RecordingChatModel(prompts=[])
+    retriever = RecordingRetriever(queries=[])
+    chain = generator.build_review_chain(retriever, model)
+
+    answer = asyncio.run(chain.ainvoke(follow_up))
+    monkeypatch.setattr(settings, "SESSION_CONDENSE_QUESTIONS", False)
+    asyncio.run(chain.ainvoke(follow_up))
+
+    assert answer == "answer 2"
+    assert retriever.queries == ["answer 1", "Is he in today?"]
+    condense_prompt, answer_prompt, _ = model.prompts
+    assert [message.content for message in condense_prompt[1:]] == [
+        "Who is Dr. Doe?", "A cardiologist.", "Follow-up question: Is he in today?"
+    ]
+    # The model answers the question as asked, in the context of the history
+    assert answer_prompt[-1].content == "Is he in today?"
+
+
+def test_a_new_session_is_only_kept_once_its_first_question_is_answered(pipeline, build_stub_chain, monkeypatch):
+    store = SessionStore(FakeSummarizer())
+    monkeypatch.setattr(generator, "review_chain", build_stub_chain(FailingChatModel()))
+    monkeypatch.setattr(generator, "session_store", store)
+    main.limiter.reset()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            failed = await client.post("/generate/", json={"question": "Who is Dr. Doe?", "new_session": True})
+            streamed = await client.post("/generate/stream", json={"question": "Who is Dr. Doe?", "new_session": True})
+            return failed, streamed
+
+    failed, streamed = asyncio.run(run())
+
+    assert failed.status_code == 500
+    assert parse_sse_events(streamed.text)[-1][0] == "error"
+    assert len(store) == 0
+
+    async def record():
+        session = store.create(pending=True)
+        assert session.session_id not in store
+        store.record(session, "Who is Dr. Doe?", "A cardiologist.")
+        return session
+
+    session = asyncio.run(record())
+    assert store.get(session.session_id) is session and not session.pending
+
+
+def test_idle_and_least_recently_used_sessions_are_evicted():
+    now = [0.0]
+    store = SessionStore(FakeSummarizer(), max_sessions=2, idle_seconds=60, time_func=lambda: now[0])
+
+    a = store.create()
+    b = store.create()
+    assert store.get(a.session_id) is a
+    c = store.create()
+    assert b.session_id not in store and a.session_id in store and c.session_id in store
+
+    now[0] = 61.0
+    assert store.get(a.session_id) is None
+    assert len(store) == 0
+    assert store.stats()["evictions"] == 3
+
+
+def test_session_ids_are_issued_by_the_store():
+    store = SessionStore(FakeSummarizer())
+
+    ids = {store.create().session_id for _ in range(100)}
+
+    assert len(ids) == 100
+    assert all(len(session_id) >= 32 for session_id in ids)
+    assert store.get("abc") is None
+    assert "abc" not in store
+
+
+def test_generate_answers_follow_ups_with_the_session_history(pipeline, build_stub_chain, monkeypatch):
+    model = RecordingChatModel(prompts=[])
+    monkeypatch.setattr(generator, "review_chain", build_stub_chain(model))
+    monkeypatch.setattr(generator, "session_store", SessionStore(FakeSummarizer()))
+    main.limiter.reset()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            first = await client.post("/generate/", json={"question": "Who is Dr. Doe?", "new_session": True})
+            session_id = first.json()["session_id"]
+            follow_up = await client.post(
+                "/generate/stream", json={"question": "Is he in today?", "session_id": session_id}
+            )
+            other = await client.post("/generate/", json={"question": "Is he in today?", "new_session": True})
+            guessed = await client.post("/generate/", json={"question": "Is he in today?", "session_id": "abc"})
+            deleted = await client.delete(f"/sessions/{session_id}")
+            missing = await client.delete(f"/sessions/{session_id}")
+            expired = await client.post("/generate/", json={"question": "Hi", "session_id": session_id})
+            invalid = await client.post("/generate/", json={"question": "Hi", "session_id": "../x"})
+            return first, follow_up, other, guessed, deleted, missing, expired, invalid
+
+    first, follow_up, other, guessed, deleted, missing, expired, invalid = asyncio.run(run())
+
+    session_id = first.json()["session_id"]
+    assert first.json() == {"response": "answer 1", "session_id": session_id}
+    events = parse_sse_events(follow_up.text)
+    # The follow-up is first rewritten into a standalone question to retrieve with
+    assert "".join(data["token"] for event, data in events if event == "token") == "answer 3"
+    assert events[-1][1]["session_id"] == session_id
+    assert other.json()["session_id"] != session_id
+    first_prompt, condense_prompt, follow_up_prompt, other_prompt = model.prompts
+    assert [message.content for message in condense_prompt[1:]] == [
+        "Who is Dr. Doe?", "answer 1", "Follow-up question: Is he in today?"
+    ]
+    assert [type(message) for message in first_prompt] == [SystemMessage, HumanMessage]
+    assert [message.content for message in follow_up_prompt[1:]] == ["Who is Dr. Doe?", "answer 1", "Is he in today?"]
+    assert len(other_prompt) == 2
+    # Clients cannot open sessions under IDs of their choosing
+    assert guessed.status_code == 404
+    assert deleted.status_code == 204
+    assert missing.status_code == 404
+    assert expired.status_code == 404
+    assert invalid.status_code == 422
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("visiting hours", work) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["answer"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"executions": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_failure_reaches_all_waiters_and_releases_key():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream error")
+
+    async def ok():
+        return "recovered"
+
+    async def run():
+        results = await asyncio.gather(flight.do("q", fail), flight.do("q", fail), return_exceptions=True)
+        return results, await flight.do("q", ok)
+
+    results, retry = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retry == "recovered"
+
+
+def test_cancelled_waiter_does_not_cancel_shared_execution():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def run():
+        first = asyncio.create_task(flight.do("q", work))
+        second = asyncio.create_task(flight.do("q", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "answer"
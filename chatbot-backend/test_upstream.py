@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import httpx
+from langchain_openai import OpenAIEmbeddings
+
+from fake_openai import FakeOpenAIServer
+from upstream import AsyncRetryingTransport, HedgedEmbeddings, RetryPolicy, RetryingTransport
+
+
+def flaky_handler(statuses):
+    calls = []
+
+    def handle(request):
+        calls.append(request.extensions.get("timeout"))
+        return httpx.Response(statuses[min(len(calls), len(statuses)) - 1], json={})
+
+    return handle, calls
+
+
+def test_transport_retries_retryable_statuses_and_not_client_errors():
+    handle, calls = flaky_handler([503, 429, 200])
+    policy = RetryPolicy(max_retries=3, base_backoff_ms=1)
+    client = httpx.Client(transport=RetryingTransport(httpx.MockTransport(handle), policy))
+
+    assert client.get("http://upstream/").status_code == 200
+    assert len(calls) == 3
+
+    handle, calls = flaky_handler([400])
+    client = httpx.Client(transport=RetryingTransport(httpx.MockTransport(handle), policy))
+
+    assert client.get("http://upstream/").status_code == 400
+    assert len(calls) == 1
+    assert policy.stats() == {"requests": 2, "retries": 2, "deadline_exceeded": 0}
+
+
+def test_async_transport_stops_retrying_at_the_deadline():
+    handle, calls = flaky_handler([503])
+    policy = RetryPolicy(max_retries=100, base_backoff_ms=50, max_backoff_ms=50, deadline_seconds=0.3)
+
+    async def run():
+        transport = AsyncRetryingTransport(httpx.MockTransport(handle), policy)
+        async with httpx.AsyncClient(transport=transport, timeout=10.0) as client:
+            start = time.perf_counter()
+            response = await client.get("http://upstream/")
+            return response, time.perf_counter() - start
+
+    response, elapsed = asyncio.run(run())
+
+    assert response.status_code == 503
+    assert elapsed < 0.3
+    assert policy.stats()["deadline_exceeded"] == 1
+    # Every attempt's timeouts are capped to what is left of the deadline
+    assert all(timeout["read"] <= 0.3 for timeout in calls)
+
+
+def test_openai_client_retries_injected_errors_through_the_transport():
+    policy = RetryPolicy(max_retries=10, base_backoff_ms=1)
+    with FakeOpenAIServer(embedding_latency_ms=0, error_rate=0.3, seed=3) as server:
+        client = httpx.AsyncClient(transport=AsyncRetryingTransport(httpx.AsyncHTTPTransport(), policy))
+        embeddings = OpenAIEmbeddings(
+            base_url=server.base_url,
+            api_key="sk-test",
+            check_embedding_ctx_length=False,
+            http_async_client=client,
+            max_retries=0,
+        )
+
+        async def run():
+            return await asyncio.gather(*(embeddings.aembed_query(f"question {i}") for i in range(10)))
+
+        vectors = asyncio.run(run())
+        stats = server.stats()
+
+    assert len(vectors) == 10
+    assert stats["injected_errors"] > 0
+    assert policy.stats()["retries"] == stats["injected_errors"]
+
+
+class SometimesSlowEmbeddings:
+    def __init__(self, slow_calls, slow_delay=0.5, delay=0.01):
+        self.slow_calls = set(slow_calls)
+        self.slow_delay = slow_delay
+        self.delay = delay
+        self.calls = 0
+
+    async def aembed_documents(self, texts):
+        self.calls += 1
+        await asyncio.sleep(self.slow_delay if self.calls in self.slow_calls else self.delay)
+        return [[float(len(text))] for text in texts]
+
+
+def test_slow_call_is_hedged_and_the_duplicate_wins():
+    underlying = SometimesSlowEmbeddings(slow_calls={1})
+    embeddings = HedgedEmbeddings(underlying, initial_delay_ms=50)
+
+    start = time.perf_counter()
+    vector = asyncio.run(embeddings.aembed_query("abc"))
+    elapsed = time.perf_counter() - start
+
+    assert vector == [3.0]
+    assert elapsed < 0.2
+    assert underlying.calls == 2
+    assert embeddings.stats()["hedged"] == 1
+    assert embeddings.stats()["hedge_wins"] == 1
+
+
+def test_hedge_delay_follows_recent_latencies():
+    underlying = SometimesSlowEmbeddings(slow_calls=set(), delay=0.03)
+    embeddings = HedgedEmbeddings(underlying, percentile=95, min_delay_ms=1, initial_delay_ms=500, min_samples=10)
+
+    async def run():
+        for i in range(10):
+            await embeddings.aembed_query(f"q{i}")
+
+    asyncio.run(run())
+
+    assert 0.03 <= embeddings.hedge_delay() < 0.1
+    assert embeddings.stats()["hedged"] == 0
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import uuid
+
+from langchain_chroma import Chroma
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import generator
+from config import settings
+from retrievers import MmapVectorRetriever
+from vector_index import (
+    MANIFEST_FILENAME,
+    VECTOR_INDEX_DIRNAME,
+    MmapVectorIndex,
+    export_vector_index,
+    manifest_digest,
+    quantize_vector_index,
+)
+
+class UnitFakeEmbedding(DeterministicFakeEmbedding):
+    """Deterministic unit-length vectors, like OpenAI's, so L2 and cosine rankings agree."""
+
+    def _get_embedding(self, seed):
+        vector = np.asarray(super()._get_embedding(seed))
+        return list(vector / np.linalg.norm(vector))
+
+
+TEXTS = [f"Chunk {i} about ward {i % 4} – naïve café hours" for i in range(30)]
+
+
+def make_exported_index(tmp_path):
+    embeddings = UnitFakeEmbedding(size=16)
+    vector_db = Chroma(collection_name=f"test-{uuid.uuid4().hex}", embedding_function=embeddings)
+    vector_db.add_texts(
+        TEXTS,
+        metadatas=[{"page": i % 4, "source": "doc.pdf"} for i in range(len(TEXTS))],
+        ids=[f"doc.pdf:{i % 4}:{i}" for i in range(len(TEXTS))],
+    )
+    count = export_vector_index(vector_db, str(tmp_path), page_size=7)
+    return vector_db, MmapVectorIndex.load(str(tmp_path)), embeddings, count
+
+
+def test_search_returns_same_documents_as_chroma(tmp_path):
+    vector_db, index, embeddings, count = make_exported_index(tmp_path)
+    query = embeddings.embed_query(TEXTS[5])
+
+    expected = vector_db.similarity_search_by_vector(query, k=5)
+    found = index.similarity_search_by_vector(query, k=5)
+
+    assert count == len(index) == len(TEXTS)
+    assert found == expected
+
+
+def test_page_filter(tmp_path):
+    vector_db, index, embeddings, _ = make_exported_index(tmp_path)
+    query = embeddings.embed_query("ward hours")
+
+    found = index.similarity_search_by_vector(query, k=3, filter={"page": {"$in": [1, 2]}})
+    expected = vector_db.similarity_search_by_vector(query, k=3, filter={"page": {"$in": [1, 2]}})
+
+    assert found == expected
+    assert {doc.metadata["page"] for doc in found} <= {1, 2}
+
+
+def test_missing_index_loads_as_none(tmp_path):
+    assert MmapVectorIndex.load(str(tmp_path / "missing")) is None
+
+
+def test_retriever_async_path(tmp_path):
+    _, index, embeddings, _ = make_exported_index(tmp_path)
+    retriever = MmapVectorRetriever(embeddings=embeddings, index=index, search_kwargs={"k": 2})
+
+    documents = asyncio.run(retriever.ainvoke(TEXTS[3]))
+
+    assert documents[0].page_content == TEXTS[3]
+    assert len(documents) == 2
+
+
+def test_quantized_index_with_rescoring_matches_exact(tmp_path):
+    _, exact, embeddings, _ = make_exported_index(tmp_path / "exact")
+    for quantization in ("float16", "int8"):
+        _, index, _, _ = make_exported_index(tmp_path / quantization)
+        quantize_vector_index(str(tmp_path / quantization), quantization)
+        index = MmapVectorIndex.load(str(tmp_path / quantization), rescore_factor=4)
+        for text in ("ward hours", TEXTS[7]):
+            query = embeddings.embed_query(text)
+            assert index.search(query, k=5) == exact.search(query, k=5)
+        assert index.memory_footprint()["scan_bytes"] < exact.memory_footprint()["scan_bytes"]
+
+
+def test_quantized_index_without_exact_vectors(tmp_path):
+    _, index, embeddings, _ = make_exported_index(tmp_path)
+    quantize_vector_index(str(tmp_path), "int8", keep_exact=False)
+    index = MmapVectorIndex.load(str(tmp_path))
+
+    found = index.similarity_search_by_vector(embeddings.embed_query(TEXTS[11]), k=3, filter={"page": 3})
+
+    assert not (tmp_path / "vectors.npy").exists()
+    assert index.memory_footprint()["exact_bytes"] == 0
+    assert found[0].page_content == TEXTS[11]
+    assert {doc.metadata["page"] for doc in found} == {3}
+
+
+def test_footprint_reports_the_chroma_data_next_to_the_export(tmp_path):
+    vector_db = Chroma(
+        collection_name="footprint", embedding_function=UnitFakeEmbedding(size=16), persist_directory=str(tmp_path)
+    )
+    vector_db.add_texts(TEXTS)
+    directory = str(tmp_path / VECTOR_INDEX_DIRNAME)
+    export_vector_index(vector_db, directory)
+    quantize_vector_index(directory, "int8")
+
+    footprint = MmapVectorIndex.load(directory).memory_footprint(str(tmp_path))
+    on_disk = sum(path.stat().st_size for path in tmp_path.rglob("*") if path.is_file())
+
+    assert footprint["exact_bytes"] > 0
+    assert footprint["chroma_disk_bytes"] + footprint["disk_bytes"] == on_disk
+    assert 0 < footprint["chroma_segment_bytes"] < footprint["chroma_disk_bytes"]
+
+
+def test_stale_exports_are_not_served(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_BACKEND", "numpy")
+    monkeypatch.setattr(settings, "LEXICAL_INDEX_ENABLED", False)
+    (tmp_path / MANIFEST_FILENAME).write_text(json.dumps({"version": 1, "sources": {"a.pdf": {}}}))
+    vector_db, _, _, _ = make_exported_index(tmp_path / VECTOR_INDEX_DIRNAME)
+    export_vector_index(vector_db, str(tmp_path / VECTOR_INDEX_DIRNAME), source_digest=manifest_digest(str(tmp_path)))
+
+    current, _ = generator.load_indexes(str(tmp_path))
+    assert len(current) == len(TEXTS)
+
+    # Ingested again without refreshing the export
+    (tmp_path / MANIFEST_FILENAME).write_text(json.dumps({"version": 1, "sources": {"a.pdf": {}, "b.pdf": {}}}))
+    stale, _ = generator.load_indexes(str(tmp_path))
+    assert stale is None
+
+    # Collection changed behind the manifest's back
+    vector_db.add_texts(["One more chunk"])
+    assert generator.matching_vector_index(current, vector_db) is None
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+
+import httpx
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import generator
+import main
+from answer_cache import AnswerCache
+from conftest import SlowFakeChatModel
+from logger import LOG_FORMAT, SensitiveDataFormatter, TraceIdFilter, app_logger
+from warm_cache import (
+    HotQuestion,
+    WARM_CACHE_VERSION,
+    WarmCache,
+    abuild_entries,
+    coverage_report,
+    iter_logged_questions,
+    log_files,
+    mine_hot_questions,
+    save_artifact,
+)
+
+LOG_LINES = """\
+2024-05-01 09:00:00,001 - rag_chatbot.app - INFO - req-1 - Received question: {"corpus": null, "session": "none", "question": "What are the visiting hours?"}
+2024-05-01 09:00:01,002 - rag_chatbot.app - DEBUG - req-1 - Request path: /generate/
+2024-05-02 09:00:00,001 - rag_chatbot.app - INFO - req-2 - Received question: {"corpus": null, "session": "new", "question": "what are the visiting hours"}
+2024-05-02 09:00:00,002 - rag_chatbot.app - INFO - req-3 - Received streaming question: {"corpus": null, "session": "none", "question": "What are the visiting hours?"}
+2024-05-02 09:00:00,003 - rag_chatbot.app - INFO - req-4 - Received question: {"corpus": null, "session": "none", "question": "Who are the cardiologists?"}
+2024-05-02 09:00:00,004 - rag_chatbot.app - INFO - req-5 - Received question: {"corpus": null, "session": "none", "question": "Who are the cardiologists?"}
+2024-05-02 09:00:00,005 - rag_chatbot.app - INFO - req-6 - Received question: {"corpus": null, "session": "none", "question": "Where do I park?\\nIs it free?"}
+2024-05-02 09:00:00,006 - rag_chatbot.app - INFO - req-7 - Received chat question: Where do I park?
+2024-05-02 09:00:00,007 - rag_chatbot.app - INFO - req-8 - Received question: {"corpus": "cardio", "session": "none", "question": "Who are the cardiologists?"}
+2024-05-02 09:00:00,008 - rag_chatbot.app - INFO - req-9 - Received question: {"corpus": null, "session": "follow-up", "question": "Who are the cardiologists?"}
+2024-05-02 09:00:00,009 - rag_chatbot.app - INFO - req-10 - Received question: {"corpus": null, "session": "none", "question": "Is my ***MASKED***
+2024-05-02 09:00:00,010 - rag_chatbot.app - INFO - Received question: Who are the cardiologists?
+"""
+
+
+def write_logs(directory):
+    lines = LOG_LINES.splitlines(keepends=True)
+    (directory / "app.log.1").write_text("".join(lines[:2]), encoding="utf-8")
+    (directory / "app.log").write_text("".join(lines[2:]), encoding="utf-8")
+
+
+def test_mines_the_most_frequent_questions_and_their_coverage(tmp_path):
+    write_logs(tmp_path)
+
+    paths = log_files(tmp_path)
+    hot, counts = mine_hot_questions(iter_logged_questions(paths), top=10, min_count=2)
+    report = coverage_report(counts, [item.key for item in hot])
+    recent = list(iter_logged_questions(paths, since=datetime(2024, 5, 2)))
+
+    assert [os.path.basename(path) for path in paths] == ["app.log.1", "app.log"]
+    assert [(item.question, item.count) for item in hot] == [
+        ("What are the visiting hours?", 3),
+        ("Who are the cardiologists?", 2),
+    ]
+    assert report["logged_questions"] == 6
+    assert report["coverage"] == round(5 / 6, 4)
+    assert report["coverage_by_size"]["10"] == 1.0
+    assert len(recent) == 5
+    assert "Where do I park?\nIs it free?" in recent
+    assert list(iter_logged_questions(paths, corpus="cardio")) == ["Who are the cardiologists?"]
+
+
+def test_logged_questions_round_trip_through_the_log_format(tmp_path):
+    path = tmp_path / "app.log"
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(SensitiveDataFormatter(LOG_FORMAT))
+    handler.addFilter(TraceIdFilter())
+    app_logger.addHandler(handler)
+    try:
+        main.log_question("question", "Where do I park?\nIs it free?", main.QueryRequest(question="-", corpus="cardio"))
+        main.log_question("question", "Is my api_key=abc123 safe?", main.QueryRequest(question="-", corpus="cardio"))
+        main.log_question("question", "And on Sundays?", main.QueryRequest(question="-", corpus="cardio", session_id="abc"))
+    finally:
+        app_logger.removeHandler(handler)
+        handler.close()
+
+    assert list(iter_logged_questions([str(path)], corpus="cardio")) == ["Where do I park?\nIs it free?"]
+    assert list(iter_logged_questions([str(path)])) == []
+
+
+def test_build_entries_reuses_answers_of_a_previous_artifact(build_stub_chain):
+    model = SlowFakeChatModel(delay=0)
+    chain = build_stub_chain(model)
+    hot = [HotQuestion("visiting hours", "Visiting hours?", 5), HotQuestion("parking", "Parking?", 3)]
+    previous = {"parking": {"key": "parking", "question": "Parking?", "count": 1, "answer": "Lot B", "embedding": None}}
+
+    entries = asyncio.run(abuild_entries(hot, chain, DeterministicFakeEmbedding(size=8), reuse=previous))
+
+    assert [(entry["answer"], entry["count"]) for entry in entries] == [("stub answer", 5), ("Lot B", 3)]
+    assert entries[0]["embedding"] is not None
+    assert model.calls == 1
+
+
+def write_artifact(path, fingerprint, entries):
+    save_artifact(str(path), {
+        "version": WARM_CACHE_VERSION,
+        "created_at": "2024-05-02T00:00:00",
+        "fingerprint": fingerprint,
+        "report": {"coverage": 0.5},
+        "entries": entries,
+    })
+
+
+def test_warm_cache_pins_matching_artifacts_and_reloads_rebuilt_ones(tmp_path):
+    path = tmp_path / "warm_cache.json"
+    entry = {"key": "parking", "question": "Parking?", "count": 3, "answer": "Lot B", "embedding": None}
+    write_artifact(path, [7, [1]], [entry])
+    cache = AnswerCache()
+    version = [(7, (1,))]
+
+    warm = WarmCache(str(path), cache, version_func=lambda: version[0], reload_interval=0)
+    assert asyncio.run(cache.alookup("parking"))[0] == "Lot B"
+
+    # Rebuilt against another version of the collection: not pinned
+    write_artifact(path, [8, [2]], [{**entry, "answer": "Lot C"}])
+    os.utime(path, ns=(1, 1))
+    cache.invalidate()
+    asyncio.run(warm.amaybe_reload())
+    assert asyncio.run(cache.alookup("parking"))[0] is None
+
+    version[0] = (8, (2,))
+    os.utime(path, ns=(2, 2))
+    asyncio.run(warm.amaybe_reload())
+    assert asyncio.run(cache.alookup("parking"))[0] == "Lot C"
+    assert warm.stats() == {"loads": 2, "stale": 1}
+
+
+def test_warm_questions_are_answered_without_calling_the_model(pipeline, tmp_path, build_stub_chain, monkeypatch):
+    model = SlowFakeChatModel(delay=0)
+    cache = AnswerCache()
+    entry = {"key": "visiting hours", "question": "Visiting hours?", "count": 9, "answer": "8 to 8", "embedding": None}
+    write_artifact(tmp_path / "warm_cache.json", [1], [entry])
+    monkeypatch.setattr(generator, "review_chain", build_stub_chain(model))
+    monkeypatch.setattr(generator, "answer_cache", cache)
+    monkeypatch.setattr(generator, "warm_cache", WarmCache(str(tmp_path / "warm_cache.json"), cache, lambda: (1,)))
+    main.limiter.reset()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            warm = await client.post("/generate/", json={"question": "visiting HOURS"})
+            cold = await client.post("/generate/", json={"question": "Parking?"})
+            return warm, cold
+
+    warm, cold = asyncio.run(run())
+
+    assert warm.json() == {"response": "8 to 8"}
+    assert cold.json() == {"response": "stub answer"}
+    assert model.calls == 1
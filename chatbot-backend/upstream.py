@@ -0,0 +1,305 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import List, Optional
+
+import httpx
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import settings
+from logger import app_logger
+
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """The delay a Retry-After header asks for, in seconds, if it is present and valid."""
+    value = response.headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Retries with capped exponential backoff and full jitter, within a per-call deadline.
+
+    Attempt ``n`` (from 0) waits a uniformly random time up to
+    ``min(max_backoff, base_backoff * 2**n)``, or what a Retry-After header
+    asks for. The deadline covers every attempt and the waits between them:
+    each attempt's timeouts are capped to the time left, and no retry is
+    made that could not start before the deadline.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 2,
+        base_backoff_ms: float = 200.0,
+        max_backoff_ms: float = 2000.0,
+        deadline_seconds: Optional[float] = None,
+    ):
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff_ms / 1000
+        self.max_backoff = max_backoff_ms / 1000
+        self.deadline_seconds = deadline_seconds
+        self.requests = 0
+        self.retries = 0
+        self.deadline_exceeded = 0
+
+    def backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        if response is not None:
+            retry_after = retry_after_seconds(response)
+            if retry_after is not None:
+                return retry_after
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+
+    def cap_timeouts(self, request: httpx.Request, deadline: Optional[float]) -> None:
+        """Shorten the request's timeouts so the attempt ends by the deadline."""
+        if deadline is None:
+            return
+        remaining = max(deadline - time.monotonic(), 0.001)
+        timeouts = dict(request.extensions.get("timeout") or {})
+        for name in ("connect", "read", "write", "pool"):
+            current = timeouts.get(name)
+            timeouts[name] = remaining if current is None else min(current, remaining)
+        request.extensions["timeout"] = timeouts
+
+    def should_retry(self, attempt: int, delay: float, deadline: Optional[float]) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            self.deadline_exceeded += 1
+            return False
+        self.retries += 1
+        return True
+
+    def deadline(self) -> Optional[float]:
+        self.requests += 1
+        return time.monotonic() + self.deadline_seconds if self.deadline_seconds else None
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "retries": self.retries, "deadline_exceeded": self.deadline_exceeded}
+
+
+class RetryingTransport(httpx.BaseTransport):
+    """Sync httpx transport retrying connection errors and retryable statuses per a RetryPolicy."""
+
+    def __init__(self, transport: httpx.BaseTransport, policy: RetryPolicy):
+        self.transport = transport
+        self.policy = policy
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        deadline = self.policy.deadline()
+        request.read()
+        attempt = 0
+        while True:
+            self.policy.cap_timeouts(request, deadline)
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError:
+                delay = self.policy.backoff(attempt)
+                if not self.policy.should_retry(attempt, delay, deadline):
+                    raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    return response
+                delay = self.policy.backoff(attempt, response)
+                if not self.policy.should_retry(attempt, delay, deadline):
+                    return response
+                response.close()
+            app_logger.debug("Retrying %s %s in %.0f ms", request.method, request.url.path, delay * 1000)
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class AsyncRetryingTransport(httpx.AsyncBaseTransport):
+    """Async httpx transport retrying connection errors and retryable statuses per a RetryPolicy."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, policy: RetryPolicy):
+        self.transport = transport
+        self.policy = policy
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        deadline = self.policy.deadline()
+        await request.aread()
+        attempt = 0
+        while True:
+            self.policy.cap_timeouts(request, deadline)
+            try:
+                response = await self.transport.handle_async_request(request)
+            except httpx.TransportError:
+                delay = self.policy.backoff(attempt)
+                if not self.policy.should_retry(attempt, delay, deadline):
+                    raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    return response
+                delay = self.policy.backoff(attempt, response)
+                if not self.policy.should_retry(attempt, delay, deadline):
+                    return response
+                await response.aclose()
+            app_logger.debug("Retrying %s %s in %.0f ms", request.method, request.url.path, delay * 1000)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+retry_policy = RetryPolicy(
+    max_retries=settings.UPSTREAM_MAX_RETRIES,
+    base_backoff_ms=settings.UPSTREAM_RETRY_BASE_MS,
+    max_backoff_ms=settings.UPSTREAM_RETRY_MAX_MS,
+    deadline_seconds=settings.UPSTREAM_DEADLINE_SECONDS or None,
+)
+
+_clients_lock = threading.Lock()
+_http_client = None
+_http_async_client = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE,
+        keepalive_expiry=settings.UPSTREAM_KEEPALIVE_SECONDS,
+    )
+
+
+def http_client() -> httpx.Client:
+    """The process-wide sync client for upstream APIs, created on first use."""
+    global _http_client
+    with _clients_lock:
+        if _http_client is None:
+            transport = httpx.HTTPTransport(limits=_limits())
+            _http_client = httpx.Client(
+                transport=RetryingTransport(transport, retry_policy),
+                timeout=settings.UPSTREAM_TIMEOUT_SECONDS,
+            )
+        return _http_client
+
+
+def http_async_client() -> httpx.AsyncClient:
+    """The process-wide async client for upstream APIs, created on first use."""
+    global _http_async_client
+    with _clients_lock:
+        if _http_async_client is None:
+            transport = httpx.AsyncHTTPTransport(limits=_limits())
+            _http_async_client = httpx.AsyncClient(
+                transport=AsyncRetryingTransport(transport, retry_policy),
+                timeout=settings.UPSTREAM_TIMEOUT_SECONDS,
+            )
+        return _http_async_client
+
+
+def client_kwargs() -> dict:
+    """
+    Keyword arguments pointing a LangChain OpenAI model at the shared clients.
+
+    The SDK's own retries are turned off: the shared transport retries,
+    with shorter, fully jittered backoff and within the call deadline.
+    """
+    return {
+        "http_client": http_client(),
+        "http_async_client": http_async_client(),
+        "max_retries": 0,
+        "request_timeout": settings.UPSTREAM_TIMEOUT_SECONDS,
+    }
+
+
+class HedgedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that hedges slow async calls.
+
+    When an ``aembed_documents`` call has not finished after the hedge
+    delay, an identical second call is started, and whichever finishes
+    first successfully is used; the other is cancelled. The delay is the
+    ``percentile`` of recent call latencies (at least ``min_delay_ms``), so
+    about ``100 - percentile`` percent of calls are hedged whatever the
+    upstream latency. A hedged call's latency is recorded as the time it
+    took until the race ended, a lower bound. Sync calls are not hedged.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        percentile: float = 95.0,
+        min_delay_ms: float = 20.0,
+        initial_delay_ms: float = 200.0,
+        window: int = 256,
+        min_samples: int = 20,
+    ):
+        self.underlying = underlying
+        self.percentile = percentile
+        self.min_delay = min_delay_ms / 1000
+        self.initial_delay = initial_delay_ms / 1000
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def hedge_delay(self) -> float:
+        if len(self._latencies) < self.min_samples:
+            return self.initial_delay
+        return max(float(np.percentile(self._latencies, self.percentile)), self.min_delay)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        start_time = time.perf_counter()
+        primary = asyncio.ensure_future(self.underlying.aembed_documents(texts))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            if done:
+                vectors = primary.result()
+                self._latencies.append(time.perf_counter() - start_time)
+                return vectors
+
+            self.hedged += 1
+            hedge = asyncio.ensure_future(self.underlying.aembed_documents(texts))
+            tasks.add(hedge)
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.hedge_wins += task is hedge
+                        self._latencies.append(time.perf_counter() - start_time)
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay_ms": self.hedge_delay() * 1000,
+        }
@@ -0,0 +1,344 @@
+import hashlib
+import json
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+VECTOR_INDEX_DIRNAME = "vector_index"
+# Ingest manifest kept by retriever.py next to the Chroma data
+MANIFEST_FILENAME = "manifest.json"
+EXPORT_PAGE_SIZE = 1000
+QUANTIZATIONS = ("float16", "int8")
+# Rows converted to float32 at a time when scanning compressed vectors
+SCAN_BLOCK_ROWS = 2048
+
+
+def manifest_digest(persist_directory: str) -> Optional[str]:
+    """Digest of the ingest manifest of a persist directory, which changes whenever ingest changes the collection."""
+    path = os.path.join(persist_directory, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def read_index_meta(directory: str) -> Optional[dict]:
+    """The ``meta.json`` of an exported index, or None if there is none."""
+    path = os.path.join(directory, "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def export_vector_index(
+    vector_db, directory: str, page_size: int = EXPORT_PAGE_SIZE, source_digest: Optional[str] = None
+) -> int:
+    """
+    Export a Chroma collection to the memory-mappable vector index format.
+
+    The directory gets ``vectors.npy`` (float32 matrix), ``norms.npy`` (row
+    norms), ``pages.npy`` (page numbers for filtering), ``texts.bin`` with
+    ``offsets.npy`` (UTF-8 chunk texts and their start offsets) and
+    ``meta.json`` (chunk IDs and sources, and ``source_digest``, the
+    ``manifest_digest`` of the collection exported, to detect a stale
+    export). The collection is read ``page_size`` rows at a time, so memory
+    stays bounded.
+
+    Returns:
+        int: Number of exported chunks
+    """
+    collection = vector_db._collection
+    count = collection.count()
+    os.makedirs(directory, exist_ok=True)
+
+    for name in ("codes", "scales"):
+        path = os.path.join(directory, f"{name}.npy")
+        if os.path.exists(path):
+            os.remove(path)
+
+    vectors = None
+    norms = np.zeros(count, dtype=np.float32)
+    pages = np.zeros(count, dtype=np.int32)
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    ids, sources = [], []
+
+    with open(os.path.join(directory, "texts.bin.tmp"), "wb") as texts:
+        for start in range(0, count, page_size):
+            batch = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=start)
+            embeddings = np.asarray(batch["embeddings"], dtype=np.float32)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(
+                    os.path.join(directory, "vectors.tmp.npy"), mode="w+", dtype=np.float32,
+                    shape=(count, embeddings.shape[1]),
+                )
+            end = start + len(batch["ids"])
+            vectors[start:end] = embeddings
+            norms[start:end] = np.linalg.norm(embeddings, axis=1)
+            for row, (id_, text, metadata) in enumerate(zip(batch["ids"], batch["documents"], batch["metadatas"]), start):
+                encoded = text.encode("utf-8")
+                texts.write(encoded)
+                offsets[row + 1] = offsets[row] + len(encoded)
+                pages[row] = (metadata or {}).get("page", -1)
+                ids.append(id_)
+                sources.append((metadata or {}).get("source"))
+
+    if vectors is None:
+        vectors = np.lib.format.open_memmap(
+            os.path.join(directory, "vectors.tmp.npy"), mode="w+", dtype=np.float32, shape=(0, 0)
+        )
+    vectors.flush()
+    del vectors
+
+    for name, array in (("norms", norms), ("pages", pages), ("offsets", offsets)):
+        np.save(os.path.join(directory, f"{name}.tmp.npy"), array)
+    with open(os.path.join(directory, "meta.tmp.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            {"count": count, "ids": ids, "sources": sources, "quantization": None, "source_digest": source_digest}, f
+        )
+
+    for name in ("vectors", "norms", "pages", "offsets"):
+        os.replace(os.path.join(directory, f"{name}.tmp.npy"), os.path.join(directory, f"{name}.npy"))
+    os.replace(os.path.join(directory, "texts.bin.tmp"), os.path.join(directory, "texts.bin"))
+    os.replace(os.path.join(directory, "meta.tmp.json"), os.path.join(directory, "meta.json"))
+    return count
+
+
+def quantize_vector_index(directory: str, quantization: str, keep_exact: bool = True) -> None:
+    """
+    Add compressed copies of the vectors of an exported index.
+
+    ``float16`` stores each vector divided by its norm; ``int8`` stores each
+    vector divided by ``max(abs(vector)) / 127``. The divisors are kept as
+    per-vector scales in ``scales.npy`` and the codes in ``codes.npy``. The
+    index then scans the codes and rescores a shortlist against the float32
+    ``vectors.npy``, of which only the shortlisted rows are paged in, so the
+    memory kept per worker is that of the codes. With ``keep_exact=False``
+    the float32 vectors are deleted, which saves their disk space, and
+    search ranks by the codes alone.
+
+    Args:
+        directory (str): Directory written by ``export_vector_index``
+        quantization (str): "float16" or "int8"
+        keep_exact (bool): Keep ``vectors.npy`` for rescoring
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {quantization}")
+    vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+    dtype = np.float16 if quantization == "float16" else np.int8
+    codes = np.lib.format.open_memmap(
+        os.path.join(directory, "codes.tmp.npy"), mode="w+", dtype=dtype, shape=vectors.shape
+    )
+    scales = np.ones(len(vectors), dtype=np.float32)
+
+    for start in range(0, len(vectors), SCAN_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+        if quantization == "float16":
+            block_scales = np.linalg.norm(block, axis=1)
+        else:
+            block_scales = np.abs(block).max(axis=1, initial=0.0) / 127
+        block_scales[block_scales == 0] = 1.0
+        scaled = block / block_scales[:, None]
+        codes[start:start + len(block)] = np.rint(scaled) if quantization == "int8" else scaled
+        scales[start:start + len(block)] = block_scales
+    codes.flush()
+    del codes, vectors
+
+    np.save(os.path.join(directory, "scales.tmp.npy"), scales)
+    with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["quantization"] = quantization
+    with open(os.path.join(directory, "meta.tmp.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    os.replace(os.path.join(directory, "codes.tmp.npy"), os.path.join(directory, "codes.npy"))
+    os.replace(os.path.join(directory, "scales.tmp.npy"), os.path.join(directory, "scales.npy"))
+    os.replace(os.path.join(directory, "meta.tmp.json"), os.path.join(directory, "meta.json"))
+    if not keep_exact:
+        os.remove(os.path.join(directory, "vectors.npy"))
+
+
+class MmapVectorIndex:
+    """
+    Exact cosine-similarity search over a memory-mapped float32 matrix.
+
+    The matrix, norms and texts are opened with ``mmap`` read-only, so every
+    uvicorn worker on a host shares one copy through the OS page cache.
+    Top-k uses one vectorized dot product and ``argpartition``.
+
+    For a quantized index (see ``quantize_vector_index``) the first pass
+    scans the compressed codes block by block, and the best
+    ``k * rescore_factor`` rows are rescored against the float32 vectors,
+    of which only those rows are paged in.
+    """
+
+    def __init__(self, directory: str, rescore_factor: int = 4):
+        self.directory = directory
+        self.rescore_factor = max(rescore_factor, 1)
+        vectors_path = os.path.join(directory, "vectors.npy")
+        self.vectors = np.load(vectors_path, mmap_mode="r") if os.path.exists(vectors_path) else None
+        self.norms = np.load(os.path.join(directory, "norms.npy"), mmap_mode="r")
+        self.pages = np.load(os.path.join(directory, "pages.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        texts_path = os.path.join(directory, "texts.bin")
+        self.texts = (
+            np.memmap(texts_path, dtype=np.uint8, mode="r")
+            if os.path.getsize(texts_path) else np.zeros(0, dtype=np.uint8)
+        )
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.ids = meta["ids"]
+        self.sources = meta["sources"]
+        self.source_digest = meta.get("source_digest")
+        self.quantization = meta.get("quantization")
+        if self.quantization:
+            self.codes = np.load(os.path.join(directory, "codes.npy"), mmap_mode="r")
+            self.scales = np.load(os.path.join(directory, "scales.npy"), mmap_mode="r")
+        else:
+            self.codes = self.scales = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, directory: str, rescore_factor: int = 4) -> Optional["MmapVectorIndex"]:
+        """Open an exported index, or return None if there is none."""
+        if not os.path.exists(os.path.join(directory, "meta.json")):
+            return None
+        return cls(directory, rescore_factor)
+
+    def memory_footprint(self, persist_directory: Optional[str] = None) -> dict:
+        """
+        Bytes scanned per query (the working set kept in memory) and bytes on disk.
+
+        With ``persist_directory``, also the size of the Chroma data there
+        (``chroma_disk_bytes``, without the export) and of its HNSW segments
+        (``chroma_segment_bytes``), which Chroma loads into memory to serve
+        queries.
+        """
+        scan = self.codes.nbytes + self.scales.nbytes if self.codes is not None else self.vectors.nbytes
+        footprint = {
+            "quantization": self.quantization or "float32",
+            "scan_bytes": int(scan + self.norms.nbytes),
+            "exact_bytes": int(self.vectors.nbytes) if self.vectors is not None else 0,
+            "disk_bytes": _directory_bytes(self.directory),
+        }
+        if persist_directory is not None:
+            footprint.update(chroma_footprint(persist_directory))
+        return footprint
+
+    def warm(self) -> None:
+        """Run one full scan so the first query does not fault the scanned arrays in from disk."""
+        scanned = self.codes if self.codes is not None else self.vectors
+        if len(self):
+            self.search(np.zeros(scanned.shape[1], dtype=np.float32), k=1)
+
+    def search(self, query_vector: Sequence[float], k: int = 5, pages: Optional[Sequence[int]] = None):
+        """
+        Find the chunks most similar to a query vector.
+
+        Args:
+            query_vector: Query embedding
+            k (int): Number of results
+            pages: Only consider chunks from these pages
+
+        Returns:
+            List[Tuple[int, float]]: Row numbers and cosine similarities, best first
+        """
+        if not len(self):
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query_norm = np.linalg.norm(query) or 1.0
+
+        rows = None
+        if pages is not None:
+            rows = np.flatnonzero(np.isin(self.pages, np.asarray(pages, dtype=np.int32)))
+            if not len(rows):
+                return []
+
+        if self.codes is None:
+            candidates = rows
+            scores = self.vectors @ query if rows is None else self.vectors[rows] @ query
+        else:
+            approximate = self._scan_codes(query, rows)
+            shortlist = _top_k(approximate, k * self.rescore_factor if self.vectors is not None else k)
+            candidates = shortlist if rows is None else rows[shortlist]
+            scores = approximate[shortlist] if self.vectors is None else self.vectors[candidates] @ query
+
+        norms = self.norms if candidates is None else self.norms[candidates]
+        scores = scores / (np.maximum(norms, 1e-12) * query_norm)
+        top = _top_k(scores, k)
+        found = top if candidates is None else candidates[top]
+        return [(int(row), float(score)) for row, score in zip(found, scores[top])]
+
+    def _scan_codes(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Approximate dot products with the query, decoding SCAN_BLOCK_ROWS codes at a time."""
+        total = len(self.codes) if rows is None else len(rows)
+        scores = np.empty(total, dtype=np.float32)
+        for start in range(0, total, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, total)
+            block = self.codes[start:end] if rows is None else self.codes[rows[start:end]]
+            scores[start:end] = block.astype(np.float32) @ query
+        return scores * (self.scales if rows is None else self.scales[rows])
+
+    def document(self, row: int) -> Document:
+        """Build the Document for a row, reading its text from the mapped blob."""
+        text = bytes(self.texts[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+        metadata = {"page": int(self.pages[row])}
+        if self.sources[row] is not None:
+            metadata["source"] = self.sources[row]
+        return Document(id=self.ids[row], page_content=text, metadata=metadata)
+
+    def similarity_search_by_vector(self, embedding, k: int = 5, filter: Optional[dict] = None) -> List[Document]:
+        """Chroma-compatible search; ``filter`` supports ``{"page": n}`` and ``{"page": {"$in": [...]}}``."""
+        return [self.document(row) for row, _ in self.search(embedding, k, pages_from_filter(filter))]
+
+    def similarity_search_with_score_by_vector(
+        self, embedding, k: int = 5, filter: Optional[dict] = None
+    ) -> List[Tuple[Document, float]]:
+        """Like similarity_search_by_vector, with the cosine similarity of each document."""
+        return [(self.document(row), score) for row, score in self.search(embedding, k, pages_from_filter(filter))]
+
+
+def chroma_footprint(persist_directory: str) -> dict:
+    """Bytes on disk of the Chroma data in a persist directory, and of its HNSW segment directories."""
+    disk = segments = 0
+    for entry in os.scandir(persist_directory):
+        if entry.is_file():
+            disk += entry.stat().st_size
+        elif entry.is_dir() and entry.name != VECTOR_INDEX_DIRNAME:
+            size = _directory_bytes(entry.path)
+            disk += size
+            segments += size
+    return {"chroma_disk_bytes": disk, "chroma_segment_bytes": segments}
+
+
+def _directory_bytes(directory: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names
+    )
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` highest scores, best first."""
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def pages_from_filter(filter: Optional[dict]) -> Optional[List[int]]:
+    if not filter:
+        return None
+    if set(filter) != {"page"}:
+        raise ValueError(f"Unsupported filter for the vector index: {filter}")
+    page = filter["page"]
+    if isinstance(page, dict):
+        if set(page) == {"$eq"}:
+            return [page["$eq"]]
+        if set(page) == {"$in"}:
+            return list(page["$in"])
+        raise ValueError(f"Unsupported page filter for the vector index: {page}")
+    return [page]
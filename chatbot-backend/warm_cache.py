@@ -0,0 +1,405 @@
+"""
+Warm answer cache for the most frequent questions.
+
+Mines the application logs for the questions asked, keeps the most
+frequent ones by normalized text, answers them through the RAG chain and
+writes the answers, with the question embeddings, to ``warm_cache.json``
+next to the Chroma data. Workers pin these answers in their answer cache
+at startup (and whenever the file changes), so the head of the query
+distribution is served without any OpenAI call from the first request.
+
+The artifact records the fingerprint of the collection it was built
+against and is ignored once the collection changes. Rebuild it after
+re-indexing and on a schedule, e.g. nightly from cron:
+
+    0 3 * * * cd chatbot-backend && python warm_cache.py --top 200
+
+or keep it running with ``--every 86400``. Answers of questions that are
+still hot and whose collection has not changed are reused, so a refresh
+only pays for the questions that entered the hot set.
+
+Usage:
+    python warm_cache.py --top 200 --min-count 3 --since-hours 168
+    python warm_cache.py --report-only
+"""
+import argparse
+import asyncio
+import base64
+import glob
+import json
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from answer_cache import AnswerCache, normalize_question
+from logger import MASK, app_logger, logs_dir
+
+WARM_CACHE_FILENAME = "warm_cache.json"
+WARM_CACHE_VERSION = 1
+
+# '2024-05-01 12:00:00,123 - rag_chatbot.app - INFO - <trace ID> - Received question: {"corpus": ...}'
+LOGGED_QUESTION_PATTERN = re.compile(
+    r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d+ - \S+ - INFO - \S+ - Received (?:streaming )?question: (\{.*\})$"
+)
+LOG_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+@dataclass
+class HotQuestion:
+    """A normalized question, the form it was most often asked in and how often it was asked."""
+    key: str
+    question: str
+    count: int
+
+
+def log_files(directory=logs_dir) -> List[str]:
+    """The rotated application logs, oldest first (``app.log.5`` ... ``app.log``)."""
+    paths = glob.glob(os.path.join(str(directory), "app.log*"))
+
+    def age(path):
+        suffix = path.rsplit(".log", 1)[1].lstrip(".")
+        return int(suffix) if suffix.isdigit() else 0
+
+    return sorted(paths, key=age, reverse=True)
+
+
+def iter_logged_questions(
+    paths: Iterable[str], since: Optional[datetime] = None, corpus: Optional[str] = None
+) -> Iterator[str]:
+    """
+    Yield the questions of the ``Received question`` log lines asked of a corpus.
+
+    Only standalone questions are mined: session follow-ups depend on their
+    conversation, and questions the log formatter masked no longer read as
+    asked. Older log lines without the corpus and session are skipped.
+
+    Args:
+        paths: Log files, oldest first
+        since (Optional[datetime]): Only questions logged since this time
+        corpus (Optional[str]): The corpus, None for the default knowledge base
+    """
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                match = LOGGED_QUESTION_PATTERN.match(line.rstrip("\n"))
+                if match is None or MASK in match.group(2):
+                    continue
+                if since is not None and datetime.strptime(match.group(1), LOG_TIMESTAMP_FORMAT) < since:
+                    continue
+                try:
+                    logged = json.loads(match.group(2))
+                except ValueError:
+                    continue
+                if logged.get("corpus") != corpus or logged.get("session") == "follow-up":
+                    continue
+                if isinstance(logged.get("question"), str):
+                    yield logged["question"]
+
+
+def mine_hot_questions(
+    questions: Iterable[str], top: int = 200, min_count: int = 2
+) -> Tuple[List[HotQuestion], Counter]:
+    """
+    Count questions by normalized text and return the most frequent ones.
+
+    Returns:
+        Tuple[List[HotQuestion], Counter]: Up to ``top`` questions asked at
+        least ``min_count`` times, most frequent first, and the counts of
+        every normalized question
+    """
+    counts = Counter()
+    forms: Dict[str, Counter] = {}
+    for question in questions:
+        key = normalize_question(question)
+        if not key:
+            continue
+        counts[key] += 1
+        forms.setdefault(key, Counter())[question.strip()] += 1
+    hot = [
+        HotQuestion(key=key, question=forms[key].most_common(1)[0][0], count=count)
+        for key, count in counts.most_common(top)
+        if count >= min_count
+    ]
+    return hot, counts
+
+
+def coverage_report(counts: Counter, warm_keys: Iterable[str]) -> dict:
+    """
+    How much of the logged traffic a warm set covers.
+
+    Returns:
+        dict: Logged and distinct questions, the size of the warm set, the
+        fraction of logged questions it covers, and the coverage the most
+        frequent 10, 50, 100, 200 and 500 questions would reach
+    """
+    total = sum(counts.values())
+    warm_keys = set(warm_keys)
+    ranked = [count for _, count in counts.most_common()]
+    return {
+        "logged_questions": total,
+        "distinct_questions": len(counts),
+        "warm_questions": len(warm_keys),
+        "coverage": round(sum(counts[key] for key in warm_keys) / total, 4) if total else 0.0,
+        "coverage_by_size": {
+            str(size): round(sum(ranked[:size]) / total, 4) if total else 0.0
+            for size in (10, 50, 100, 200, 500)
+        },
+    }
+
+
+def encode_vector(vector) -> Optional[str]:
+    if vector is None:
+        return None
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def decode_vector(data: Optional[str]) -> Optional[np.ndarray]:
+    if data is None:
+        return None
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+
+def load_artifact(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        artifact = json.load(f)
+    if artifact.get("version") != WARM_CACHE_VERSION:
+        raise ValueError(f"Unsupported warm cache version: {artifact.get('version')}")
+    return artifact
+
+
+def save_artifact(path: str, artifact: dict) -> None:
+    """Write the artifact atomically, so workers never load a partial file."""
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(artifact, f)
+    os.replace(temporary, path)
+
+
+def comparable(fingerprint: Hashable):
+    """A fingerprint as it reads back from JSON, e.g. tuples as lists."""
+    return json.loads(json.dumps(fingerprint))
+
+
+async def abuild_entries(
+    hot: List[HotQuestion],
+    chain,
+    embeddings=None,
+    max_concurrency: int = 4,
+    reuse: Optional[Dict[str, dict]] = None,
+) -> List[dict]:
+    """
+    Answer the hot questions through the chain and embed them for the semantic tier.
+
+    Args:
+        hot: Questions to answer
+        chain: RAG chain taking a question string
+        embeddings: Embeddings for the semantic tier, or None to skip it
+        max_concurrency: Questions running through the chain at once
+        reuse: Entries of a previous artifact built against the same
+            collection, by key; their answers are kept instead of regenerated
+
+    Returns:
+        List[dict]: Artifact entries, in the order of ``hot``; questions that
+        could not be answered are left out
+    """
+    reuse = reuse or {}
+    entries = {}
+    pending = []
+    for item in hot:
+        previous = reuse.get(item.key)
+        if previous is not None:
+            entries[item.key] = {**previous, "count": item.count}
+        else:
+            pending.append(item)
+
+    if pending:
+        vectors = [None] * len(pending)
+        if embeddings is not None:
+            vectors = await embeddings.aembed_documents([item.question for item in pending])
+        answers = await chain.abatch(
+            [item.question for item in pending], {"max_concurrency": max_concurrency}, return_exceptions=True
+        )
+        for item, answer, vector in zip(pending, answers, vectors):
+            if isinstance(answer, Exception):
+                app_logger.warning(f"Could not answer hot question {item.question!r}: {str(answer)}")
+                continue
+            entries[item.key] = {
+                "key": item.key,
+                "question": item.question,
+                "count": item.count,
+                "answer": answer,
+                "embedding": encode_vector(vector),
+            }
+    return [entries[item.key] for item in hot if item.key in entries]
+
+
+class WarmCache:
+    """
+    Pins the answers of a warm cache artifact in an answer cache.
+
+    The artifact is loaded when the loader is created and reloaded when the
+    file changes, checked at most every ``reload_interval`` seconds. An
+    artifact built against another version of the collection (per
+    ``version_func``) is not pinned.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        cache: AnswerCache,
+        version_func: Callable[[], Hashable],
+        reload_interval: float = 60.0,
+    ):
+        self.path = path
+        self.cache = cache
+        self.version_func = version_func
+        self.reload_interval = reload_interval
+        self._mtime = None
+        self._checked_at = time.monotonic()
+        self.loads = 0
+        self.stale = 0
+        self.reload()
+
+    def reload(self) -> None:
+        """Pin the artifact's answers, if it exists and matches the collection."""
+        self._pin(self._read())
+
+    async def amaybe_reload(self) -> None:
+        """Reload the artifact if the file changed; reading it and the collection version runs in a thread."""
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self._pin(await asyncio.to_thread(self._read))
+
+    def _read(self) -> Optional[Tuple[dict, Hashable, float]]:
+        """The artifact, the collection version and when reading started, or None if unavailable."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+        self._mtime = mtime
+        start_time = time.perf_counter()
+        try:
+            return load_artifact(self.path), comparable(self.version_func()), start_time
+        except Exception as e:
+            app_logger.error(f"Failed to load warm cache from {self.path}: {str(e)}")
+            return None
+
+    def _pin(self, loaded: Optional[Tuple[dict, Hashable, float]]) -> None:
+        if loaded is None:
+            return
+        artifact, version, start_time = loaded
+        if artifact["fingerprint"] != version:
+            self.stale += 1
+            app_logger.warning(f"Ignoring warm cache {self.path}: built against another version of the collection")
+            return
+        self.cache.pin(
+            (entry["question"], entry["answer"], decode_vector(entry.get("embedding")))
+            for entry in artifact["entries"]
+        )
+        self.loads += 1
+        app_logger.info(
+            f"Pinned {len(artifact['entries'])} warm answers from {self.path} "
+            f"(coverage {artifact.get('report', {}).get('coverage', 0.0):.0%}) "
+            f"in {(time.perf_counter() - start_time) * 1000:.0f} ms"
+        )
+
+    def stats(self) -> dict:
+        return {"loads": self.loads, "stale": self.stale}
+
+
+def refresh_artifact(args) -> dict:
+    """Mine the logs, answer the hot questions and write the artifact; returns the report."""
+    since = datetime.now() - timedelta(hours=args.since_hours) if args.since_hours else None
+    hot, counts = mine_hot_questions(
+        iter_logged_questions(log_files(args.logs_dir), since, args.corpus), top=args.top, min_count=args.min_count
+    )
+    report = coverage_report(counts, [item.key for item in hot])
+    print(f"✅ Found {report['distinct_questions']} distinct questions in {report['logged_questions']} logged ones")
+    if args.report_only:
+        return report
+
+    import generator
+    from langchain_chroma import Chroma
+
+    generator.initialize()
+    if args.corpus:
+        persist_directory = os.path.join(args.corpora_path, args.corpus)
+        corpus = generator.open_corpus(args.corpus, persist_directory)
+        # Shares the corpus' Chroma client, which corpus.close() stops
+        vector_db = Chroma(persist_directory=persist_directory, embedding_function=generator.query_embeddings)
+    else:
+        persist_directory = generator.BOOKS_CHROMA_PATH
+        corpus = generator.default_corpus()
+        vector_db = generator.reviews_vector_db
+    try:
+        fingerprint = comparable(generator.collection_fingerprint(vector_db, persist_directory))
+        path = os.path.join(persist_directory, WARM_CACHE_FILENAME)
+        reuse = {}
+        if os.path.exists(path):
+            try:
+                previous = load_artifact(path)
+                if previous["fingerprint"] == fingerprint:
+                    reuse = {entry["key"]: entry for entry in previous["entries"]}
+            except Exception as e:
+                print(f"⚠️  Ignoring the previous warm cache: {str(e)}")
+
+        start_time = time.perf_counter()
+        entries = asyncio.run(abuild_entries(
+            hot, corpus.chain, generator.query_embeddings, max_concurrency=args.concurrency, reuse=reuse
+        ))
+        report = coverage_report(counts, [entry["key"] for entry in entries])
+        report["reused_answers"] = sum(entry["key"] in reuse for entry in entries)
+        report["generated_answers"] = len(entries) - report["reused_answers"]
+        report["build_seconds"] = round(time.perf_counter() - start_time, 1)
+        save_artifact(path, {
+            "version": WARM_CACHE_VERSION,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "fingerprint": fingerprint,
+            "report": report,
+            "entries": entries,
+        })
+    finally:
+        if args.corpus and corpus.close is not None:
+            corpus.close()
+    print(f"✅ Wrote {len(entries)} warm answers covering {report['coverage']:.1%} of the logged questions to {path}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logs-dir", default=str(logs_dir), help="Directory of the rotated app.log files")
+    parser.add_argument("--top", type=int, default=200, help="Most frequent questions to warm")
+    parser.add_argument("--min-count", type=int, default=2, help="Times a question must have been asked")
+    parser.add_argument("--since-hours", type=float, default=0, help="Only mine questions logged this recently")
+    parser.add_argument("--corpus", help="Warm this corpus of CORPORA_PATH instead of the default knowledge base")
+    parser.add_argument("--corpora-path", default=None, help="Directory of the corpora (default: CORPORA_PATH)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions answered at once")
+    parser.add_argument("--report-only", action="store_true", help="Only report the coverage, without answering")
+    parser.add_argument("--every", type=float, default=0, help="Rebuild every this many seconds, until interrupted")
+    args = parser.parse_args()
+    if args.corpora_path is None:
+        from config import settings
+        args.corpora_path = settings.CORPORA_PATH
+
+    while True:
+        print(json.dumps(refresh_artifact(args), indent=2))
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,24 @@ interface ApiError {
     error: string;
     detail: string;}
 
+interface SseEvent {
+    event: string;
+    data: any;
+}
+
+function parseSseEvent(rawEvent: string): SseEvent | null {
+    let event = 'message';
+    let data = '';
+    for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event: ')) {
+            event = line.slice(7);
+        } else if (line.startsWith('data: ')) {
+            data += line.slice(6);
+        }
+    }
+    return data ? { event, data: JSON.parse(data) } : null;
+}
+
 class ApiService {
     private async fetchWithRetry(
         url: string,
@@ -74,6 +92,58 @@ class ApiService {
         }
     }
 
+    async generateResponseStream(
+        question: string,
+        onToken: (token: string) => void
+    ): Promise<string> {
+        try {
+            const response = await this.fetchWithRetry(
+                `${config.API_BASE_URL}/generate/stream`,
+                {
+                    method: 'POST',
+                    body: JSON.stringify({ question }),
+                    headers: { Accept: 'text/event-stream' },
+                }
+            );
+
+            if (!response.body) {
+                throw new Error(config.API_ERROR);
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let answer = '';
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                const events = buffer.split('\n\n');
+                buffer = events.pop() || '';
+
+                for (const rawEvent of events) {
+                    const event = parseSseEvent(rawEvent);
+                    if (!event) continue;
+                    if (event.event === 'token') {
+                        answer += event.data.token;
+                        onToken(event.data.token);
+                    } else if (event.event === 'error') {
+                        throw new Error(event.data.error || config.API_ERROR);
+                    }
+                }
+            }
+
+            return answer;
+        } catch (error) {
+            if (error instanceof Error) {
+                throw error;
+            }
+            throw new Error(config.DEFAULT_ERROR_MESSAGE);
+        }
+    }
+
     async chatResponse(question: string): Promise<string> {
         try {
             const response = await this.fetchWithRetry(